@@ -15,11 +15,10 @@
 import logging
 import argparse
 import sys
-import sched
-import time
 
-from lds_connector.config import read_yaml_config, Config
-from lds_connector.connector import Connector, build_connector
+from lds_connector.config import read_yaml_config
+from lds_connector.connector import build_connector
+from lds_connector.jobs import PeriodicJob, run_jobs
 
 
 def main():
@@ -48,30 +47,25 @@ def main():
         sys.exit(1)
 
     connector = build_connector(config)
-    scheduler = sched.scheduler(time.time, time.sleep)
-    if config.edgedns is not None and config.edgedns.send_records:
-        scheduler.enter(delay=0,  priority=2, action=sched_process_dns_records, argument=(scheduler, connector, config))
-    scheduler.enter(delay=0,  priority=1, action=sched_process_log_files, argument=(scheduler, connector, config))
-    scheduler.run()
-
-
-def sched_process_log_files(scheduler: sched.scheduler, connector: Connector, config: Config):
-    connector.process_log_files()
-    scheduler.enter(
-        delay=config.lds.poll_period_sec,
-        priority=1,
-        action=sched_process_log_files,
-        argument=(scheduler, connector, config))
 
-
-def sched_process_dns_records(scheduler: sched.scheduler, connector: Connector, config: Config):
-    assert config.edgedns is not None
-    connector.process_dns_records()
-    scheduler.enter(
-        delay=config.edgedns.poll_period_sec,
-        priority=1,
-        action=sched_process_dns_records,
-        argument=(scheduler, connector, config))
+    # Each job runs on its own thread, so a slow DNS record poll never delays log delivery
+    jobs = [
+        PeriodicJob(
+            name='Log file',
+            action=lambda deadline: connector.process_log_files(deadline=deadline),
+            period_sec=config.lds.poll_period_sec,
+            deadline_sec=config.lds.poll_deadline_sec)
+    ]
+    if config.edgedns is not None and config.edgedns.send_records:
+        # The record poll enforces its own timeout. The deadline only flags overruns
+        jobs.append(PeriodicJob(
+            name='DNS record',
+            action=lambda _: connector.process_dns_records(),
+            period_sec=config.edgedns.poll_period_sec,
+            deadline_sec=config.edgedns.poll_timeout_sec))
+    # Jobs are stopped and waited for before the connector is closed
+    run_jobs(jobs)
+    connector.close()
 
 
 if __name__ == '__main__':
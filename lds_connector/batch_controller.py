@@ -0,0 +1,137 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import AdaptiveBatchConfig
+
+
+@dataclass
+class BatchMetrics:
+    batch_bytes: int
+    batch_events: Optional[int]
+    requests: int
+    failures: int
+    avg_latency_sec: float
+    error_rate: float
+
+
+class AimdBatchController:
+    """
+    Adaptive batch size using additive increase, multiplicative decrease (AIMD) on the request size in bytes.
+
+    A request that fails or exceeds the target latency halves the batch. Successful requests grow it by a fixed number
+    of bytes, unless the recent error rate is still above the maximum, which holds it. One failure therefore shrinks
+    the batch once, not again for each success that follows. The batch size in events is derived from the average size
+    of recent events.
+    """
+    _DECREASE_FACTOR = 0.5
+    # Weight of the newest sample in the moving averages
+    _SMOOTHING = 0.2
+    _LOG_METRICS_EVERY = 100
+
+    def __init__(self, name: str, config: AdaptiveBatchConfig):
+        self.name = name
+        self.config = config
+
+        self.batch_bytes = float(min(max(config.initial_bytes, config.min_bytes), config.max_bytes))
+        self.event_bytes: Optional[float] = None
+        self.error_rate = 0.0
+
+        self.requests = 0
+        self.failures = 0
+        self.total_latency_sec = 0.0
+
+    def batch_events(self, default: int) -> int:
+        """
+        Get the number of events to send per request
+
+        Parameters:
+            default (int): The batch size to use until an event size has been observed
+
+        Returns:
+            int: The batch size in events. At least 1
+        """
+        if self.event_bytes is None:
+            return default
+        return max(1, int(self.batch_bytes / self.event_bytes))
+
+    def record(self, request_bytes: int, event_count: int, latency_sec: float, success: bool) -> None:
+        """
+        Record the result of a request and adjust the batch size
+
+        Parameters:
+            request_bytes (int): The request body size
+            event_count (int): The number of events in the request
+            latency_sec (float): The time taken to get a response
+            success (bool): Whether the request succeeded. Rejected events that aren't caused by load or size aren't
+                recorded
+
+        Returns: None
+        """
+        self.requests += 1
+        self.total_latency_sec += latency_sec
+        if not success:
+            self.failures += 1
+
+        if event_count > 0:
+            event_bytes = request_bytes / event_count
+            self.event_bytes = event_bytes if self.event_bytes is None \
+                else self._average(self.event_bytes, event_bytes)
+        self.error_rate = self._average(self.error_rate, 0.0 if success else 1.0)
+
+        if not success or latency_sec > self.config.target_latency_sec:
+            self.batch_bytes = max(self.config.min_bytes, self.batch_bytes * AimdBatchController._DECREASE_FACTOR)
+            logging.debug('%s batch size decreased to %d bytes. Latency %.3f seconds, error rate %.3f',
+                self.name, self.batch_bytes, latency_sec, self.error_rate)
+        elif self.error_rate <= self.config.max_error_rate:
+            # Only grow if the batch is actually filling up. Small forced batches say nothing about larger ones
+            if request_bytes >= self.batch_bytes * AimdBatchController._DECREASE_FACTOR:
+                self.batch_bytes = min(self.config.max_bytes, self.batch_bytes + self.config.increase_bytes)
+
+        if self.requests % AimdBatchController._LOG_METRICS_EVERY == 0:
+            logging.info('%s batch metrics: %s', self.name, self.metrics())
+
+    def metrics(self) -> BatchMetrics:
+        """
+        Get the controller's current state and request statistics
+
+        Parameters: None
+
+        Returns:
+            BatchMetrics: The metrics
+        """
+        return BatchMetrics(
+            batch_bytes=int(self.batch_bytes),
+            batch_events=self.batch_events(default=0) if self.event_bytes is not None else None,
+            requests=self.requests,
+            failures=self.failures,
+            avg_latency_sec=self.total_latency_sec / self.requests if self.requests else 0.0,
+            error_rate=self.error_rate
+        )
+
+    @staticmethod
+    def _average(average: float, sample: float) -> float:
+        return average + AimdBatchController._SMOOTHING * (sample - average)
+
+
+def create_batch_controller(name: str, config: Optional[AdaptiveBatchConfig]) -> Optional[AimdBatchController]:
+    if config is None:
+        return None
+    return AimdBatchController(name, config)
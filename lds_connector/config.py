@@ -17,8 +17,8 @@
 
 import logging
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, List
 from enum import Enum
 import sys
 import yaml
@@ -30,6 +30,30 @@ class HecConfig:
     index: Optional[str]
     token: str
     event_batch_size: int
+    use_raw_endpoint: bool = False
+
+
+@dataclass
+class RetryConfig:
+    initial_sec: float = 1
+    max_sec: float = 60
+    failure_threshold: int = 5
+    reset_sec: float = 60
+
+
+@dataclass
+class AdaptiveBatchConfig:
+    target_latency_sec: float = 1
+    max_error_rate: float = 0.05
+    min_bytes: int = 16 * 1024
+    max_bytes: int = 1024 * 1024
+    initial_bytes: int = 128 * 1024
+    increase_bytes: int = 16 * 1024
+
+
+class HecLoadBalancing(Enum):
+    ROUND_ROBIN = 0
+    LEAST_OUTSTANDING = 1
 
 
 @dataclass
@@ -40,12 +64,19 @@ class SplunkConfig:
     hec_ssl_verify: bool
     lds_hec: HecConfig
     edgedns_hec: Optional[HecConfig]
+    additional_hosts: List[str] = field(default_factory=list)
+    load_balancing: HecLoadBalancing = HecLoadBalancing.ROUND_ROBIN
+    endpoint_eject_sec: int = 30
+    retry: RetryConfig = field(default_factory=RetryConfig)
+    dead_letter_path: Optional[str] = None
+    adaptive_batch: Optional[AdaptiveBatchConfig] = None
 
 
 class SysLogTransport(Enum):
     UDP = 0
     TCP = 1
     TCP_TLS = 2
+    RELP = 3
 
 class SysLogProtocol(Enum):
     RFC3164 = 0
@@ -58,6 +89,10 @@ class SysLogDelimiter(Enum):
     NULL = 3
     OCTET = 4
 
+class SysLogDatagramOverflow(Enum):
+    TRUNCATE = 0
+    SPLIT = 1
+
 @dataclass
 class SysLogTlsConfig:
     ca_file: str
@@ -74,6 +109,19 @@ class SysLogConfig:
     edgedns_app_name: Optional[str]
     delimiter_method: SysLogDelimiter
     from_host: Optional[str]
+    max_write_bytes: int = 65536
+    connections: int = 1
+    additional_hosts: List[str] = field(default_factory=list)
+    udp_max_rate_per_sec: Optional[float] = None
+    udp_burst: Optional[int] = None
+    max_datagram_bytes: Optional[int] = None
+    datagram_overflow: SysLogDatagramOverflow = SysLogDatagramOverflow.TRUNCATE
+    dns_cache_sec: int = 300
+    retry: RetryConfig = field(default_factory=RetryConfig)
+    relp_window: int = 128
+    send_timeout_sec: float = 300
+    event_batch_size: int = 100
+    batch_bytes: int = 65536
 
 
 @dataclass
@@ -86,11 +134,40 @@ class NetStorageConfig:
     log_dir: str
 
 
+class EdgeDnsSource(Enum):
+    API = 0
+    AXFR = 1
+    IXFR = 2
+
+@dataclass
+class ZoneTransferConfig:
+    host: str
+    port: int = 53
+    tsig_key_name: Optional[str] = None
+    tsig_secret: Optional[str] = None
+    tsig_algorithm: str = 'hmac-sha256'
+    timeout_sec: float = 30
+
 @dataclass
 class EdgeDnsConfig:
     send_records: bool
-    zone_name: str
+    zone_name: Optional[str]
     poll_period_sec: int
+    zone_names: List[str] = field(default_factory=list)
+    all_zones: bool = False
+    contract_id: Optional[str] = None
+    zone_workers: int = 4
+    skip_unchanged_zones: bool = False
+    retry: RetryConfig = field(default_factory=RetryConfig)
+    send_changes_only: bool = False
+    full_resync_sec: int = 86400
+    page_size: Optional[int] = None
+    fetch_workers: int = 4
+    request_timeout_sec: float = 30
+    poll_timeout_sec: int = 1800
+    enrich_logs: bool = False
+    source: EdgeDnsSource = EdgeDnsSource.API
+    transfer: Optional[ZoneTransferConfig] = None
 
 @dataclass
 class AkamaiOpenConfig:
@@ -108,6 +185,23 @@ class LdsConfig:
     timestamp_strptime: str
     timestamp_parse: str
     poll_period_sec: int
+    batch_linger_sec: float = 5
+    poll_deadline_sec: Optional[int] = None
+    # Log files downloaded concurrently, and how many may wait downloaded ahead of the one being processed
+    download_workers: int = 1
+    prefetch_log_files: int = 1
+    # Log lines are parsed and serialized concurrently, a chunk at a time. At most queued_chunks chunks wait to be sent
+    parse_workers: int = 1
+    serialize_workers: int = 1
+    queued_chunks: int = 4
+
+
+@dataclass
+class SpoolConfig:
+    directory: str
+    max_bytes: int = 1024 * 1024 * 1024
+    segment_bytes: int = 16 * 1024 * 1024
+    flush_events: int = 1000
 
 
 @dataclass
@@ -117,12 +211,34 @@ class Config:
     lds: LdsConfig
     edgedns: Optional[EdgeDnsConfig]
     open: Optional[AkamaiOpenConfig]
+    spool: Optional[SpoolConfig] = None
 
 
 _KEY_EDGEDNS = 'edgedns'
 _KEY_EDGEDNS_ZONE = 'zone_name'
 _KEY_EDGEDNS_SEND_RECORDS = 'send_records'
 _KEY_EDGEDNS_POLL_PERIOD = 'poll_period_sec'
+_KEY_EDGEDNS_SEND_CHANGES_ONLY = 'send_changes_only'
+_KEY_EDGEDNS_FULL_RESYNC_SEC = 'full_resync_sec'
+_KEY_EDGEDNS_PAGE_SIZE = 'page_size'
+_KEY_EDGEDNS_FETCH_WORKERS = 'fetch_workers'
+_KEY_EDGEDNS_ZONE_NAMES = 'zone_names'
+_KEY_EDGEDNS_ALL_ZONES = 'all_zones'
+_KEY_EDGEDNS_CONTRACT_ID = 'contract_id'
+_KEY_EDGEDNS_ZONE_WORKERS = 'zone_workers'
+_KEY_EDGEDNS_SKIP_UNCHANGED_ZONES = 'skip_unchanged_zones'
+_KEY_EDGEDNS_RETRY = 'retry'
+_KEY_EDGEDNS_REQUEST_TIMEOUT_SEC = 'request_timeout_sec'
+_KEY_EDGEDNS_POLL_TIMEOUT_SEC = 'poll_timeout_sec'
+_KEY_EDGEDNS_ENRICH_LOGS = 'enrich_logs'
+_KEY_EDGEDNS_SOURCE = 'source'
+_KEY_EDGEDNS_TRANSFER = 'transfer'
+_KEY_EDGEDNS_TRANSFER_HOST = 'host'
+_KEY_EDGEDNS_TRANSFER_PORT = 'port'
+_KEY_EDGEDNS_TRANSFER_TSIG_KEY_NAME = 'tsig_key_name'
+_KEY_EDGEDNS_TRANSFER_TSIG_SECRET = 'tsig_secret'
+_KEY_EDGEDNS_TRANSFER_TSIG_ALGORITHM = 'tsig_algorithm'
+_KEY_EDGEDNS_TRANSFER_TIMEOUT_SEC = 'timeout_sec'
 
 _KEY_OPEN = 'open'
 _KEY_OPEN_CLIENT_SECRET = 'client_secret'
@@ -136,12 +252,32 @@ _KEY_SPLUNK_HOST = 'host'
 _KEY_SPLUNK_HEC_PORT = 'hec_port'
 _KEY_SPLUNK_HEC_SSL = 'hec_use_ssl'
 _KEY_SPLUNK_HEC_SSL_VERIFY = 'hec_ssl_verify'
+_KEY_SPLUNK_ADDITIONAL_HOSTS = 'additional_hosts'
+_KEY_SPLUNK_LOAD_BALANCING = 'load_balancing'
+_KEY_SPLUNK_ENDPOINT_EJECT_SEC = 'endpoint_eject_sec'
+_KEY_SPLUNK_RETRY = 'retry'
+_KEY_SPLUNK_DEAD_LETTER_PATH = 'dead_letter_path'
+_KEY_SPLUNK_ADAPTIVE_BATCH = 'adaptive_batch'
+
+_KEY_RETRY_INITIAL_SEC = 'initial_sec'
+_KEY_RETRY_MAX_SEC = 'max_sec'
+_KEY_RETRY_FAILURE_THRESHOLD = 'failure_threshold'
+_KEY_RETRY_RESET_SEC = 'reset_sec'
+
+_KEY_ADAPTIVE_BATCH_TARGET_LATENCY_SEC = 'target_latency_sec'
+_KEY_ADAPTIVE_BATCH_MAX_ERROR_RATE = 'max_error_rate'
+_KEY_ADAPTIVE_BATCH_MIN_BYTES = 'min_bytes'
+_KEY_ADAPTIVE_BATCH_MAX_BYTES = 'max_bytes'
+_KEY_ADAPTIVE_BATCH_INITIAL_BYTES = 'initial_bytes'
+_KEY_ADAPTIVE_BATCH_INCREASE_BYTES = 'increase_bytes'
+
 _KEY_SPLUNK_HEC_LDS = 'lds_hec'
 _KEY_SPLUNK_HEC_EDGEDNS = 'edgedns_hec'
 _KEY_SPLUNK_HEC_BATCH_SIZE = 'batch_size'
 _KEY_SPLUNK_HEC_TOKEN = 'token'
 _KEY_SPLUNK_HEC_SOURCE_TYPE = 'source_type'
 _KEY_SPLUNK_HEC_INDEX = 'index'
+_KEY_SPLUNK_HEC_RAW = 'use_raw_endpoint'
 
 _KEY_SYSLOG = 'syslog'
 _KEY_SYSLOG_HOST = 'host'
@@ -153,6 +289,19 @@ _KEY_SYSLOG_LDS_APP_NAME = 'lds_app_name'
 _KEY_SYSLOG_EDGEDNS_APP_NAME = 'edgedns_app_name'
 _KEY_SYSLOG_DELIM_METHOD = 'delimiter_method'
 _KEY_SYSLOG_FROM_HOST = 'from_host'
+_KEY_SYSLOG_MAX_WRITE_BYTES = 'max_write_bytes'
+_KEY_SYSLOG_CONNECTIONS = 'connections'
+_KEY_SYSLOG_ADDITIONAL_HOSTS = 'additional_hosts'
+_KEY_SYSLOG_UDP_MAX_RATE_PER_SEC = 'udp_max_rate_per_sec'
+_KEY_SYSLOG_UDP_BURST = 'udp_burst'
+_KEY_SYSLOG_MAX_DATAGRAM_BYTES = 'max_datagram_bytes'
+_KEY_SYSLOG_DATAGRAM_OVERFLOW = 'datagram_overflow'
+_KEY_SYSLOG_DNS_CACHE_SEC = 'dns_cache_sec'
+_KEY_SYSLOG_RETRY = 'retry'
+_KEY_SYSLOG_RELP_WINDOW = 'relp_window'
+_KEY_SYSLOG_SEND_TIMEOUT_SEC = 'send_timeout_sec'
+_KEY_SYSLOG_BATCH_SIZE = 'batch_size'
+_KEY_SYSLOG_BATCH_BYTES = 'batch_bytes'
 
 _KEY_SYSLOG_TLS = 'tls'
 _KEY_SYSLOG_TLS_CA_FILE = 'ca_file'
@@ -163,6 +312,19 @@ _KEY_LDS_LOG_DIR = 'log_download_dir'
 _KEY_LDS_TIMESTAMP_PARSE = 'timestamp_parse'
 _KEY_LDS_TIMESTAMP_STRPTIME = 'timestamp_strptime'
 _KEY_LDS_LOG_POLL_PERIOD_SEC = 'log_poll_period_sec'
+_KEY_LDS_BATCH_LINGER_SEC = 'batch_linger_sec'
+_KEY_LDS_LOG_POLL_DEADLINE_SEC = 'log_poll_deadline_sec'
+_KEY_LDS_DOWNLOAD_WORKERS = 'download_workers'
+_KEY_LDS_PREFETCH_LOG_FILES = 'prefetch_log_files'
+_KEY_LDS_PARSE_WORKERS = 'parse_workers'
+_KEY_LDS_SERIALIZE_WORKERS = 'serialize_workers'
+_KEY_LDS_QUEUED_CHUNKS = 'queued_chunks'
+
+_KEY_SPOOL = 'spool'
+_KEY_SPOOL_DIR = 'dir'
+_KEY_SPOOL_MAX_BYTES = 'max_bytes'
+_KEY_SPOOL_SEGMENT_BYTES = 'segment_bytes'
+_KEY_SPOOL_FLUSH_EVENTS = 'flush_events'
 
 _KEY_NS = 'ns'
 _KEY_NS_HOST = 'host'
@@ -182,13 +344,43 @@ def is_config_valid(config: Config) -> bool:
         logging.error('Invalid config. Only one destination (Splunk or SysLog) can be configured')
         return False
 
+    if config.lds.download_workers < 1 or config.lds.prefetch_log_files < 0:
+        logging.error('Invalid config. LDS download workers must be at least 1 and prefetch log files at least 0')
+        return False
+
+    if config.lds.parse_workers < 1 or config.lds.serialize_workers < 1 or config.lds.queued_chunks < 1:
+        logging.error('Invalid config. LDS parse workers, serialize workers, and queued chunks must be at least 1')
+        return False
+
+    if config.edgedns is not None and config.edgedns.enrich_logs and not config.edgedns.send_records:
+        logging.error('Invalid config. DNS log enrichment enabled but DNS record sending disabled')
+        return False
+
     if config.edgedns is not None and config.edgedns.send_records:
         if config.open is None:
             logging.error('Invalid config. DNS record sending enabled but Akamai OPEN credentials not provided')
             return False
-        if config.edgedns.zone_name is None:
+        if config.edgedns.zone_name is None and not config.edgedns.zone_names and not config.edgedns.all_zones:
             logging.error('Invalid config. DNS record sending enabled but no zone provided')
             return False
+        if config.edgedns.fetch_workers < 1 or config.edgedns.zone_workers < 1:
+            logging.error('Invalid config. Edge DNS fetch and zone workers must be at least 1')
+            return False
+        if config.edgedns.request_timeout_sec <= 0 or config.edgedns.poll_timeout_sec <= 0:
+            logging.error('Invalid config. Edge DNS request and poll timeouts must be greater than 0')
+            return False
+        if config.edgedns.source != EdgeDnsSource.API and config.edgedns.transfer is None:
+            logging.error('Invalid config. Edge DNS source is a zone transfer but transfer config is missing')
+            return False
+        if config.edgedns.transfer is not None:
+            transfer = config.edgedns.transfer
+            if (transfer.tsig_key_name is None) != (transfer.tsig_secret is None):
+                logging.error('Invalid config. Zone transfer TSIG key name and secret must be provided together')
+                return False
+            if transfer.tsig_algorithm not in ('hmac-sha1', 'hmac-sha256', 'hmac-sha512'):
+                logging.error('Invalid config. Zone transfer TSIG algorithm is not supported. %s',
+                    transfer.tsig_algorithm)
+                return False
         if config.splunk is not None and config.splunk.edgedns_hec is None:
             logging.error('Invalid config. DNS record sending enabled but Splunk HEC token not provided')
             return False
@@ -200,6 +392,25 @@ def is_config_valid(config: Config) -> bool:
         if config.syslog.transport == SysLogTransport.TCP_TLS and config.syslog.tls is None:
             logging.error('Invalid config. Syslog transport is TCP_TLS but TLS config is missing')
             return False
+        if config.syslog.connections < 1:
+            logging.error('Invalid config. Syslog connections must be at least 1')
+            return False
+        if config.syslog.transport not in (SysLogTransport.TCP, SysLogTransport.TCP_TLS) \
+                and config.syslog.additional_hosts:
+            logging.error('Invalid config. Syslog additional hosts require TCP or TCP_TLS transport')
+            return False
+        if config.syslog.event_batch_size < 1:
+            logging.error('Invalid config. Syslog batch size must be at least 1')
+            return False
+        if config.syslog.relp_window < 1:
+            logging.error('Invalid config. Syslog RELP window must be at least 1')
+            return False
+        if config.syslog.udp_max_rate_per_sec is not None and config.syslog.udp_max_rate_per_sec <= 0:
+            logging.error('Invalid config. Syslog UDP max rate must be positive')
+            return False
+        if config.syslog.max_datagram_bytes is not None and config.syslog.max_datagram_bytes < 64:
+            logging.error('Invalid config. Syslog max datagram bytes must be at least 64')
+            return False
 
     return True
 
@@ -223,6 +434,97 @@ def _get_syslog_transport(syslog_yaml) -> SysLogTransport:
     return transport
 
 
+def _get_hec_load_balancing(splunk_yaml) -> HecLoadBalancing:
+    load_balancing_str = splunk_yaml.get(_KEY_SPLUNK_LOAD_BALANCING, None)
+    if load_balancing_str is None:
+        return HecLoadBalancing.ROUND_ROBIN
+
+    load_balancing = getattr(HecLoadBalancing, load_balancing_str, None)
+    if load_balancing is None:
+        logging.error('Invalid config. Splunk load balancing method is not supported. %s', load_balancing_str)
+        sys.exit(1)
+
+    return load_balancing
+
+
+def _get_syslog_datagram_overflow(syslog_yaml) -> SysLogDatagramOverflow:
+    overflow_str = syslog_yaml.get(_KEY_SYSLOG_DATAGRAM_OVERFLOW, None)
+    if overflow_str is None:
+        return SysLogDatagramOverflow.TRUNCATE
+
+    overflow = getattr(SysLogDatagramOverflow, overflow_str, None)
+    if overflow is None:
+        logging.error('Invalid config. Syslog datagram overflow method is not supported. %s', overflow_str)
+        sys.exit(1)
+
+    return overflow
+
+
+def _get_edgedns_source(edgedns_yaml) -> EdgeDnsSource:
+    source_str = edgedns_yaml.get(_KEY_EDGEDNS_SOURCE, None)
+    if source_str is None:
+        return EdgeDnsSource.API
+
+    source = getattr(EdgeDnsSource, source_str, None)
+    if source is None:
+        logging.error('Invalid config. Edge DNS source is not supported. %s', source_str)
+        sys.exit(1)
+
+    return source
+
+
+def _get_zone_transfer_config(transfer_yaml) -> Optional[ZoneTransferConfig]:
+    if transfer_yaml is None:
+        return None
+
+    defaults = ZoneTransferConfig(host='')
+    return ZoneTransferConfig(
+        host=transfer_yaml[_KEY_EDGEDNS_TRANSFER_HOST],
+        port=transfer_yaml.get(_KEY_EDGEDNS_TRANSFER_PORT, defaults.port),
+        tsig_key_name=transfer_yaml.get(_KEY_EDGEDNS_TRANSFER_TSIG_KEY_NAME, defaults.tsig_key_name),
+        tsig_secret=transfer_yaml.get(_KEY_EDGEDNS_TRANSFER_TSIG_SECRET, defaults.tsig_secret),
+        tsig_algorithm=transfer_yaml.get(_KEY_EDGEDNS_TRANSFER_TSIG_ALGORITHM, defaults.tsig_algorithm),
+        timeout_sec=transfer_yaml.get(_KEY_EDGEDNS_TRANSFER_TIMEOUT_SEC, defaults.timeout_sec)
+    )
+
+
+def _get_retry_config(retry_yaml) -> RetryConfig:
+    defaults = RetryConfig()
+    if retry_yaml is None:
+        return defaults
+
+    return RetryConfig(
+        initial_sec=retry_yaml.get(_KEY_RETRY_INITIAL_SEC, defaults.initial_sec),
+        max_sec=retry_yaml.get(_KEY_RETRY_MAX_SEC, defaults.max_sec),
+        failure_threshold=retry_yaml.get(_KEY_RETRY_FAILURE_THRESHOLD, defaults.failure_threshold),
+        reset_sec=retry_yaml.get(_KEY_RETRY_RESET_SEC, defaults.reset_sec)
+    )
+
+
+def _get_adaptive_batch_config(adaptive_batch_yaml) -> Optional[AdaptiveBatchConfig]:
+    if adaptive_batch_yaml is None:
+        return None
+
+    defaults = AdaptiveBatchConfig()
+    return AdaptiveBatchConfig(
+        target_latency_sec=adaptive_batch_yaml.get(_KEY_ADAPTIVE_BATCH_TARGET_LATENCY_SEC, defaults.target_latency_sec),
+        max_error_rate=adaptive_batch_yaml.get(_KEY_ADAPTIVE_BATCH_MAX_ERROR_RATE, defaults.max_error_rate),
+        min_bytes=adaptive_batch_yaml.get(_KEY_ADAPTIVE_BATCH_MIN_BYTES, defaults.min_bytes),
+        max_bytes=adaptive_batch_yaml.get(_KEY_ADAPTIVE_BATCH_MAX_BYTES, defaults.max_bytes),
+        initial_bytes=adaptive_batch_yaml.get(_KEY_ADAPTIVE_BATCH_INITIAL_BYTES, defaults.initial_bytes),
+        increase_bytes=adaptive_batch_yaml.get(_KEY_ADAPTIVE_BATCH_INCREASE_BYTES, defaults.increase_bytes)
+    )
+
+
+def _get_hec_config(hec_yaml) -> HecConfig:
+    return HecConfig(
+        source_type=hec_yaml.get(_KEY_SPLUNK_HEC_SOURCE_TYPE, None),
+        index=hec_yaml.get(_KEY_SPLUNK_HEC_INDEX, None),
+        token=hec_yaml[_KEY_SPLUNK_HEC_TOKEN],
+        event_batch_size=hec_yaml.get(_KEY_SPLUNK_HEC_BATCH_SIZE, 10),
+        use_raw_endpoint=hec_yaml.get(_KEY_SPLUNK_HEC_RAW, False)
+    )
+
 
 def read_yaml_config(yaml_stream) -> Optional[Config]:
     """
@@ -246,8 +548,23 @@ def read_yaml_config(yaml_stream) -> Optional[Config]:
         if edgedns_yaml is not None:
             edgedns_config = EdgeDnsConfig(
                 send_records=edgedns_yaml[_KEY_EDGEDNS_SEND_RECORDS],
-                zone_name=edgedns_yaml[_KEY_EDGEDNS_ZONE],
-                poll_period_sec=edgedns_yaml.get(_KEY_EDGEDNS_POLL_PERIOD, 7200)
+                zone_name=edgedns_yaml.get(_KEY_EDGEDNS_ZONE, None),
+                poll_period_sec=edgedns_yaml.get(_KEY_EDGEDNS_POLL_PERIOD, 7200),
+                send_changes_only=edgedns_yaml.get(_KEY_EDGEDNS_SEND_CHANGES_ONLY, False),
+                full_resync_sec=edgedns_yaml.get(_KEY_EDGEDNS_FULL_RESYNC_SEC, 86400),
+                page_size=edgedns_yaml.get(_KEY_EDGEDNS_PAGE_SIZE, None),
+                fetch_workers=edgedns_yaml.get(_KEY_EDGEDNS_FETCH_WORKERS, 4),
+                zone_names=edgedns_yaml.get(_KEY_EDGEDNS_ZONE_NAMES, []),
+                all_zones=edgedns_yaml.get(_KEY_EDGEDNS_ALL_ZONES, False),
+                contract_id=edgedns_yaml.get(_KEY_EDGEDNS_CONTRACT_ID, None),
+                zone_workers=edgedns_yaml.get(_KEY_EDGEDNS_ZONE_WORKERS, 4),
+                skip_unchanged_zones=edgedns_yaml.get(_KEY_EDGEDNS_SKIP_UNCHANGED_ZONES, False),
+                retry=_get_retry_config(edgedns_yaml.get(_KEY_EDGEDNS_RETRY, None)),
+                request_timeout_sec=edgedns_yaml.get(_KEY_EDGEDNS_REQUEST_TIMEOUT_SEC, 30),
+                poll_timeout_sec=edgedns_yaml.get(_KEY_EDGEDNS_POLL_TIMEOUT_SEC, 1800),
+                enrich_logs=edgedns_yaml.get(_KEY_EDGEDNS_ENRICH_LOGS, False),
+                source=_get_edgedns_source(edgedns_yaml),
+                transfer=_get_zone_transfer_config(edgedns_yaml.get(_KEY_EDGEDNS_TRANSFER, None))
             )
 
         # Akamai OPEN Config
@@ -272,24 +589,20 @@ def read_yaml_config(yaml_stream) -> Optional[Config]:
                 hec_port=splunk_yaml[_KEY_SPLUNK_HEC_PORT],
                 hec_use_ssl=splunk_yaml[_KEY_SPLUNK_HEC_SSL],
                 hec_ssl_verify=splunk_yaml.get(_KEY_SPLUNK_HEC_SSL_VERIFY, True),
-                lds_hec=HecConfig(
-                    source_type=splunk_lds_yaml.get(_KEY_SPLUNK_HEC_SOURCE_TYPE, None),
-                    index=splunk_lds_yaml.get(_KEY_SPLUNK_HEC_INDEX, None),
-                    token=splunk_lds_yaml[_KEY_SPLUNK_HEC_TOKEN],
-                    event_batch_size=splunk_lds_yaml.get(_KEY_SPLUNK_HEC_BATCH_SIZE, 10)
-                ),
-                edgedns_hec=None
+                lds_hec=_get_hec_config(splunk_lds_yaml),
+                edgedns_hec=None,
+                additional_hosts=splunk_yaml.get(_KEY_SPLUNK_ADDITIONAL_HOSTS, []),
+                load_balancing=_get_hec_load_balancing(splunk_yaml),
+                endpoint_eject_sec=splunk_yaml.get(_KEY_SPLUNK_ENDPOINT_EJECT_SEC, 30),
+                retry=_get_retry_config(splunk_yaml.get(_KEY_SPLUNK_RETRY, None)),
+                dead_letter_path=splunk_yaml.get(_KEY_SPLUNK_DEAD_LETTER_PATH, None),
+                adaptive_batch=_get_adaptive_batch_config(splunk_yaml.get(_KEY_SPLUNK_ADAPTIVE_BATCH, None))
             )
 
             # Splunk Edge DNS HEC Config
             splunk_edgedns_yaml = splunk_yaml.get(_KEY_SPLUNK_HEC_EDGEDNS)
             if splunk_edgedns_yaml is not None:
-                splunk_config.edgedns_hec = HecConfig(
-                    source_type=splunk_edgedns_yaml.get(_KEY_SPLUNK_HEC_SOURCE_TYPE, None),
-                    index=splunk_edgedns_yaml.get(_KEY_SPLUNK_HEC_INDEX, None),
-                    token=splunk_edgedns_yaml[_KEY_SPLUNK_HEC_TOKEN],
-                    event_batch_size=splunk_edgedns_yaml.get(_KEY_SPLUNK_HEC_BATCH_SIZE, 10)
-                )
+                splunk_config.edgedns_hec = _get_hec_config(splunk_edgedns_yaml)
 
         # LDS Config
         lds_yaml = yaml_config[_KEY_LDS]
@@ -306,7 +619,14 @@ def read_yaml_config(yaml_stream) -> Optional[Config]:
             log_download_dir=os.path.abspath(lds_yaml[_KEY_LDS_LOG_DIR]),
             timestamp_parse=lds_yaml[_KEY_LDS_TIMESTAMP_PARSE],
             timestamp_strptime=lds_yaml[_KEY_LDS_TIMESTAMP_STRPTIME],
-            poll_period_sec=lds_yaml.get(_KEY_LDS_LOG_POLL_PERIOD_SEC, 60)
+            poll_period_sec=lds_yaml.get(_KEY_LDS_LOG_POLL_PERIOD_SEC, 60),
+            batch_linger_sec=lds_yaml.get(_KEY_LDS_BATCH_LINGER_SEC, 5),
+            poll_deadline_sec=lds_yaml.get(_KEY_LDS_LOG_POLL_DEADLINE_SEC, None),
+            download_workers=lds_yaml.get(_KEY_LDS_DOWNLOAD_WORKERS, 1),
+            prefetch_log_files=lds_yaml.get(_KEY_LDS_PREFETCH_LOG_FILES, 1),
+            parse_workers=lds_yaml.get(_KEY_LDS_PARSE_WORKERS, 1),
+            serialize_workers=lds_yaml.get(_KEY_LDS_SERIALIZE_WORKERS, 1),
+            queued_chunks=lds_yaml.get(_KEY_LDS_QUEUED_CHUNKS, 4)
         )
 
         # SysLog Config
@@ -334,7 +654,32 @@ def read_yaml_config(yaml_stream) -> Optional[Config]:
                 lds_app_name=syslog_yaml[_KEY_SYSLOG_LDS_APP_NAME],
                 edgedns_app_name=syslog_yaml.get(_KEY_SYSLOG_EDGEDNS_APP_NAME, None),
                 delimiter_method=delimiter,
-                from_host=syslog_yaml.get(_KEY_SYSLOG_FROM_HOST, None)
+                from_host=syslog_yaml.get(_KEY_SYSLOG_FROM_HOST, None),
+                max_write_bytes=syslog_yaml.get(_KEY_SYSLOG_MAX_WRITE_BYTES, 65536),
+                connections=syslog_yaml.get(_KEY_SYSLOG_CONNECTIONS, 1),
+                additional_hosts=syslog_yaml.get(_KEY_SYSLOG_ADDITIONAL_HOSTS, []),
+                udp_max_rate_per_sec=syslog_yaml.get(_KEY_SYSLOG_UDP_MAX_RATE_PER_SEC, None),
+                udp_burst=syslog_yaml.get(_KEY_SYSLOG_UDP_BURST, None),
+                max_datagram_bytes=syslog_yaml.get(_KEY_SYSLOG_MAX_DATAGRAM_BYTES, None),
+                datagram_overflow=_get_syslog_datagram_overflow(syslog_yaml),
+                dns_cache_sec=syslog_yaml.get(_KEY_SYSLOG_DNS_CACHE_SEC, 300),
+                retry=_get_retry_config(syslog_yaml.get(_KEY_SYSLOG_RETRY, None)),
+                relp_window=syslog_yaml.get(_KEY_SYSLOG_RELP_WINDOW, 128),
+                send_timeout_sec=syslog_yaml.get(_KEY_SYSLOG_SEND_TIMEOUT_SEC, 300),
+                event_batch_size=syslog_yaml.get(_KEY_SYSLOG_BATCH_SIZE, 100),
+                batch_bytes=syslog_yaml.get(_KEY_SYSLOG_BATCH_BYTES, 65536)
+            )
+
+        # Spool Config
+        spool_yaml = yaml_config.get(_KEY_SPOOL, None)
+        spool_config = None
+        if spool_yaml is not None:
+            spool_defaults = SpoolConfig(directory='')
+            spool_config = SpoolConfig(
+                directory=os.path.abspath(spool_yaml[_KEY_SPOOL_DIR]),
+                max_bytes=spool_yaml.get(_KEY_SPOOL_MAX_BYTES, spool_defaults.max_bytes),
+                segment_bytes=spool_yaml.get(_KEY_SPOOL_SEGMENT_BYTES, spool_defaults.segment_bytes),
+                flush_events=spool_yaml.get(_KEY_SPOOL_FLUSH_EVENTS, spool_defaults.flush_events)
             )
 
         config = Config(
@@ -342,7 +687,8 @@ def read_yaml_config(yaml_stream) -> Optional[Config]:
             syslog=syslog_config,
             lds=lds_config,
             edgedns=edgedns_config,
-            open=open_config
+            open=open_config,
+            spool=spool_config
         )
 
         if not is_config_valid(config):
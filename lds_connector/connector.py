@@ -17,127 +17,468 @@
 
 import logging
 import os
-from typing import Optional
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
 from datetime import datetime, timezone
 import parse
 
 from .config import Config
+from .dns_index import DnsRecordIndex, create_dns_index
+from .dns_record import DnsRecord
+from .dns_snapshot import DnsRecordSnapshot, create_dns_snapshot
 from .edgedns_manager import EdgeDnsManager, create_edgedns_manager
 from .handler import Handler
 from .log_file import LogFile, LogEvent
 from .log_manager import LogManager
+from .pipeline_stats import PipelineStats, STAGE_PARSE, STAGE_SEND, STAGE_SERIALIZE
 from .splunk import Splunk
+from .spool import create_spool
 from .syslog import SysLog
 
 
+@dataclass
+class _PendingLogFile:
+    log_file: LogFile
+    queued_line: int
+    complete: bool = False # Every line was queued
+    finished: bool = False # No more lines will be queued
+    failed: bool = False # Processing failed. Its remaining lines are skipped
+
+
+@dataclass
+class _LogChunk:
+    pending_log_file: _PendingLogFile
+    # Resolves to the chunk's log events, with their line numbers. None marks the end of the log file
+    log_events: Optional[Future]
+    # The line number of the chunk's last line
+    last_line: int = 0
+
+
 class Connector:
     """
     Connector script entry-point
     """
+    # Log lines per chunk passed between pipeline stages
+    _CHUNK_LINES = 500
+    _PUT_TIMEOUT_SEC = 0.1
 
     def __init__(
             self,
             config: Config,
             log_manager: LogManager,
             edgedns: Optional[EdgeDnsManager],
-            event_handler: Handler
+            event_handler: Handler,
+            dns_snapshot: Optional[DnsRecordSnapshot] = None,
+            dns_index: Optional[DnsRecordIndex] = None,
+            dns_event_handler: Optional[Handler] = None,
+            stats: Optional[PipelineStats] = None
     ):
         self.config = config
         self.log_manager: LogManager = log_manager
         self.edgedns: Optional[EdgeDnsManager] = edgedns
         self.event_handler: Handler = event_handler
+        # DNS records are published through their own handler, if set, so they don't contend with log lines
+        self.dns_event_handler: Handler = event_handler if dns_event_handler is None else dns_event_handler
+        # If set, only DNS record changes are delivered
+        self.dns_snapshot: Optional[DnsRecordSnapshot] = dns_snapshot
+        # If set, log lines are enriched with the latest DNS records
+        self.dns_index: Optional[DnsRecordIndex] = dns_index
         self.total_processed = 0
+        # Shared with the log manager, which records the stages before parsing
+        self.stats: PipelineStats = PipelineStats() if stats is None else stats
+
+        # Log lines are parsed and serialized by worker pools, a chunk at a time
+        self.parse_executor = ThreadPoolExecutor(max_workers=config.lds.parse_workers, thread_name_prefix='parse')
+        self.serialize_executor = ThreadPoolExecutor(
+            max_workers=config.lds.serialize_workers, thread_name_prefix='serialize')
+        # Set once the send thread stops early, because the destination is unavailable
+        self.send_stopped = threading.Event()
+
+        # Log files being read, or with lines queued in the event handler that aren't published yet. Oldest first.
+        # Added to by the poll thread, and committed by the send thread
+        self.pending_lock = threading.Lock()
+        self.pending_log_files: List[_PendingLogFile] = []
+        # When the oldest queued log line was queued, if any
+        self.linger_start: Optional[float] = None
 
 
     def process_dns_records(self) -> None:
         """
-        Process available DNS records
+        Process available DNS records. Each page of records is published as it's fetched
         """
         if self.edgedns is None:
             return
 
         logging.info('Processing DNS records')
 
-        records = self.edgedns.get_records()
+        # Every zone is fetched when a full resync is due, even those that haven't changed
+        skip_unchanged = self.dns_snapshot is None or not self.dns_snapshot.is_full_sync_due()
+        if self.dns_snapshot is not None:
+            self.dns_snapshot.start()
+        if self.dns_index is not None:
+            self.dns_index.start()
 
-        for record in records:
-            self.event_handler.add_dns_record(record)
-            self.event_handler.publish_dns_records()
+        available = True
+        pages = self.edgedns.iter_record_pages(skip_unchanged=skip_unchanged)
+        try:
+            for records in pages:
+                if self.dns_index is not None:
+                    self.dns_index.add_records(records)
+                if self.dns_snapshot is not None:
+                    records = self.dns_snapshot.diff_records(records)
+                self._add_dns_records(records)
+                if not self.dns_event_handler.is_available():
+                    # Stop fetching, rather than queue the rest of the zone in memory
+                    available = False
+                    break
+        finally:
+            # Stop the fetch now, rather than when the generator is garbage collected
+            pages.close()
+
+        # Zones fetched before stopping are still indexed. Others keep their previous records
+        if self.dns_index is not None:
+            self.dns_index.finish(complete_zones=self.edgedns.complete_zones)
+
+        if available:
+            # Removed records are only known once every page is fetched
+            if self.dns_snapshot is not None:
+                self._add_dns_records(self.dns_snapshot.finish(complete_zones=self.edgedns.complete_zones))
+            self.dns_event_handler.publish_dns_records(force=True)
+
+        if not self.dns_event_handler.is_available():
+            # Keep the previous snapshot and zone serials, so the same records are delivered next poll. The queued
+            # records are dropped, so they aren't sent along with next poll's
+            logging.warning('Destination unavailable. DNS records will be sent again next poll')
+            self.dns_event_handler.clear_dns_records()
+            return
 
-        self.event_handler.publish_dns_records(force=True)
+        if self.dns_snapshot is not None:
+            self.dns_snapshot.commit()
+        self.edgedns.commit_zone_serials()
 
         logging.info('Processed DNS records')
 
-    def process_log_files(self) -> None:
+    def _add_dns_records(self, records: List[DnsRecord]) -> None:
+        for record in records:
+            self.dns_event_handler.add_dns_record(record)
+            self.dns_event_handler.publish_dns_records()
+
+    def process_log_files(self, deadline: Optional[float] = None) -> None:
         """
         Process all available log files
+
+        Log lines go through a pipeline. This thread reads each log file into chunks of lines, which are parsed by
+        lds.parse_workers workers, then serialized for the destination by lds.serialize_workers workers. A send thread
+        takes the chunks in order, queues their log events in the event handler, and publishes them. At most
+        lds.queued_chunks chunks wait to be sent, so reading pauses while sending catches up.
+
+        Batches span log files. A log file's progress is saved once all of its queued lines are published.
+
+        Parameters:
+            deadline (Optional[float]): When to stop starting new log files, from time.monotonic. The remaining log
+                files are processed next poll. If None, all available log files are processed.
+
+        Returns: None
         """
         logging.info('Processing any new log files...')
         self.total_processed = 0
+        self.send_stopped.clear()
 
-        log_file = self.log_manager.get_next_log()
+        # Chunks in log file order. None marks the end of the poll
+        chunks: queue.Queue = queue.Queue(maxsize=self.config.lds.queued_chunks)
+        sender = threading.Thread(target=self._send_log_chunks, args=(chunks,), name='send', daemon=True)
+        sender.start()
 
+        log_file = self.log_manager.get_next_log()
         while log_file is not None:
-            self._process_log_file(log_file)
+            if not self._read_log_file(log_file, chunks):
+                break
+
+            if deadline is not None and time.monotonic() >= deadline:
+                logging.warning('Log poll deadline reached. Remaining log files will be processed next poll')
+                break
+
             log_file = self.log_manager.get_next_log()
 
+        # The send thread publishes the final partial batch once it's sent every chunk
+        self._put_log_chunk(chunks, None)
+        sender.join()
+
+        if self.send_stopped.is_set():
+            # Destination is down. Resume from the checkpoint on a later poll
+            logging.warning('Destination unavailable. Pausing log processing until next poll')
+            self._requeue_log_files(chunks)
+
         logging.info('Finished processing all new log files. Total logs processed: %s', self.total_processed)
+        logging.info('Log pipeline stages: %s', self.stats.summary())
+        self.stats.reset()
+
+    def close(self) -> None:
+        """
+        Stop the log pipeline's workers, the log manager's downloads, and the event handlers
 
-    def _process_log_file(self, log_file: LogFile) -> None:
+        Parameters: None
+        Returns: None
+        """
+        self.parse_executor.shutdown(wait=True)
+        self.serialize_executor.shutdown(wait=True)
+        self.log_manager.close()
+        self.event_handler.close()
+        if self.dns_event_handler is not self.event_handler:
+            self.dns_event_handler.close()
+
+    def _read_log_file(self, log_file: LogFile, chunks: queue.Queue) -> bool:
         """
-        Process a single log file
+        Read a log file into chunks of lines, and queue them to be parsed, serialized and sent
 
         Parameters:
             log_file (LogFile): The log file to process
+            chunks (queue.Queue): The chunks waiting to be sent
 
-        Returns: None
+        Returns:
+            bool: If the destination is available, true. Otherwise, false.
         """
         logging.info('Processing log file: %s', log_file.filename_gz)
+        pending_log_file = _PendingLogFile(log_file=log_file, queued_line=log_file.last_processed_line)
+        with self.pending_lock:
+            self.pending_log_files.append(pending_log_file)
+
         try:
             with open(log_file.local_path_txt, 'r', encoding='utf-8') as file:
-                self._process_log_lines(log_file, file)
-
+                if not self._read_log_lines(pending_log_file, file, chunks):
+                    return False
         except Exception as exception:
             logging.error(
                 'An unexpected error has occurred processing log file. Ignoring and moving on [%s]',
                 exception)
+            pending_log_file.failed = True
         finally:
-            self.log_manager.update_last_log_files()
-            self.event_handler.clear()
-            logging.info(
-                'Processed log file: %s. Last line number: %d', 
-                log_file.filename_gz, 
-                log_file.last_processed_line)
-            self.total_processed += log_file.last_processed_line
             os.remove(log_file.local_path_txt)
 
-    def _process_log_lines(self, log_file: LogFile, file):
-        log_line = file.readline()
-        line_number = 1
+        # The send thread finishes the log file once its chunks are sent
+        return self._put_log_chunk(chunks, _LogChunk(pending_log_file, log_events=None))
 
-        # Skip lines that have already been processed
-        while line_number <= log_file.last_processed_line:
-            log_line = file.readline()
+    def _read_log_lines(self, pending_log_file: _PendingLogFile, file, chunks: queue.Queue) -> bool:
+        lines: List[str] = []
+        line_number = 0
+        for log_line in file:
             line_number += 1
+            # Skip lines that have already been processed
+            if line_number <= pending_log_file.log_file.last_processed_line:
+                continue
+
+            lines.append(log_line)
+            if len(lines) == Connector._CHUNK_LINES:
+                if not self._queue_log_lines(pending_log_file, lines, line_number, chunks):
+                    return False
+                lines = []
+
+        return not lines or self._queue_log_lines(pending_log_file, lines, line_number, chunks)
+
+    def _queue_log_lines(self, pending_log_file: _PendingLogFile, lines: List[str], last_line: int,
+            chunks: queue.Queue) -> bool:
+        parsed = self.parse_executor.submit(self._parse_log_lines, lines, last_line - len(lines) + 1)
+        serialized = self.serialize_executor.submit(self._serialize_log_events, parsed)
+        return self._put_log_chunk(chunks, _LogChunk(pending_log_file, log_events=serialized, last_line=last_line))
+
+    def _put_log_chunk(self, chunks: queue.Queue, chunk: Optional[_LogChunk]) -> bool:
+        # If the send thread stopped, nothing takes from the queue. Give up instead of blocking forever
+        while not self.send_stopped.is_set():
+            try:
+                chunks.put(chunk, timeout=Connector._PUT_TIMEOUT_SEC)
+                self.stats.set_queue_depth(STAGE_SERIALIZE, chunks.qsize())
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _parse_log_lines(self, lines: List[str], first_line: int) -> List[Tuple[int, LogEvent]]:
+        """
+        Parse a chunk of log lines. Runs on a parse worker
 
-        while log_line:
+        Parameters:
+            lines (List[str]): The log lines
+            first_line (int): The line number of the first line
+
+        Returns:
+            List[Tuple[int, LogEvent]]: The log events, with their line numbers. Lines that fail to parse are left out
+        """
+        start = time.monotonic()
+        log_events = []
+        for line_number, log_line in enumerate(lines, first_line):
             log_event = self._create_log_event(log_line)
-            if not log_event:
-                log_line = file.readline()
-                line_number += 1
-                continue
+            if log_event is not None:
+                log_events.append((line_number, log_event))
+        self.stats.add(STAGE_PARSE, time.monotonic() - start, items=len(lines))
+        return log_events
 
-            self.event_handler.add_log_line(log_event)
-            if self.event_handler.publish_log_lines():
-                log_file.last_processed_line = line_number
+    def _serialize_log_events(self, parsed: Future) -> List[Tuple[int, LogEvent]]:
+        """
+        Serialize a chunk of log events for the event handler. Runs on a serialize worker
 
-            log_line = file.readline()
-            line_number += 1
+        Parameters:
+            parsed (Future): The chunk's parsed log events, with their line numbers
 
-        # Publish remaining log lines
-        if self.event_handler.publish_log_lines(force=True):
-            log_file.last_processed_line = line_number - 1
-        log_file.processed = True
+        Returns:
+            List[Tuple[int, LogEvent]]: The serialized log events, with their line numbers
+        """
+        log_events = parsed.result()
+        start = time.monotonic()
+        for _, log_event in log_events:
+            self.event_handler.serialize_log_line(log_event)
+        self.stats.add(STAGE_SERIALIZE, time.monotonic() - start, items=len(log_events))
+        return log_events
+
+    def _send_log_chunks(self, chunks: queue.Queue) -> None:
+        """
+        Send chunks of log events in order, until the end of the poll or until the destination is unavailable. Runs on
+        the send thread. A partial batch is published once its oldest line has waited lds.batch_linger_sec, even while
+        no chunks arrive
+
+        Parameters:
+            chunks (queue.Queue): The chunks waiting to be sent
+
+        Returns: None
+        """
+        try:
+            while True:
+                try:
+                    chunk = chunks.get(timeout=self._linger_remaining_sec())
+                except queue.Empty:
+                    # The partial batch has waited long enough
+                    if not self._publish_log_lines(force=True):
+                        break
+                    continue
+                self.stats.set_queue_depth(STAGE_SERIALIZE, chunks.qsize())
+
+                if chunk is None:
+                    # No more log files this poll. Publish the final partial batch
+                    if not self._publish_log_lines(force=True):
+                        break
+                    return
+                if not self._send_log_chunk(chunk):
+                    break
+        except Exception:
+            logging.exception('Failed sending log lines')
+        self.send_stopped.set()
+
+    def _send_log_chunk(self, chunk: _LogChunk) -> bool:
+        """
+        Queue a chunk's log events in the event handler, publishing as batches fill
+
+        Parameters:
+            chunk (_LogChunk): The chunk
+
+        Returns:
+            bool: If the destination is available, true. Otherwise, false.
+        """
+        pending_log_file = chunk.pending_log_file
+        if chunk.log_events is None:
+            pending_log_file.finished = True
+            pending_log_file.complete = not pending_log_file.failed
+            logging.info(
+                'Processed log file: %s. Last line number: %d',
+                pending_log_file.log_file.filename_gz,
+                pending_log_file.queued_line)
+            self.total_processed += max(pending_log_file.queued_line, 0)
+            return True
+        if pending_log_file.failed:
+            # The rest of the log file is skipped
+            chunk.log_events.cancel()
+            return True
+
+        try:
+            log_events = chunk.log_events.result()
+            for line_number, log_event in log_events:
+                start = time.monotonic()
+                self.event_handler.add_log_line(log_event)
+                self.stats.add(STAGE_SEND, time.monotonic() - start)
+                pending_log_file.queued_line = line_number
+                if self.linger_start is None:
+                    self.linger_start = time.time()
+
+                if not self._publish_log_lines(force=self._linger_remaining_sec() == 0):
+                    return False
+            # Trailing lines that didn't produce events are done too
+            pending_log_file.queued_line = chunk.last_line
+        except Exception as exception:
+            logging.error(
+                'An unexpected error has occurred processing log file. Ignoring and moving on [%s]',
+                exception)
+            pending_log_file.failed = True
+        return True
+
+    def _linger_remaining_sec(self) -> Optional[float]:
+        # How long until the queued log lines must be published. None if none are queued
+        if self.linger_start is None:
+            return None
+        return max(0.0, self.linger_start + self.config.lds.batch_linger_sec - time.time())
+
+    def _publish_log_lines(self, force: bool) -> bool:
+        """
+        Publish queued log lines. If published, save the progress of the log files they came from
+
+        Parameters:
+            force (bool): If true, publish queued log lines. Otherwise, publish iff the batch is full.
+
+        Returns:
+            bool: If the destination is available, true. Otherwise, false.
+        """
+        if self.linger_start is None:
+            # Nothing queued. Lines that didn't produce events still need their progress saved
+            if force:
+                self._commit_log_files()
+            return True
+
+        start = time.monotonic()
+        published = self.event_handler.publish_log_lines(force=force)
+        # Saving progress is timed separately, as the checkpoint stage
+        self.stats.add(STAGE_SEND, time.monotonic() - start, items=0)
+        if published:
+            self._commit_log_files()
+            return True
+
+        return self.event_handler.is_available()
+
+    def _commit_log_files(self) -> None:
+        self.linger_start = None
+
+        with self.pending_lock:
+            for pending_log_file in self.pending_log_files:
+                pending_log_file.log_file.last_processed_line = pending_log_file.queued_line
+            finished = [p for p in self.pending_log_files if p.finished]
+            # Log files still being read or sent stay pending
+            self.pending_log_files = [p for p in self.pending_log_files if not p.finished]
+
+        for pending_log_file in finished:
+            pending_log_file.log_file.processed = pending_log_file.complete
+            self.log_manager.update_last_log_files(pending_log_file.log_file)
+
+    def _requeue_log_files(self, chunks: queue.Queue) -> None:
+        """
+        Drop the queued log lines, and retry the log files they came from, starting at their last checkpoint. Called
+        once the send thread has stopped
+
+        Parameters:
+            chunks (queue.Queue): The chunks the send thread didn't take
+
+        Returns: None
+        """
+        while not chunks.empty():
+            chunk = chunks.get_nowait()
+            if chunk is not None and chunk.log_events is not None:
+                chunk.log_events.cancel()
+        self.stats.set_queue_depth(STAGE_SERIALIZE, 0)
+
+        self.event_handler.clear()
+        self.linger_start = None
+        with self.pending_lock:
+            self.log_manager.requeue_log_files([p.log_file for p in self.pending_log_files])
+            self.pending_log_files.clear()
 
     def _create_log_event(self, log_line: str) -> Optional[LogEvent]:
         if log_line[-1] == '\n':
@@ -149,10 +490,13 @@ class Connector:
             logging.error('Failed parsing timestamp from log line. Ignoring line: %s', log_line)
             return None
 
-        return LogEvent(
+        log_event = LogEvent(
             log_line=log_line,
             timestamp=timestamp
         )
+        if self.dns_index is not None:
+            self.dns_index.enrich(log_event)
+        return log_event
 
     def _parse_timestamp(self, log_line: str) -> datetime:
         """
@@ -177,17 +521,32 @@ class Connector:
         timestamp_datetime = timestamp_datetime.replace(tzinfo=timezone.utc)
         return timestamp_datetime
 
-def build_connector(config: Config) -> Connector:
+def _create_event_handler(config: Config) -> Handler:
     event_handler = None
     if config.splunk is not None:
         event_handler = Splunk(config)
     if config.syslog is not None:
         event_handler = SysLog(config)
     assert event_handler is not None
+    return event_handler
+
+
+def build_connector(config: Config) -> Connector:
+    stats = PipelineStats()
+
+    # Log lines and DNS records are processed concurrently, so each gets its own handler and connections.
+    # DNS records aren't spooled. Undelivered records are sent again next poll
+    dns_event_handler = None
+    if config.edgedns is not None and config.edgedns.send_records:
+        dns_event_handler = _create_event_handler(config)
 
     return Connector(
         config=config,
-        log_manager=LogManager(config),
+        log_manager=LogManager(config, stats),
         edgedns=create_edgedns_manager(config),
-        event_handler=event_handler
+        event_handler=create_spool(config, _create_event_handler(config)),
+        dns_snapshot=create_dns_snapshot(config),
+        dns_index=create_dns_index(config),
+        dns_event_handler=dns_event_handler,
+        stats=stats
     )
\ No newline at end of file
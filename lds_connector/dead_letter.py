@@ -0,0 +1,54 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+
+
+class DeadLetterFile:
+    """
+    Append-only file of events the destination permanently rejected. Events are written one per line, exactly as
+    they were sent, so they can be inspected, fixed, and replayed
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.total_events = 0
+
+    def write(self, payload: bytes, event_count: int, reason: str) -> None:
+        """
+        Append rejected events to the dead letter file
+
+        Parameters:
+            payload (bytes): The rejected events, newline delimited
+            event_count (int): The number of events in the payload
+            reason (str): Why the events were rejected
+
+        Returns: None
+        """
+        logging.error('Writing %d rejected events to dead letter file %s. Reason: %s', event_count, self.path, reason)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(self.path, 'ab') as file:
+            file.write(payload)
+            if not payload.endswith(b'\n'):
+                file.write(b'\n')
+
+        self.total_events += event_count
@@ -0,0 +1,179 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Collection, Dict, List, Optional, Set, Tuple
+
+from .config import Config
+from .dns_record import DnsRecord
+from .log_file import LogEvent
+
+# Name to record type to record
+NameIndex = Dict[str, Dict[str, DnsRecord]]
+
+
+class DnsRecordIndex:
+    """
+    In-memory index of the latest Edge DNS records, used to enrich DNS log lines. Each log line is appended with the
+    matched record type, its TTL, and whether the query name exists:
+
+        <log line>,A,300,true
+
+    The index is rebuilt on each record poll, then replaced in a single assignment, so lookups always see a complete
+    index. Zones that weren't fetched completely keep their previous records.
+
+    Every ancestor of an owner name within its zone exists too, even without records of its own (an empty
+    non-terminal). Wildcards follow RFC 4592: only the closest existing ancestor's wildcard answers a missing name.
+    """
+    # Fields of the Edge DNS log line: timestamp,client IP,client port,qname,class,qtype,...
+    _QNAME_FIELD = 3
+    _QTYPE_FIELD = 5
+
+    def __init__(self):
+        self.names: NameIndex = {}
+        # Owner names and their ancestors within their zones
+        self.existing: Set[str] = set()
+        self.zones: Set[str] = set()
+
+        # Index being built by the poll in progress
+        self.pending_names: Optional[NameIndex] = None
+
+    def start(self) -> None:
+        """
+        Start rebuilding the index from a record poll
+
+        Parameters: None
+        Returns: None
+        """
+        self.pending_names = {}
+
+    def add_records(self, records: List[DnsRecord]) -> None:
+        """
+        Add a page of fetched records to the index being rebuilt
+
+        Parameters:
+            records (List[DnsRecord]): The fetched records
+
+        Returns: None
+        """
+        assert self.pending_names is not None, 'Unexpected state. Index rebuild was not started'
+        for record in records:
+            self.pending_names.setdefault(DnsRecordIndex._normalize(record.name), {})[record.type] = record
+
+    def finish(self, complete_zones: Collection[str]) -> None:
+        """
+        Replace the index with the rebuilt one
+
+        Parameters:
+            complete_zones (Collection[str]): The zones whose every record was fetched. Other zones keep their
+                previous records
+
+        Returns: None
+        """
+        assert self.pending_names is not None, 'Unexpected state. Index rebuild was not started'
+        names = self.pending_names
+        self.pending_names = None
+
+        for name, records in self.names.items():
+            for record_type, record in records.items():
+                if record.zone not in complete_zones:
+                    names.setdefault(name, {}).setdefault(record_type, record)
+
+        zones = {DnsRecordIndex._normalize(record.zone) for records in names.values() for record in records.values()}
+        existing: Set[str] = set()
+        for name, records in names.items():
+            zone = DnsRecordIndex._normalize(next(iter(records.values())).zone)
+            existing.update(DnsRecordIndex._ancestors(name, zone))
+
+        # Swap in the new index. Lookups use either the old or the new one, never a partial one
+        self.names, self.existing, self.zones = names, existing, zones
+
+    def lookup(self, qname: str, qtype: str) -> Optional[Tuple[Optional[DnsRecord], bool]]:
+        """
+        Look up the record answering a DNS query
+
+        Parameters:
+            qname (str): The query name
+            qtype (str): The query type
+
+        Returns:
+            Optional[Tuple[Optional[DnsRecord], bool]]: The matched record, if any, and whether the name exists. If
+                the name isn't in an indexed zone, None.
+        """
+        names, existing, zones = self.names, self.existing, self.zones
+        name = DnsRecordIndex._normalize(qname)
+        labels = name.split('.')
+        ancestors = ['.'.join(labels[index:]) for index in range(1, len(labels))]
+        if name not in zones and not any(ancestor in zones for ancestor in ancestors):
+            return None
+
+        if name in existing:
+            node = names.get(name)
+            if node is None:
+                # Empty non-terminal. It exists, but has no records
+                return None, True
+        else:
+            # Only the closest existing ancestor's wildcard, if any, answers the query
+            encloser = next((ancestor for ancestor in ancestors if ancestor in existing or ancestor in zones), None)
+            node = None if encloser is None else names.get('*.' + encloser)
+            if node is None:
+                return None, False
+
+        record = node.get(qtype.upper(), None) or node.get('CNAME', None)
+        return record, True
+
+    def enrich(self, log_event: LogEvent) -> None:
+        """
+        Append the matched record type, TTL, and whether the name exists to a log line. If the log line can't be
+        parsed or its name isn't in an indexed zone, the fields are empty.
+
+        Parameters:
+            log_event (LogEvent): The log event to enrich
+
+        Returns: None
+        """
+        fields = log_event.log_line.split(',')
+        result = None
+        if len(fields) > DnsRecordIndex._QTYPE_FIELD:
+            result = self.lookup(fields[DnsRecordIndex._QNAME_FIELD], fields[DnsRecordIndex._QTYPE_FIELD])
+
+        if result is None:
+            log_event.log_line += ',,,'
+            return
+        record, exists = result
+        if record is None:
+            log_event.log_line += f',,,{str(exists).lower()}'
+            return
+        log_event.log_line += f',{record.type},{record.ttl_sec},true'
+
+    @staticmethod
+    def _ancestors(name: str, zone: str) -> List[str]:
+        # The name and its ancestors, up to the zone apex
+        ancestors = [name]
+        while name != zone and '.' in name:
+            name = name.split('.', 1)[1]
+            ancestors.append(name)
+        return ancestors
+
+    @staticmethod
+    def _normalize(name: str) -> str:
+        return name.lower().rstrip('.')
+
+
+def create_dns_index(config: Config) -> Optional[DnsRecordIndex]:
+    if config.edgedns is None or not config.edgedns.send_records or not config.edgedns.enrich_logs:
+        return None
+    return DnsRecordIndex()
@@ -27,3 +27,15 @@ class DnsRecord:
     type: str
     ttl_sec: int
     rdata: List[str]
+
+
+@dataclass
+class DnsRecordChange(DnsRecord):
+    """
+    A DNS record that was added, changed or removed since the previous poll. Removed records have no TTL or rdata
+    """
+    ADDED = 'ADDED'
+    CHANGED = 'CHANGED'
+    REMOVED = 'REMOVED'
+
+    change: str
@@ -0,0 +1,223 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from typing import Collection, Dict, List, Optional, Tuple
+
+from .config import Config
+from .dns_record import DnsRecord, DnsRecordChange
+
+# (zone, name, type)
+RecordKey = Tuple[str, str, str]
+
+
+class DnsRecordSnapshot:
+    """
+    The record set delivered by the previous poll. Each record is stored as a hash of its TTL and rdata, keyed by its
+    zone, name and type. Comparing a newly fetched record set against it gives only the records that changed.
+
+    Records can be compared a page at a time: start, then diff_records for each page, then finish for the removed
+    records. The snapshot is saved to disk once the changes are delivered, so it survives restarts.
+    """
+    _SNAPSHOT_PICKLE_FILE_NAME = 'dns_snapshot.pickle'
+
+    def __init__(self, path: str, full_resync_sec: int):
+        self.path = path
+        self.full_resync_sec = full_resync_sec
+
+        self.hashes: Dict[RecordKey, str] = {}
+        # When every record was last delivered. Zero if never
+        self.last_full_sync_sec = 0.0
+
+        # Snapshot to save once the last diff is delivered
+        self.pending_hashes: Optional[Dict[RecordKey, str]] = None
+        self.pending_full_sync_sec: Optional[float] = None
+        # Whether the diff in progress delivers every record
+        self.full_sync = False
+
+        if os.path.isfile(self.path):
+            with open(self.path, 'rb') as file:
+                self.hashes, self.last_full_sync_sec = pickle.load(file)
+
+    def diff(self, records: List[DnsRecord], complete_zones: Optional[Collection[str]] = None) -> List[DnsRecord]:
+        """
+        Compare fetched records against the snapshot
+
+        If a full resync is due, every record is returned unchanged, along with the removed records. Otherwise, only
+        added, changed and removed records are returned as DnsRecordChange.
+
+        Parameters:
+            records (List[DnsRecord]): The fetched records
+            complete_zones (Optional[Collection[str]]): The zones whose every record was fetched. Records missing from
+                other zones aren't considered removed. If None, every zone was fetched completely
+
+        Returns:
+            List[DnsRecord]: The records to deliver
+        """
+        self.start()
+        changes = self.diff_records(records)
+        return changes + self.finish(complete_zones)
+
+    def start(self) -> None:
+        """
+        Start comparing a fetched record set, a page at a time
+
+        Parameters: None
+        Returns: None
+        """
+        self.full_sync = self.is_full_sync_due()
+        self.pending_hashes = {}
+        self.pending_full_sync_sec = None
+
+    def diff_records(self, records: List[DnsRecord]) -> List[DnsRecord]:
+        """
+        Compare a page of fetched records against the snapshot
+
+        Parameters:
+            records (List[DnsRecord]): The fetched records
+
+        Returns:
+            List[DnsRecord]: The added and changed records. If a full resync is due, every record.
+        """
+        assert self.pending_hashes is not None, 'Unexpected state. Diff was not started'
+        changes: List[DnsRecord] = []
+        for record in records:
+            key = (record.zone, record.name, record.type)
+            record_hash = DnsRecordSnapshot._hash(record)
+            self.pending_hashes[key] = record_hash
+
+            previous_hash = self.hashes.get(key, None)
+            if self.full_sync:
+                changes.append(record)
+            elif previous_hash is None:
+                changes.append(DnsRecordSnapshot._change(record, DnsRecordChange.ADDED))
+            elif previous_hash != record_hash:
+                changes.append(DnsRecordSnapshot._change(record, DnsRecordChange.CHANGED))
+        return changes
+
+    def finish(self, complete_zones: Optional[Collection[str]] = None) -> List[DnsRecord]:
+        """
+        Finish comparing a fetched record set
+
+        Parameters:
+            complete_zones (Optional[Collection[str]]): The zones whose every record was fetched. Records missing from
+                other zones aren't considered removed. If None, every zone was fetched completely
+
+        Returns:
+            List[DnsRecord]: The removed records
+        """
+        assert self.pending_hashes is not None, 'Unexpected state. Diff was not started'
+        now = time.time()
+
+        # Records of incompletely fetched zones carry over, so they're neither removed nor re-added later
+        complete = True
+        if complete_zones is not None:
+            for key, record_hash in self.hashes.items():
+                if key[0] not in complete_zones:
+                    self.pending_hashes.setdefault(key, record_hash)
+                    complete = False
+
+        removed: List[DnsRecord] = []
+        for key in self.hashes.keys() - self.pending_hashes.keys():
+            zone, name, record_type = key
+            removed.append(DnsRecordChange(
+                time_fetched_sec=now,
+                zone=zone,
+                name=name,
+                type=record_type,
+                ttl_sec=0,
+                rdata=[],
+                change=DnsRecordChange.REMOVED
+            ))
+
+        self.pending_full_sync_sec = now if self.full_sync and complete else None
+        logging.info('DNS records removed since last poll: %d%s', len(removed),
+            ' (full resync)' if self.full_sync else '')
+        return removed
+
+    def is_full_sync_due(self) -> bool:
+        """
+        Whether the next diff delivers every record
+
+        Parameters: None
+
+        Returns:
+            bool: If never fully synced, or full_resync_sec has elapsed since, true. Otherwise, false.
+        """
+        return self.last_full_sync_sec == 0 or \
+            (self.full_resync_sec > 0 and time.time() - self.last_full_sync_sec >= self.full_resync_sec)
+
+    def commit(self) -> None:
+        """
+        Save the snapshot from the last diff, once its records are delivered. If saving fails, the previous snapshot
+        is kept, so the next diff delivers the same changes again
+
+        Parameters: None
+        Returns: None
+        """
+        if self.pending_hashes is None:
+            return
+
+        hashes = self.pending_hashes
+        last_full_sync_sec = self.last_full_sync_sec
+        if self.pending_full_sync_sec is not None:
+            last_full_sync_sec = self.pending_full_sync_sec
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Replace the file in one step, so a failed write never leaves a truncated snapshot
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            pickle.dump((hashes, last_full_sync_sec), file)
+        os.replace(temp_path, self.path)
+
+        self.hashes = hashes
+        self.last_full_sync_sec = last_full_sync_sec
+        self.pending_hashes = None
+        self.pending_full_sync_sec = None
+
+    @staticmethod
+    def _hash(record: DnsRecord) -> str:
+        # Record sets are unordered, so rdata order doesn't count as a change
+        content = json.dumps([record.ttl_sec, sorted(record.rdata)], separators=(',', ':'))
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _change(record: DnsRecord, change: str) -> DnsRecordChange:
+        return DnsRecordChange(
+            time_fetched_sec=record.time_fetched_sec,
+            zone=record.zone,
+            name=record.name,
+            type=record.type,
+            ttl_sec=record.ttl_sec,
+            rdata=record.rdata,
+            change=change
+        )
+
+
+def create_dns_snapshot(config: Config) -> Optional[DnsRecordSnapshot]:
+    if config.edgedns is None or not config.edgedns.send_records or not config.edgedns.send_changes_only:
+        return None
+    return DnsRecordSnapshot(
+        path=os.path.join(config.lds.log_download_dir, DnsRecordSnapshot._SNAPSHOT_PICKLE_FILE_NAME),
+        full_resync_sec=config.edgedns.full_resync_sec)
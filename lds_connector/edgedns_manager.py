@@ -16,23 +16,48 @@
 # limitations under the License.
 
 import logging
+import queue
+import threading
 import time
-from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Generator, Optional, List, Set, Tuple
 
 import requests
 from akamai.edgegrid import EdgeGridAuth
+from requests.adapters import HTTPAdapter
 
-from .config import Config
+from .config import Config, EdgeDnsSource
 from .dns_record import DnsRecord
+from .retry import create_backoff, parse_retry_after
+from .zone_transfer import ZoneTransferClient, create_zone_transfer_client
 
 
 class EdgeDnsManager():
+    """
+    Fetches Edge DNS record sets for the configured zones, or every zone the credentials can access. Zones are fetched
+    concurrently over a shared connection pool. Each zone's pages are also fetched concurrently.
+
+    Pages are yielded as they're fetched, so they can be delivered while later pages are still being fetched.
+
+    Record sets come from the paged Edge DNS API by default. Alternatively, they come from an AXFR or IXFR zone
+    transfer, in which case the API is only used to list zones and check SOA serials.
+
+    Every request has a timeout, and a poll gives up on unfetched zones after edgedns.poll_timeout_sec. If a response
+    is throttled or uses up the rate limit, every worker pauses until requests are allowed again.
+    """
+    _RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    _RATE_LIMIT_REMAINING_HEADER = 'X-RateLimit-Remaining'
+    _RATE_LIMIT_NEXT_HEADER = 'X-RateLimit-Next'
+    _TRANSFER_PAGE_SIZE = 100
+    _PAGE_PUT_TIMEOUT_SEC = 0.1
+
     def __init__(self, config: Config):
         assert config.edgedns is not None
         assert config.edgedns.send_records
         assert config.open is not None
 
-        self.records_url = f'https://{config.open.host}/config-dns/v2/zones/{config.edgedns.zone_name}/recordsets'
+        self.api_url = f'https://{config.open.host}/config-dns/v2'
 
         self.open_session = requests.Session()
         self.open_session.auth = EdgeGridAuth(
@@ -40,54 +65,353 @@ class EdgeDnsManager():
             client_secret=config.open.client_secret,
             access_token=config.open.access_token
         )
+        # Enough pooled connections for every zone and page worker
+        pool_size = config.edgedns.zone_workers * config.edgedns.fetch_workers
+        self.open_session.mount('https://', HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size))
+
+        self.zone_transfer: Optional[ZoneTransferClient] = None
+        if config.edgedns.source != EdgeDnsSource.API:
+            assert config.edgedns.transfer is not None
+            self.zone_transfer = create_zone_transfer_client(
+                config.edgedns.transfer, incremental=config.edgedns.source == EdgeDnsSource.IXFR)
 
         self.config = config
+        # Fetched pages not yet consumed. Fetching pauses while it's full
+        self.page_queue_size = pool_size
+        # Zones whose every page was fetched by the last iter_record_pages call
+        self.complete_zones: Set[str] = set()
+        # Zones from the last successful zone listing, reused if listing fails
+        self.listed_zones: List[str] = []
+        # SOA serials of zones whose records were delivered, and those fetched but not yet delivered
+        self.zone_serials: Dict[str, int] = {}
+        self.pending_zone_serials: Dict[str, int] = {}
+        # When the current poll gives up, from time.monotonic
+        self.poll_deadline = 0.0
+        # When requests are allowed again after throttling, from time.time. Shared by every worker
+        self.rate_limit_lock = threading.Lock()
+        self.rate_limited_until = 0.0
+
+    def get_records(self, skip_unchanged: bool = True) -> List[DnsRecord]:
+        """
+        Fetch the record sets of every zone. See iter_record_pages
+
+        Parameters:
+            skip_unchanged (bool): Whether unchanged zones may be skipped. False to fetch every zone
+
+        Returns:
+            List[DnsRecord]: The records. If a zone fails, the records from its pages before the failure.
+        """
+        return [record for records in self.iter_record_pages(skip_unchanged) for record in records]
+
+    def iter_record_pages(self, skip_unchanged: bool = True) -> Generator[List[DnsRecord], None, None]:
+        """
+        Fetch the record sets of every zone, up to edgedns.zone_workers zones at a time, yielding each page's records
+        as soon as they're fetched. Fetching pauses while page_queue_size pages wait to be consumed, so memory use
+        doesn't grow with the zone size. complete_zones is set once every page is consumed. A consumer that stops early
+        should close the generator, which stops the fetch and waits for it.
 
-    def get_records(self) -> List[DnsRecord]:
+        If edgedns.skip_unchanged_zones is set, each zone's SOA serial is checked first. Zones whose serial matches the
+        last delivered records are skipped, and aren't in complete_zones.
+
+        Parameters:
+            skip_unchanged (bool): Whether unchanged zones may be skipped. False to fetch every zone
+
+        Returns:
+            Generator[List[DnsRecord], None, None]: Each page's records. Each zone's pages are in order, but different
+                zones' pages interleave. If a zone fails, the pages before the failure.
+        """
         assert self.config.edgedns is not None
-        assert self.config.open is not None
+        self.poll_deadline = time.monotonic() + self.config.edgedns.poll_timeout_sec
 
-        record_set = []
-        query_params = {}
+        zones = self._get_zones()
+        self.complete_zones = set()
+        self.pending_zone_serials = {}
+        if not zones:
+            return
 
-        if self.config.open.account_switch_key is not None:
-            query_params['accountSwitchKey'] = self.config.open.account_switch_key
+        # None marks the end of the fetch
+        pages: queue.Queue = queue.Queue(maxsize=self.page_queue_size)
+        stopped = threading.Event()
+
+        def put_page(records: Optional[List[DnsRecord]]) -> bool:
+            # If the consumer stopped early, nothing takes from the queue. Give up instead of blocking forever
+            while not stopped.is_set():
+                try:
+                    pages.put(records, timeout=EdgeDnsManager._PAGE_PUT_TIMEOUT_SEC)
+                    return not stopped.is_set()
+                except queue.Full:
+                    pass
+            return False
+
+        fetcher = threading.Thread(
+            target=self._fetch_zones, args=(zones, skip_unchanged, put_page, stopped), daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                records = pages.get()
+                if records is None:
+                    break
+                yield records
+        finally:
+            stopped.set()
+            # Empty the queue, so workers blocked putting a page see the stop now rather than after their put times out
+            while fetcher.is_alive():
+                try:
+                    while True:
+                        pages.get_nowait()
+                except queue.Empty:
+                    pass
+                fetcher.join(timeout=EdgeDnsManager._PAGE_PUT_TIMEOUT_SEC)
+
+    def _fetch_zones(self, zones: List[str], skip_unchanged: bool,
+            put_page: Callable[[Optional[List[DnsRecord]]], bool], stopped: threading.Event) -> None:
+        assert self.config.edgedns is not None
+
+        def fetch_zone(zone: str) -> Tuple[bool, Optional[int]]:
+            # Zones not started before the consumer stopped aren't fetched
+            if stopped.is_set():
+                return False, None
+            return self._fetch_zone_records_if_changed(zone, skip_unchanged, put_page)
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.config.edgedns.zone_workers, len(zones))) as executor:
+                zone_results = executor.map(fetch_zone, zones)
+                for zone, (complete, serial) in zip(zones, zone_results):
+                    if complete:
+                        self.complete_zones.add(zone)
+                        if serial is not None:
+                            self.pending_zone_serials[zone] = serial
+        except Exception:
+            logging.exception('Failed fetching Edge DNS records')
+        finally:
+            put_page(None)
+
+    def commit_zone_serials(self) -> None:
+        """
+        Remember the SOA serials of the zones from the last get_records call, once their records are delivered
+
+        Parameters: None
+        Returns: None
+        """
+        self.zone_serials.update(self.pending_zone_serials)
+        self.pending_zone_serials = {}
+
+    def _get_zones(self) -> List[str]:
+        assert self.config.edgedns is not None
+        if not self.config.edgedns.all_zones:
+            zones = [self.config.edgedns.zone_name] if self.config.edgedns.zone_name else []
+            return zones + [zone for zone in self.config.edgedns.zone_names if zone not in zones]
+
+        query_params: Dict[str, Any] = self._base_query_params()
+        query_params['showAll'] = 'true'
+        if self.config.edgedns.contract_id is not None:
+            query_params['contractIds'] = self.config.edgedns.contract_id
+
+        zones_json = self._get_json(f'{self.api_url}/zones', query_params)
+        try:
+            if zones_json is not None:
+                self.listed_zones = [zone_json['zone'] for zone_json in zones_json['zones']]
+        except (KeyError, TypeError) as key_error:
+            logging.error('Edge DNS API returned unexpected zone list [%s]: [%s]', key_error, zones_json)
+
+        return self.listed_zones
+
+    def _fetch_zone_records_if_changed(self, zone: str, skip_unchanged: bool,
+            put_page: Callable[[List[DnsRecord]], bool]) -> Tuple[bool, Optional[int]]:
+        assert self.config.edgedns is not None
+        if not self.config.edgedns.skip_unchanged_zones:
+            return self._fetch_zone_records(zone, put_page), None
+
+        serial = self._get_soa_serial(zone)
+        if skip_unchanged and serial is not None and self.zone_serials.get(zone) == serial:
+            logging.debug('Edge DNS zone unchanged. Skipping record sets: %s', zone)
+            return False, serial
+
+        return self._fetch_zone_records(zone, put_page), serial
+
+    def _get_soa_serial(self, zone: str) -> Optional[int]:
+        soa_json = self._get_json(f'{self.api_url}/zones/{zone}/names/{zone}/types/SOA', self._base_query_params())
+        try:
+            if soa_json is not None:
+                # MNAME RNAME SERIAL REFRESH RETRY EXPIRE MINIMUM
+                return int(soa_json['rdata'][0].split()[2])
+        except (KeyError, TypeError, IndexError, ValueError) as error:
+            logging.warning('Edge DNS API returned unexpected SOA record [%s]: [%s]', error, soa_json)
+        return None
+
+    def _fetch_zone_records(self, zone: str, put_page: Callable[[List[DnsRecord]], bool]) -> bool:
+        """
+        Fetch a zone's record sets. The first page gives the page count. The remaining pages are fetched
+        concurrently, edgedns.fetch_workers at a time
+
+        Parameters:
+            zone (str): The zone name
+            put_page (Callable[[List[DnsRecord]], bool]): Passed each page's records, in page order. Returns false if
+                no more pages are wanted
+
+        Returns:
+            bool: Whether every page was fetched. If a page fails, later pages aren't passed on.
+        """
+        assert self.config.edgedns is not None
+        if self.zone_transfer is not None:
+            return self._transfer_zone_records(zone, put_page)
+
+        records_url = f'{self.api_url}/zones/{zone}/recordsets'
+        query_params = self._base_query_params()
+        if self.config.edgedns.page_size is not None:
+            query_params['pageSize'] = self.config.edgedns.page_size
 
         # Fetch first page of DNS records
-        response = self.open_session.get(url=self.records_url, params=query_params)
-        if response.status_code != 200:
-            logging.error('Failed fetching Edge DNS records')
-            return []
+        first_page = self._get_json(records_url, query_params)
+        if first_page is None:
+            return False
         try:
-            last_page = response.json()['metadata']['lastPage']
-            next_page = response.json()['metadata']['page'] + 1
+            last_page = first_page['metadata']['lastPage']
+            next_page = first_page['metadata']['page'] + 1
         except (KeyError, TypeError) as key_error:
-            logging.error('Edge DNS API returned unexpected response [%s]: [%s]', key_error, response.json)
-            return []
-        record_set.extend(self._parse_records(response.json()))
+            logging.error('Edge DNS API returned unexpected response [%s]: [%s]', key_error, first_page)
+            return False
+        records = self._parse_records(zone, first_page)
+        if records is None or not put_page(records):
+            return False
 
         # Fetch remaining pages of DNS records
-        while next_page <= last_page:
-            query_params['page'] = next_page
-            response = self.open_session.get(url=self.records_url, params=query_params)
-            if response.status_code != 200:
-                logging.error('Failed fetching Edge DNS records')
-                break
-            record_set.extend(self._parse_records(response.json()))
-            next_page += 1
-
-        return record_set
-
-    def _parse_records(self, json_response) -> List[DnsRecord]:
+        pages = [dict(query_params, page=page) for page in range(next_page, last_page + 1)]
+        if not pages:
+            return True
+
+        # Pages are fetched a batch at a time, so at most fetch_workers fetched pages wait to be passed on
+        fetch_workers = min(self.config.edgedns.fetch_workers, len(pages))
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            for start in range(0, len(pages), fetch_workers):
+                batch = pages[start:start + fetch_workers]
+                for page in executor.map(lambda params: self._get_json(records_url, params), batch):
+                    records = None if page is None else self._parse_records(zone, page)
+                    # Later pages are discarded, so the records passed on are a prefix of the record set
+                    if records is None or not put_page(records):
+                        return False
+
+        return True
+
+    def _transfer_zone_records(self, zone: str, put_page: Callable[[List[DnsRecord]], bool]) -> bool:
+        assert self.config.edgedns is not None
+        assert self.zone_transfer is not None
+        records = self.zone_transfer.get_records(zone, deadline=self.poll_deadline)
+        if records is None:
+            return False
+
+        page_size = self.config.edgedns.page_size or EdgeDnsManager._TRANSFER_PAGE_SIZE
+        for start in range(0, len(records), page_size):
+            if not put_page(records[start:start + page_size]):
+                return False
+        return True
+
+    def _base_query_params(self) -> Dict[str, Any]:
+        assert self.config.open is not None
+        query_params: Dict[str, Any] = {}
+        if self.config.open.account_switch_key is not None:
+            query_params['accountSwitchKey'] = self.config.open.account_switch_key
+        return query_params
+
+    def _get_json(self, url: str, query_params: Dict[str, Any]) -> Optional[Any]:
+        """
+        Send a GET request. Throttled, failed, and unavailable responses are retried with backoff, up to
+        edgedns.retry.failure_threshold attempts or until the poll times out
+
+        Parameters:
+            url (str): The API URL
+            query_params (Dict[str, Any]): The query parameters
+
+        Returns:
+            Optional[Any]: The decoded response. If the request failed, None.
+        """
         assert self.config.edgedns is not None
-        assert self.config.edgedns.zone_name is not None
+        backoff = create_backoff(self.config.edgedns.retry)
+        for attempt in range(1, self.config.edgedns.retry.failure_threshold + 1):
+            if not self._wait_for_rate_limit():
+                logging.error('Edge DNS poll timed out. Giving up until next poll [%s]', url)
+                return None
+
+            throttled = False
+            retry_after_sec = None
+            try:
+                response = self.open_session.get(
+                    url=url, params=query_params, timeout=self.config.edgedns.request_timeout_sec)
+                self._update_rate_limit(response.headers)
+                if response.status_code == 200:
+                    return response.json()
+                logging.error('Failed fetching Edge DNS records [%s]: %s', url, response.status_code)
+                if response.status_code not in EdgeDnsManager._RETRY_STATUS_CODES:
+                    return None
+                throttled = response.status_code == 429
+                retry_after_sec = parse_retry_after(response.headers.get('Retry-After'))
+            except requests.RequestException as exception:
+                logging.error('Failed fetching Edge DNS records [%s]: %s', url, exception)
+
+            if attempt < self.config.edgedns.retry.failure_threshold:
+                delay_sec = backoff.next_delay(retry_after_sec)
+                if throttled:
+                    # The limit applies to the credentials, so the other workers pause too
+                    self._pause_requests(time.time() + delay_sec)
+                elif delay_sec < self.poll_deadline - time.monotonic():
+                    time.sleep(delay_sec)
+                else:
+                    logging.error('Edge DNS poll timed out. Giving up until next poll [%s]', url)
+                    return None
+        return None
+
+    def _wait_for_rate_limit(self) -> bool:
+        """
+        Sleep until requests are allowed again, if throttled. Doesn't sleep if the poll would time out first
+
+        Parameters: None
+
+        Returns:
+            bool: If requests are allowed before the poll times out, true. Otherwise, false.
+        """
+        with self.rate_limit_lock:
+            delay_sec = max(self.rate_limited_until - time.time(), 0.0)
+        if self.poll_deadline - time.monotonic() <= delay_sec:
+            return False
+        if delay_sec > 0:
+            logging.debug('Edge DNS API rate limited. Pausing for %.1f seconds', delay_sec)
+            time.sleep(delay_sec)
+        return True
+
+    def _pause_requests(self, until_sec: float) -> None:
+        with self.rate_limit_lock:
+            self.rate_limited_until = max(self.rate_limited_until, until_sec)
+
+    def _update_rate_limit(self, headers) -> None:
+        # Once the rate limit is used up, the next request is allowed at X-RateLimit-Next
+        if headers.get(EdgeDnsManager._RATE_LIMIT_REMAINING_HEADER) != '0':
+            return
+        next_sec = EdgeDnsManager._parse_rate_limit_next(headers.get(EdgeDnsManager._RATE_LIMIT_NEXT_HEADER))
+        if next_sec is not None:
+            self._pause_requests(next_sec)
+
+    @staticmethod
+    def _parse_rate_limit_next(value: Optional[str]) -> Optional[float]:
+        # ISO 8601 UTC, like 2023-06-28T19:06:53.123Z
+        if not value:
+            return None
+        for time_format in ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ'):
+            try:
+                return datetime.strptime(value, time_format).replace(tzinfo=timezone.utc).timestamp()
+            except ValueError:
+                pass
+        logging.debug('Ignoring invalid %s header: %s', EdgeDnsManager._RATE_LIMIT_NEXT_HEADER, value)
+        return None
 
+    @staticmethod
+    def _parse_records(zone: str, json_response) -> Optional[List[DnsRecord]]:
         records = []
         time_fetched_sec = time.time()
         try:
             for json_record in json_response['recordsets']:
                 records.append(DnsRecord(
-                    zone=self.config.edgedns.zone_name,
+                    zone=zone,
                     time_fetched_sec=time_fetched_sec,
                     name=json_record['name'],
                     type=json_record['type'],
@@ -96,6 +420,7 @@ class EdgeDnsManager():
                 ))
         except (KeyError, TypeError) as key_error:
             logging.warning('Edge DNS API returned record missing key [%s]: [%s]', key_error, json_response)
+            return None
 
         return records
 
@@ -24,3 +24,40 @@ class Handler(metaclass = ABCMeta):
     @abstractmethod
     def clear(self):
         pass
+
+    @abstractmethod
+    def clear_dns_records(self):
+        pass
+
+    def serialize_log_line(self, log_event: LogEvent) -> None:
+        """
+        Convert a log event to the form add_log_line queues, ahead of time. Called concurrently from the serialize
+        workers, so it mustn't touch the queue. The result is stored in log_event.serialized, which only this handler
+        reads. By default, add_log_line does the conversion
+
+        Parameters:
+            log_event (LogEvent): The log event
+
+        Returns: None
+        """
+        return
+
+    def close(self) -> None:
+        """
+        Release the handler's resources on shutdown. Queued events that weren't published are dropped
+
+        Parameters: None
+        Returns: None
+        """
+        return
+
+    def is_available(self) -> bool:
+        """
+        Whether the destination is accepting events. If not, callers should pause until a later poll
+
+        Parameters: None
+
+        Returns:
+            bool: If events can be published, true. Otherwise, false.
+        """
+        return True
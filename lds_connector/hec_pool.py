@@ -0,0 +1,150 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+from .config import Config, HecLoadBalancing
+
+
+@dataclass
+class HecEndpoint:
+    base_url: str
+    outstanding: int = 0
+    ejected_until: float = 0
+
+
+class HecEndpointPool:
+    """
+    Pool of Splunk HEC endpoints. Spreads requests across the endpoints and temporarily ejects failing ones
+    """
+    _HEALTH_ENDPOINT = '/services/collector/health'
+    _TIMEOUT_SEC = 5
+
+    def __init__(self, config: Config):
+        assert config.splunk is not None
+
+        self.config = config
+        self.lock = threading.Lock()
+        self.next_index = 0
+
+        protocol = "https://" if config.splunk.hec_use_ssl else "http://"
+        hosts = [(config.splunk.host, config.splunk.hec_port)]
+        hosts.extend(HecEndpointPool._parse_host(host, config.splunk.hec_port)
+            for host in config.splunk.additional_hosts)
+        self.endpoints: List[HecEndpoint] = [HecEndpoint(base_url=f'{protocol}{host}:{port}') for host, port in hosts]
+
+    def acquire(self) -> HecEndpoint:
+        """
+        Select an endpoint to send the next request to. Callers must release the endpoint when the request completes
+
+        Ejected endpoints are skipped. Once an endpoint's ejection expires, it's health checked before it's used. If
+        every endpoint is ejected, the endpoint whose ejection expires soonest is returned.
+
+        Parameters: None
+
+        Returns:
+            HecEndpoint: The selected endpoint
+        """
+        assert self.config.splunk is not None
+
+        with self.lock:
+            now = time.time()
+            candidates = self._ordered_candidates()
+
+        endpoint = None
+        for candidate in candidates:
+            if candidate.ejected_until == 0:
+                endpoint = candidate
+                break
+            if candidate.ejected_until <= now:
+                if self._health_check(candidate):
+                    logging.info('Splunk HEC endpoint is healthy again: %s', candidate.base_url)
+                    candidate.ejected_until = 0
+                    endpoint = candidate
+                    break
+                self._eject(candidate)
+
+        if endpoint is None:
+            endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+
+        with self.lock:
+            endpoint.outstanding += 1
+        return endpoint
+
+    def release(self, endpoint: HecEndpoint, healthy: bool) -> None:
+        """
+        Release an endpoint after a request completes
+
+        Parameters:
+            endpoint (HecEndpoint): The endpoint returned by acquire
+            healthy (bool): Whether the endpoint handled the request. If false, the endpoint is ejected
+
+        Returns: None
+        """
+        with self.lock:
+            endpoint.outstanding -= 1
+        if not healthy:
+            self._eject(endpoint)
+
+    def _ordered_candidates(self) -> List[HecEndpoint]:
+        assert self.config.splunk is not None
+
+        # Rotate the starting endpoint on every request
+        start = self.next_index
+        self.next_index = (self.next_index + 1) % len(self.endpoints)
+        rotated = self.endpoints[start:] + self.endpoints[:start]
+
+        if self.config.splunk.load_balancing == HecLoadBalancing.LEAST_OUTSTANDING:
+            # Sort is stable. Ties are broken by round robin
+            return sorted(rotated, key=lambda e: e.outstanding)
+        return rotated
+
+    def _eject(self, endpoint: HecEndpoint) -> None:
+        assert self.config.splunk is not None
+
+        if len(self.endpoints) == 1:
+            return
+        logging.warning('Ejecting Splunk HEC endpoint for %d seconds: %s',
+            self.config.splunk.endpoint_eject_sec, endpoint.base_url)
+        endpoint.ejected_until = time.time() + self.config.splunk.endpoint_eject_sec
+
+    def _health_check(self, endpoint: HecEndpoint) -> bool:
+        assert self.config.splunk is not None
+
+        try:
+            response = requests.get(
+                urljoin(endpoint.base_url, HecEndpointPool._HEALTH_ENDPOINT),
+                timeout=HecEndpointPool._TIMEOUT_SEC,
+                verify=self.config.splunk.hec_ssl_verify)
+            return response.status_code == 200
+        except Exception as exception:
+            logging.debug('Splunk HEC health check exception [%s]', exception)
+            return False
+
+    @staticmethod
+    def _parse_host(host: str, default_port: int) -> Tuple[str, int]:
+        name, _, port = host.rpartition(':')
+        if name and port.isdigit():
+            return name, int(port)
+        return host, default_port
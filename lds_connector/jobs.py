@@ -0,0 +1,118 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+# How often run_jobs checks for an interrupt
+_JOIN_POLL_SEC = 1
+
+class PeriodicJob:
+    """
+    Runs an action periodically on its own thread, so a slow job never delays the others. Runs of the same job never
+    overlap. Each run starts period_sec after the previous run finished.
+
+    Each run is passed its deadline, from time.monotonic, which the action should stop by. Runs that overrun it are
+    logged.
+    """
+
+    def __init__(self, name: str, action: Callable[[Optional[float]], None], period_sec: float,
+            deadline_sec: Optional[float] = None):
+        self.name = name
+        self.action = action
+        self.period_sec = period_sec
+        self.deadline_sec = deadline_sec
+
+        # When the run in progress should stop by, from time.monotonic. None if idle or there's no deadline
+        self.run_deadline: Optional[float] = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'{name}-job', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop scheduling runs. A run in progress finishes
+
+        Parameters: None
+        Returns: None
+        """
+        self.stopped.set()
+
+    def join(self) -> bool:
+        """
+        Wait for the run in progress to finish, up to its deadline. Call once stopped
+
+        Parameters: None
+
+        Returns:
+            bool: If the job's thread has exited, true. Otherwise, false.
+        """
+        deadline = self.run_deadline
+        self.thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self.thread.is_alive():
+            logging.warning('%s job is still running after its deadline', self.name)
+            return False
+        return True
+
+    def _run(self) -> None:
+        delay_sec = 0.0
+        while not self.stopped.wait(delay_sec):
+            started = time.monotonic()
+            deadline = None if self.deadline_sec is None else started + self.deadline_sec
+            self.run_deadline = deadline
+
+            try:
+                self.action(deadline)
+            except Exception:
+                logging.exception('%s job failed. Retrying next period', self.name)
+            finally:
+                self.run_deadline = None
+
+            finished = time.monotonic()
+            if deadline is not None and finished > deadline:
+                logging.warning('%s job overran its deadline by %.1f seconds', self.name, finished - deadline)
+
+            delay_sec = self.period_sec
+
+
+def run_jobs(jobs: List[PeriodicJob]) -> None:
+    """
+    Run jobs concurrently until interrupted. Once interrupted, runs in progress are waited for, up to their deadlines
+
+    Parameters:
+        jobs (List[PeriodicJob]): The jobs
+
+    Returns: None
+    """
+    for job in jobs:
+        job.start()
+
+    try:
+        while any(job.thread.is_alive() for job in jobs):
+            for job in jobs:
+                job.thread.join(_JOIN_POLL_SEC)
+    except KeyboardInterrupt:
+        logging.info('Interrupted. Stopping jobs')
+    finally:
+        for job in jobs:
+            job.stop()
+        for job in jobs:
+            job.join()
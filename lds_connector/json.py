@@ -17,9 +17,48 @@
 
 import json
 import dataclasses
+from json.encoder import encode_basestring_ascii # type: ignore
+
+try:
+    import orjson # Optional. Faster JSON serialization
+except ImportError:
+    orjson = None
+
 
 class CustomJsonEncoder(json.JSONEncoder):
     def default(self, o):
         if dataclasses.is_dataclass(o):
             return dataclasses.asdict(o)
         return json.JSONEncoder.default(self, o)
+
+
+def dumps_bytes(obj) -> bytes:
+    """
+    Serialize an object, including dataclasses, to compact JSON
+
+    Uses orjson if it's installed. Otherwise, falls back to the standard library.
+
+    Parameters:
+        obj: The object to serialize
+
+    Returns:
+        bytes: The UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, cls=CustomJsonEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_str_bytes(value: str) -> bytes:
+    """
+    Serialize a string to a JSON string literal
+
+    Parameters:
+        value (str): The string to serialize
+
+    Returns:
+        bytes: The UTF-8 encoded JSON string literal, including quotes
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return encode_basestring_ascii(value).encode('ascii')
@@ -15,8 +15,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Any
 
 @dataclass
 class LogNameProps:
@@ -46,3 +47,5 @@ class LogFile:
 class LogEvent:
     log_line: str
     timestamp: datetime
+    # The log event as the event handler queues it, if serialized ahead of time
+    serialized: Any = field(default=None, compare=False, repr=False)
@@ -20,26 +20,35 @@ import logging
 import os
 import pickle
 import shutil
+import threading
+import time
 import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from gzip import GzipFile
-from typing import Optional, List
+from typing import Deque, Optional, List, Tuple
 
 import parse
 from akamai.netstorage import Netstorage
 
 from .config import Config
 from .log_file import LogFile, LogNameProps
+from .pipeline_stats import PipelineStats, STAGE_CHECKPOINT, STAGE_DOWNLOAD, STAGE_DOWNLOAD_WAIT, STAGE_INFLATE, \
+    STAGE_LIST
 
 
 class LogManager:
     """
     Log manager responsible for fetching, preparing, and cleaning up log files
+
+    Log files are downloaded and uncompressed ahead of time by a pool of workers, so the next log file is usually
+    ready once the current one is processed. Up to lds.prefetch_log_files log files wait downloaded at once.
     """
     _RESUME_DATA_PICKLE_FILE_NAME = 'resume_data.pickle'
 
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, stats: Optional[PipelineStats] = None):
         self.current_log_file: Optional[LogFile] = None
 
         self.last_log_files_by_zone: dict[str, LogFile] = {}
@@ -55,55 +64,92 @@ class LogManager:
 
         self.asc_log_files_cache: List[LogFile] = []
 
+        self.stats = PipelineStats() if stats is None else stats
+        self.executor = ThreadPoolExecutor(max_workers=config.lds.download_workers, thread_name_prefix='download')
+        # Log files being downloaded or ready, in processing order. Bounded by lds.prefetch_log_files
+        self.prefetched: Deque[Tuple[LogFile, Future]] = deque()
+
+        # Progress is saved from the thread sending log lines, as well as from get_next_log
+        self.resume_lock = threading.Lock()
         self.resume_data_path = os.path.join(config.lds.log_download_dir, LogManager._RESUME_DATA_PICKLE_FILE_NAME)
 
         if os.path.isfile(self.resume_data_path):
             with open(self.resume_data_path, 'rb') as file:
                 self.last_log_files_by_zone = pickle.load(file)
 
-    def update_last_log_files(self):
+    def update_last_log_files(self, log_file: Optional[LogFile] = None):
         """
         Save log file progress to disk
 
-        Parameters: None
+        Parameters:
+            log_file (Optional[LogFile]): The log file to save progress for. If None, the current log file.
+
         Returns: None
         """
-        assert self.current_log_file is not None
+        if log_file is None:
+            log_file = self.current_log_file
+        assert log_file is not None
 
-        self.last_log_files_by_zone[self.current_log_file.name_props.customer_id] = self.current_log_file
+        logging.debug('Saving resume data: %s', log_file)
 
-        logging.debug('Saving resume data: %s', self.current_log_file)
+        with self.resume_lock:
+            self.last_log_files_by_zone[log_file.name_props.customer_id] = log_file
 
-        LogManager._ensure_dir_exists(self.config.lds.log_download_dir)
+            LogManager._ensure_dir_exists(self.config.lds.log_download_dir)
 
-        with open(self.resume_data_path, 'wb') as file:
-            pickle.dump(self.last_log_files_by_zone, file)
+            with self.stats.measure(STAGE_CHECKPOINT), open(self.resume_data_path, 'wb') as file:
+                pickle.dump(self.last_log_files_by_zone, file)
 
         logging.debug('Saved resume data')
 
+    def requeue_log_files(self, log_files: List[LogFile]):
+        """
+        Retry log files first, in order, on the next calls to get_next_log. Each resumes from its last processed line
+
+        Parameters:
+            log_files (List[LogFile]): The log files to retry, oldest first
+
+        Returns: None
+        """
+        # Log files downloaded ahead come after the retried ones. They're downloaded again when their turn comes
+        prefetched = self._cancel_prefetch()
+        self.asc_log_files_cache[0:0] = log_files + prefetched
+
     def get_next_log(self) -> Optional[LogFile]:
         """
         Get next log file to process. Determines the next log file to process, downloads it, and uncompresses it. Will
         attempt to resume where left off when run for the first time.
 
+        If the download fails, the log file is retried first on a later call.
+
         Parameters: None
         Returns:
             Optional[LogFile]: The log file to process next, if any.
         """
-        if self.current_log_file is not None:
-            # Normal run
+        if self.current_log_file is not None and self.current_log_file.processed:
+            # Normal run. Unprocessed log files may have undelivered events, so callers save their progress
             self.update_last_log_files()
 
-        next_log_file = self._determine_next_log()
-        if not next_log_file:
+        if len(self.prefetched) == 0:
+            self._prefetch(limit=1, refresh=True)
+        if len(self.prefetched) == 0:
             logging.info('No new log files found')
             return None
 
-        self._download(next_log_file)
-
-        LogManager._uncompress(next_log_file)
-
-        self._delete_gzip(next_log_file)
+        next_log_file, future = self.prefetched.popleft()
+        # Keep the download workers busy while this log file is processed. The log file list is only refreshed once
+        # every listed log file is processed, as before prefetching
+        self._prefetch(limit=self.config.lds.prefetch_log_files, refresh=False)
+        self.stats.set_queue_depth(STAGE_DOWNLOAD, len(self.prefetched))
+
+        try:
+            with self.stats.measure(STAGE_DOWNLOAD_WAIT):
+                future.result()
+        except Exception as exception:
+            logging.error('Failed downloading log file. Retrying next poll [%s]: %s', next_log_file.filename_gz,
+                exception)
+            self.requeue_log_files([next_log_file])
+            return None
 
         self.current_log_file = next_log_file
 
@@ -111,19 +157,86 @@ class LogManager:
 
         return next_log_file
 
-    def _determine_next_log(self) -> Optional[LogFile]:
+    def close(self) -> None:
         """
-        Determines next log file to process.
+        Stop downloading log files ahead, and delete those already downloaded
+
+        Parameters: None
+        Returns: None
+        """
+        self.asc_log_files_cache[0:0] = self._cancel_prefetch()
+        self.executor.shutdown(wait=True)
+
+    def _prefetch(self, limit: int, refresh: bool) -> None:
+        """
+        Start downloading log files until the prefetch queue is full
+
+        Parameters:
+            limit (int): The number of log files the queue may hold
+            refresh (bool): If true, refresh the log file list if it's exhausted
+
+        Returns: None
+        """
+        while len(self.prefetched) < limit:
+            log_file = self._determine_next_log(refresh=refresh)
+            if log_file is None:
+                break
+            self.prefetched.append((log_file, self.executor.submit(self._prepare, log_file)))
+
+    def _prepare(self, log_file: LogFile) -> None:
+        """
+        Download and uncompress a log file. Runs on a download worker
+
+        Parameters:
+            log_file (LogFile): The log file
+
+        Returns: None
+        """
+        start = time.monotonic()
+        self._download(log_file)
+        self.stats.add(STAGE_DOWNLOAD, time.monotonic() - start)
+
+        with self.stats.measure(STAGE_INFLATE):
+            LogManager._uncompress(log_file)
+            LogManager._delete_gzip(log_file)
+
+    def _cancel_prefetch(self) -> List[LogFile]:
+        """
+        Discard the log files downloaded ahead
 
         Parameters: None
+        Returns:
+            List[LogFile]: The discarded log files, in processing order
+        """
+        log_files = []
+        while len(self.prefetched) != 0:
+            log_file, future = self.prefetched.popleft()
+            try:
+                future.result()
+                os.remove(log_file.local_path_txt)
+            except Exception:
+                # The log file is downloaded again when its turn comes
+                logging.debug('Discarding log file that failed to download: %s', log_file.filename_gz)
+            log_files.append(log_file)
+        self.stats.set_queue_depth(STAGE_DOWNLOAD, 0)
+        return log_files
+
+    def _determine_next_log(self, refresh: bool = True) -> Optional[LogFile]:
+        """
+        Determines next log file to process.
+
+        Parameters:
+            refresh (bool): If true, refresh the log file list if it's exhausted
+
         Returns:
             Optional[LogFile]: The log file to process next, if any.
         """
         logging.debug('Determining next log file')
 
         # Log file list cache is empty. Refresh it.
-        if len(self.asc_log_files_cache) == 0:
-            log_files = self._list()
+        if len(self.asc_log_files_cache) == 0 and refresh:
+            with self.stats.measure(STAGE_LIST):
+                log_files = self._list()
             self.asc_log_files_cache = sorted(log_files, key=lambda f: (f.name_props.start_time, f.name_props.part))
 
         # Log file list cache still empty after refresh. No available log files.
@@ -327,4 +440,5 @@ class LogManager:
     def _ensure_dir_exists(path: str):
         if not os.path.isdir(path):
             logging.debug('Creating missing directory: %s', path)
-            os.makedirs(path)
+            # Download workers and the send thread may create it at the same time
+            os.makedirs(path, exist_ok=True)
@@ -0,0 +1,138 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+# Log pipeline stages, in order
+STAGE_LIST = 'list'
+STAGE_DOWNLOAD = 'download'
+STAGE_INFLATE = 'inflate'
+STAGE_DOWNLOAD_WAIT = 'download_wait'
+STAGE_PARSE = 'parse'
+STAGE_SERIALIZE = 'serialize'
+STAGE_SEND = 'send'
+STAGE_CHECKPOINT = 'checkpoint'
+
+_STAGES = [
+    STAGE_LIST, STAGE_DOWNLOAD, STAGE_INFLATE, STAGE_DOWNLOAD_WAIT, STAGE_PARSE, STAGE_SERIALIZE, STAGE_SEND,
+    STAGE_CHECKPOINT
+]
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    busy_sec: float = 0
+    # Items waiting for the next stage
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+
+
+class PipelineStats:
+    """
+    Per-stage statistics of the log pipeline, to find its bottleneck. Stages may run on different threads.
+
+    Busy time is the total time spent in a stage, summed across its workers. Time spent in download_wait is time the
+    parse stage sat idle waiting for a log file to download. If it's large, downloads are the bottleneck. Otherwise,
+    the busiest of the later stages is.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: Dict[str, StageStats] = {stage: StageStats() for stage in _STAGES}
+
+    def add(self, stage: str, busy_sec: float, items: int = 1) -> None:
+        """
+        Record items processed by a stage
+
+        Parameters:
+            stage (str): The stage
+            busy_sec (float): How long the stage took to process them
+            items (int): How many items were processed
+
+        Returns: None
+        """
+        with self.lock:
+            stats = self.stages[stage]
+            stats.items += items
+            stats.busy_sec += busy_sec
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """
+        Record the time spent processing an item in a stage
+
+        Parameters:
+            stage (str): The stage
+
+        Returns: None
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, time.monotonic() - start)
+
+    def set_queue_depth(self, stage: str, queue_depth: int) -> None:
+        """
+        Record the number of items a stage has ready for the next stage
+
+        Parameters:
+            stage (str): The stage
+            queue_depth (int): The number of items
+
+        Returns: None
+        """
+        with self.lock:
+            stats = self.stages[stage]
+            stats.queue_depth = queue_depth
+            stats.max_queue_depth = max(stats.max_queue_depth, queue_depth)
+
+    def reset(self) -> None:
+        """
+        Reset the statistics. Current queue depths are kept
+
+        Parameters: None
+        Returns: None
+        """
+        with self.lock:
+            for stage, stats in self.stages.items():
+                self.stages[stage] = StageStats(queue_depth=stats.queue_depth, max_queue_depth=stats.queue_depth)
+
+    def summary(self) -> str:
+        """
+        Summarize the statistics of the stages that processed items
+
+        Parameters: None
+
+        Returns:
+            str: The summary. For example, 'download 2x 1.52s (queue 1, max 2), parse 1000x 0.12s'
+        """
+        with self.lock:
+            summaries = []
+            for stage, stats in self.stages.items():
+                if stats.items == 0:
+                    continue
+                summary = f'{stage} {stats.items}x {stats.busy_sec:.2f}s'
+                if stats.max_queue_depth > 0:
+                    summary += f' (queue {stats.queue_depth}, max {stats.max_queue_depth})'
+                summaries.append(summary)
+            return ', '.join(summaries)
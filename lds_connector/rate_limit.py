@@ -0,0 +1,51 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Tokens refill continuously at the rate, up to the burst size
+    """
+
+    def __init__(self, rate_per_sec: float, burst: float):
+        assert rate_per_sec > 0
+        self.rate_per_sec = rate_per_sec
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+
+    def acquire(self, tokens: float = 1) -> None:
+        """
+        Take tokens from the bucket, sleeping until enough are available
+
+        Parameters:
+            tokens (float): The number of tokens to take
+
+        Returns: None
+        """
+        self._refill()
+        if self.tokens < tokens:
+            time.sleep((tokens - self.tokens) / self.rate_per_sec)
+            self._refill()
+        self.tokens -= tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate_per_sec)
+        self.last_refill = now
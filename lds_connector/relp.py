@@ -0,0 +1,176 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import socket
+from typing import Dict, List, Optional, Tuple
+
+
+class RelpError(Exception):
+    pass
+
+
+class RelpClient:
+    """
+    Reliable Event Logging Protocol (RELP) client. Every syslog message is acknowledged by the server. Up to window
+    messages are sent before waiting for their acknowledgements.
+
+    Each frame is: TXNR SP COMMAND SP DATALEN [SP DATA] LF
+    """
+    _OFFERS = b'relp_version=0\nrelp_software=lds-connector\ncommands=syslog'
+    _CMD_OPEN = b'open'
+    _CMD_CLOSE = b'close'
+    _CMD_SYSLOG = b'syslog'
+    _CMD_RSP = b'rsp'
+    _CMD_SERVER_CLOSE = b'serverclose'
+    _MAX_TXNR = 999999999
+    _MAX_TOKEN_BYTES = 32
+
+    def __init__(self, address: Tuple[str, int], window: int, timeout_sec: float = 30):
+        assert window >= 1
+        self.address = address
+        self.window = window
+        self.timeout_sec = timeout_sec
+
+        self.socket: Optional[socket.socket] = None
+        self.reader = None
+        self.next_txnr = 1
+
+    def send(self, messages: List[bytes]) -> int:
+        """
+        Send syslog messages and wait for their acknowledgements. On failure, the connection is closed. Messages after
+        the acknowledged ones must be sent again.
+
+        Parameters:
+            messages (List[bytes]): The syslog messages, without framing
+
+        Returns:
+            int: The number of leading messages acknowledged by the server
+        """
+        acked = 0
+        try:
+            if self.socket is None:
+                self._open()
+
+            # Transaction number to message index, for messages waiting for acknowledgement
+            unacked: Dict[int, int] = {}
+            # Acknowledgements may only advance the count once all earlier messages are acknowledged
+            acked_indexes = set()
+            sent = 0
+            while acked < len(messages):
+                while sent < len(messages) and len(unacked) < self.window:
+                    unacked[self._send_frame(RelpClient._CMD_SYSLOG, messages[sent])] = sent
+                    sent += 1
+
+                txnr, data = self._read_response()
+                index = unacked.pop(txnr, None)
+                if index is None:
+                    raise RelpError(f'Unexpected RELP response transaction number: {txnr}')
+                if not data.startswith(b'200'):
+                    raise RelpError(f'RELP message rejected: {data.decode("utf-8", "replace")}')
+
+                acked_indexes.add(index)
+                while acked in acked_indexes:
+                    acked_indexes.remove(acked)
+                    acked += 1
+        except (OSError, RelpError) as exc:
+            logging.error('Syslog publish failed: %s', exc)
+            self._close_socket()
+
+        return acked
+
+    def close(self) -> None:
+        """
+        Close the RELP session, if open
+
+        Parameters: None
+        Returns: None
+        """
+        if self.socket is None:
+            return
+        try:
+            self._send_frame(RelpClient._CMD_CLOSE, b'')
+            self._read_response()
+        except (OSError, RelpError):
+            pass
+        self._close_socket()
+
+    def _open(self) -> None:
+        self.socket = socket.create_connection(self.address, timeout=self.timeout_sec)
+        self.reader = self.socket.makefile('rb')
+        self.next_txnr = 1
+
+        self._send_frame(RelpClient._CMD_OPEN, RelpClient._OFFERS)
+        _, data = self._read_response()
+        if not data.startswith(b'200'):
+            raise RelpError(f'RELP session refused: {data.decode("utf-8", "replace")}')
+
+    def _send_frame(self, command: bytes, data: bytes) -> int:
+        assert self.socket is not None
+        txnr = self.next_txnr
+        self.next_txnr = 1 if txnr == RelpClient._MAX_TXNR else txnr + 1
+
+        frame = str(txnr).encode('ascii') + b' ' + command + b' ' + str(len(data)).encode('ascii')
+        if data:
+            frame += b' ' + data
+        self.socket.sendall(frame + b'\n')
+        return txnr
+
+    def _read_response(self) -> Tuple[int, bytes]:
+        txnr = self._read_token()
+        command = self._read_token()
+        data_len_token = self._read_token(allow_newline=True)
+        data_len = int(data_len_token.rstrip(b'\n'))
+
+        data = b''
+        if not data_len_token.endswith(b'\n'):
+            data = self._read_exact(data_len)
+            if self._read_exact(1) != b'\n':
+                raise RelpError('RELP frame is missing its trailer')
+
+        if command == RelpClient._CMD_SERVER_CLOSE:
+            raise RelpError('RELP server closed the session')
+        if command != RelpClient._CMD_RSP:
+            raise RelpError(f'Unexpected RELP command: {command.decode("utf-8", "replace")}')
+        return int(txnr), data
+
+    def _read_token(self, allow_newline: bool = False) -> bytes:
+        # Tokens end with a space. The data length ends with a newline instead if there's no data
+        token = bytearray()
+        while len(token) <= RelpClient._MAX_TOKEN_BYTES:
+            char = self._read_exact(1)
+            if char == b' ':
+                return bytes(token)
+            if char == b'\n' and allow_newline:
+                return bytes(token) + char
+            token += char
+        raise RelpError('RELP frame header is invalid')
+
+    def _read_exact(self, count: int) -> bytes:
+        assert self.reader is not None
+        data = self.reader.read(count)
+        if len(data) < count:
+            raise RelpError('RELP connection closed by server')
+        return data
+
+    def _close_socket(self) -> None:
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
@@ -0,0 +1,141 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from .config import RetryConfig
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter. Each delay is randomly chosen between half and all of the exponential delay
+    """
+
+    def __init__(self, initial_sec: float, max_sec: float, multiplier: float = 2.0):
+        self.initial_sec = initial_sec
+        self.max_sec = max_sec
+        self.multiplier = multiplier
+        self.attempt = 0
+
+    def next_delay(self, retry_after_sec: Optional[float] = None) -> float:
+        """
+        Get the delay before the next retry
+
+        Parameters:
+            retry_after_sec (Optional[float]): Delay requested by the server, if any. It takes precedence, up to
+                max_sec, so a server can't stall retries indefinitely.
+
+        Returns:
+            float: The delay in seconds
+        """
+        ceiling = min(self.max_sec, self.initial_sec * (self.multiplier ** self.attempt))
+        self.attempt += 1
+
+        if retry_after_sec is not None:
+            return min(retry_after_sec, self.max_sec)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def reset(self) -> None:
+        self.attempt = 0
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a destination. Opens after consecutive failures so callers stop sending until the reset
+    period has elapsed. Then, a single trial request is allowed through. Its result closes or re-opens the breaker.
+    """
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_sec: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow_request(self) -> bool:
+        """
+        Whether a request may be sent now
+
+        Parameters: None
+
+        Returns:
+            bool: If the breaker is closed or the trial request is due, true. Otherwise, false.
+        """
+        if self.state == CircuitBreaker.OPEN and time.time() - self.opened_at >= self.reset_sec:
+            logging.info('%s circuit breaker half-open. Sending trial request', self.name)
+            self.state = CircuitBreaker.HALF_OPEN
+        return self.state != CircuitBreaker.OPEN
+
+    def is_open(self) -> bool:
+        return self.state == CircuitBreaker.OPEN and time.time() - self.opened_at < self.reset_sec
+
+    def record_success(self) -> None:
+        if self.state != CircuitBreaker.CLOSED:
+            logging.info('%s circuit breaker closed', self.name)
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CircuitBreaker.OPEN:
+                logging.warning('%s circuit breaker opened after %d failures. Pausing for %d seconds',
+                    self.name, self.failures, self.reset_sec)
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = time.time()
+
+
+def create_backoff(config: RetryConfig) -> Backoff:
+    return Backoff(initial_sec=config.initial_sec, max_sec=config.max_sec)
+
+
+def create_circuit_breaker(name: str, config: RetryConfig) -> CircuitBreaker:
+    return CircuitBreaker(name=name, failure_threshold=config.failure_threshold, reset_sec=config.reset_sec)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse an HTTP Retry-After header
+
+    Parameters:
+        value (Optional[str]): The header value. Either delay seconds or an HTTP date
+
+    Returns:
+        Optional[float]: The delay in seconds. If missing or invalid, None.
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        logging.debug('Ignoring invalid Retry-After header: %s', value)
+        return None
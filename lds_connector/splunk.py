@@ -15,20 +15,77 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 import logging
+import os
 import socket
-from typing import Any, List, Dict
-from urllib.parse import urljoin
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+from urllib.parse import urljoin, urlencode
 import time
 
 import requests
 
-from .config import Config
+from .batch_controller import AimdBatchController, create_batch_controller
+from .config import Config, HecConfig
+from .dead_letter import DeadLetterFile
 from .dns_record import DnsRecord
 from .handler import Handler
-from .json import CustomJsonEncoder
+from .hec_pool import HecEndpointPool
+from .json import dumps_bytes, dumps_str_bytes
 from .log_file import LogEvent
+from .retry import create_backoff, create_circuit_breaker, parse_retry_after
+
+
+@dataclass
+class HecResponse:
+    status_code: int                        # 0 if no response was received
+    retry_after_sec: Optional[float] = None
+    text: str = ''
+
+
+class HecEnvelope:
+    """
+    Pre-rendered HEC metadata for a HEC token config. The metadata is identical for every event, so it's rendered
+    once and only each event's time and body are spliced in
+    """
+
+    def __init__(self, hec_config: HecConfig, hostname: str, source: str):
+        metadata = {
+            'host': hostname,
+            'source': source
+        }
+        if hec_config.source_type:
+            metadata['sourcetype'] = hec_config.source_type
+        if hec_config.index:
+            metadata['index'] = hec_config.index
+
+        # Event endpoint. Renders as {"time":<time>,"host":...,"event":<event>}
+        self.prefix = b'{"time":'
+        self.infix = b',' + dumps_bytes(metadata)[1:-1] + b',"event":'
+        self.suffix = b'}'
+
+        # Raw endpoint. Metadata is sent as query parameters
+        self.raw_query = urlencode(metadata)
+
+    def render(self, buffer: bytearray, events: List[Tuple[float, bytes]]) -> None:
+        """
+        Render HEC events into a buffer
+
+        Parameters:
+            buffer (bytearray): The buffer to append the events to
+            events (List[Tuple[float, bytes]]): The event times and JSON encoded event bodies
+
+        Returns: None
+        """
+        prefix, infix, suffix = self.prefix, self.infix, self.suffix
+        for index, (event_time, event_json) in enumerate(events):
+            if index != 0:
+                buffer += b'\n'
+            buffer += prefix
+            buffer += repr(event_time).encode('ascii')
+            buffer += infix
+            buffer += event_json
+            buffer += suffix
 
 
 class Splunk(Handler):
@@ -36,62 +93,93 @@ class Splunk(Handler):
     Splunk log line handler. Responsible for converting log lines to Splunk events
     """
     _HEC_ENDPOINT = '/services/collector/event'
+    _HEC_RAW_ENDPOINT = '/services/collector/raw'
+    _SOURCE = 'lds-connector'
     _TIMEOUT_SEC = 5
+    _DEAD_LETTER_FILE_NAME = 'splunk_dead_letter.txt'
+
+    # HEC rejected the events themselves. Retrying won't help
+    _REJECTED_STATUS_CODES = (400, 413)
+    # HEC is overloaded. It may ask to wait with a Retry-After header
+    _THROTTLED_STATUS_CODES = (429, 503)
 
     def __init__(self, config: Config):
+        assert config.splunk is not None
+
         self.config = config
         self.log_queue = []
         self.dns_queue = []
 
+        hostname = socket.gethostname()
+        self.lds_envelope = HecEnvelope(config.splunk.lds_hec, hostname, Splunk._SOURCE)
+        self.edgedns_envelope: Optional[HecEnvelope] = None
+        if config.splunk.edgedns_hec is not None:
+            self.edgedns_envelope = HecEnvelope(config.splunk.edgedns_hec, hostname, Splunk._SOURCE)
+
+        # Reused between batches to avoid reallocating the request body
+        self.buffer = bytearray()
+
+        self.endpoint_pool = HecEndpointPool(config)
+        self.circuit_breaker = create_circuit_breaker('Splunk HEC', config.splunk.retry)
+
+        dead_letter_path = config.splunk.dead_letter_path
+        if dead_letter_path is None:
+            dead_letter_path = os.path.join(config.lds.log_download_dir, Splunk._DEAD_LETTER_FILE_NAME)
+        self.dead_letter = DeadLetterFile(dead_letter_path)
+
+        # Adaptive batch sizes, if enabled. Each HEC token's events differ in size, so each has its own controller
+        self.lds_batch_controller = create_batch_controller('Splunk HEC LDS', config.splunk.adaptive_batch)
+        self.edgedns_batch_controller = create_batch_controller('Splunk HEC Edge DNS', config.splunk.adaptive_batch)
+
     def add_log_line(self, log_event: LogEvent) -> None:
         """
         Convert a log line to an HEC event and add it to the queue.
 
+        If the raw HEC endpoint is enabled, the log line is queued as-is.
+
         Parameters:
             log_line (str): The log line.
 
         Returns: None
         """
+        if log_event.serialized is None:
+            self.serialize_log_line(log_event)
+        self.log_queue.append(log_event.serialized)
 
-        hec_json = {
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line
-        }
+    def serialize_log_line(self, log_event: LogEvent) -> None:
+        """
+        Convert a log line to the HEC event queued by add_log_line. Safe to call concurrently
+
+        Parameters:
+            log_event (LogEvent): The log event
+
+        Returns: None
+        """
         assert self.config.splunk is not None
-        if self.config.splunk.lds_hec.source_type:
-            hec_json['sourcetype'] = self.config.splunk.lds_hec.source_type
-        if self.config.splunk.lds_hec.index:
-            hec_json['index'] = self.config.splunk.lds_hec.index
+        if self.config.splunk.lds_hec.use_raw_endpoint:
+            log_event.serialized = log_event.log_line
+            return
 
-        self.log_queue.append(hec_json)
+        log_event.serialized = (log_event.timestamp.timestamp(), dumps_str_bytes(log_event.log_line))
 
     def add_dns_record(self, dns_record: DnsRecord) -> None:
         """
         Convert a DNS record to an HEC event and add it to the queue.
 
+        If the raw HEC endpoint is enabled, the DNS record is queued as a single line of JSON.
+
         Parameters:
             dns_record (DnsRecord): The DNS record.
 
         Returns: None
         """
-
-        hec_json = {
-            'time': dns_record.time_fetched_sec,
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': dns_record
-        }
-
         assert self.config.splunk is not None
         assert self.config.splunk.edgedns_hec is not None
-        if self.config.splunk.edgedns_hec.source_type:
-            hec_json['sourcetype'] = self.config.splunk.edgedns_hec.source_type
-        if self.config.splunk.edgedns_hec.index:
-            hec_json['index'] = self.config.splunk.edgedns_hec.index
+        if self.config.splunk.edgedns_hec.use_raw_endpoint:
+            self.dns_queue.append(dumps_bytes(dns_record).decode('utf-8'))
+            return
 
-        self.dns_queue.append(hec_json)
+        self.dns_queue.append((dns_record.time_fetched_sec, dumps_bytes(dns_record)))
 
     def publish_log_lines(self, force=False) -> bool:
         """
@@ -106,8 +194,9 @@ class Splunk(Handler):
         assert self.config.splunk is not None
         return self._publish(
             queue=self.log_queue,
-            batch_size=self.config.splunk.lds_hec.event_batch_size,
-            token=self.config.splunk.lds_hec.token,
+            hec_config=self.config.splunk.lds_hec,
+            envelope=self.lds_envelope,
+            batch_controller=self.lds_batch_controller,
             force=force)
 
     def publish_dns_records(self, force=False) -> bool:
@@ -122,10 +211,12 @@ class Splunk(Handler):
         """
         assert self.config.splunk is not None
         assert self.config.splunk.edgedns_hec is not None
+        assert self.edgedns_envelope is not None
         return self._publish(
             queue=self.dns_queue,
-            batch_size=self.config.splunk.edgedns_hec.event_batch_size,
-            token=self.config.splunk.edgedns_hec.token,
+            hec_config=self.config.splunk.edgedns_hec,
+            envelope=self.edgedns_envelope,
+            batch_controller=self.edgedns_batch_controller,
             force=force)
 
     def clear(self):
@@ -138,35 +229,163 @@ class Splunk(Handler):
         self.log_queue.clear()
         self.dns_queue.clear()
 
-    def _publish(self, queue: List[Dict[str, Any]], batch_size: int, token: str, force: bool):
+    def clear_dns_records(self):
+        """
+        Clear DNS record queue
+
+        Parameters: None
+        Returns: None
+        """
+        self.dns_queue.clear()
+
+    def is_available(self) -> bool:
+        """
+        Whether Splunk is accepting events. False while the circuit breaker is open
+
+        Parameters: None
+
+        Returns:
+            bool: If events can be published, true. Otherwise, false.
+        """
+        return not self.circuit_breaker.is_open()
+
+    def _publish(self, queue: List[Any], hec_config: HecConfig, envelope: HecEnvelope,
+            batch_controller: Optional[AimdBatchController], force: bool):
         logging.debug('Publishing events to Splunk')
 
         if len(queue) == 0:
             return False
 
+        batch_size = hec_config.event_batch_size
+        if batch_controller is not None:
+            batch_size = batch_controller.batch_events(default=hec_config.event_batch_size)
+
         if len(queue) < batch_size and not force:
             return False
 
-        assert self.config.splunk is not None
-        protocol = "https://" if self.config.splunk.hec_use_ssl else "http://"
-        baseurl = f'{protocol}{self.config.splunk.host}:{self.config.splunk.hec_port}'
-        url = urljoin(baseurl, Splunk._HEC_ENDPOINT)
-        headers = {"Authorization": "Splunk " + token}
-
-        events_json = '\n'.join([json.dumps(event, cls=CustomJsonEncoder) for event in queue])
-
-        self._post_retry(url=url, headers=headers, events_json=events_json)
+        # Without adaptive batching, the whole queue is sent at once
+        request_size = batch_size if batch_controller is not None else len(queue)
+
+        headers = {"Authorization": "Splunk " + hec_config.token}
+        if hec_config.use_raw_endpoint:
+            # Raw endpoint. Static metadata is sent as query parameters. Splunk extracts the timestamps
+            path = Splunk._HEC_RAW_ENDPOINT + '?' + envelope.raw_query
+        else:
+            path = Splunk._HEC_ENDPOINT
+
+        delivered = 0
+        while delivered < len(queue):
+            end = min(delivered + request_size, len(queue))
+            delivered = self._deliver(queue, delivered, end, hec_config, envelope, path, headers, batch_controller)
+            if delivered < end:
+                break
+
+        if delivered < len(queue):
+            # Circuit breaker opened. Keep the undelivered events queued
+            del queue[:delivered]
+            return False
 
         queue.clear()
         logging.debug('Published events to Splunk')
         return True
 
-    def _post_retry(self, url, headers, events_json) -> None:
-        while not self._post(url=url, headers=headers, events_json=events_json):
-            logging.info('Splunk call failed. Retrying...')
-            time.sleep(1)
+    def _deliver(self, queue: List[Any], start: int, end: int, hec_config: HecConfig, envelope: HecEnvelope,
+            path: str, headers, batch_controller: Optional[AimdBatchController] = None) -> int:
+        """
+        Deliver a slice of queued events. If HEC rejects the slice, it's bisected until the bad events are isolated.
+        Bad events are written to the dead letter file. The rest are delivered
 
-    def _post(self, url, headers, events_json) -> bool:
+        Parameters:
+            queue (List[Any]): The queued events
+            start (int): Index of the slice's first event
+            end (int): Index after the slice's last event
+            hec_config (HecConfig): The HEC token config
+            envelope (HecEnvelope): The HEC token's envelope
+            path (str): The HEC endpoint path, including any query string
+            headers (Dict[str, str]): The request headers
+            batch_controller (Optional[AimdBatchController]): The adaptive batch controller to report results to
+
+        Returns:
+            int: Index after the last event that was delivered or dead lettered. Equals end unless the circuit breaker
+            opened.
+        """
+        events_json = self._serialize(queue[start:end], hec_config, envelope)
+
+        response = self._post_retry(path=path, headers=headers, events_json=events_json,
+            event_count=end - start, batch_controller=batch_controller)
+        if response is None:
+            return start
+        if response.status_code == 200:
+            return end
+
+        if end - start == 1:
+            self.dead_letter.write(
+                events_json,
+                event_count=1,
+                reason=f'Splunk HEC responded with [{response.status_code}] [{response.text}]')
+            return end
+
+        logging.warning('Splunk HEC rejected batch of %d events. Splitting it to isolate bad events', end - start)
+        middle = (start + end) // 2
+        delivered = self._deliver(queue, start, middle, hec_config, envelope, path, headers, batch_controller)
+        if delivered < middle:
+            return delivered
+        return self._deliver(queue, middle, end, hec_config, envelope, path, headers, batch_controller)
+
+    def _serialize(self, events: List[Any], hec_config: HecConfig, envelope: HecEnvelope) -> bytes:
+        if hec_config.use_raw_endpoint:
+            return '\n'.join(events).encode('utf-8')
+
+        del self.buffer[:]
+        envelope.render(self.buffer, events)
+        return bytes(self.buffer)
+
+    def _post_retry(self, path, headers, events_json, event_count: int = 0,
+            batch_controller: Optional[AimdBatchController] = None) -> Optional[HecResponse]:
+        """
+        Post events to Splunk HEC, retrying with exponential backoff until they're accepted or rejected
+
+        Parameters:
+            path (str): The HEC endpoint path, including any query string
+            headers (Dict[str, str]): The request headers
+            events_json (bytes): The request body
+            event_count (int): The number of events in the request body
+            batch_controller (Optional[AimdBatchController]): The adaptive batch controller to report latency and
+                errors to
+
+        Returns:
+            Optional[HecResponse]: The final response. Its status code is 200 if accepted. If the circuit breaker
+            opened before then, None.
+        """
+        backoff = create_backoff(self.config.splunk.retry)
+        while self.circuit_breaker.allow_request():
+            endpoint = self.endpoint_pool.acquire()
+            started = time.monotonic()
+            response = self._post(url=urljoin(endpoint.base_url, path), headers=headers, events_json=events_json)
+            latency_sec = time.monotonic() - started
+            self.endpoint_pool.release(endpoint, healthy=Splunk._is_endpoint_healthy(response))
+
+            # Bad events aren't a sign of load. Everything else, including too large requests, is
+            if batch_controller is not None and response.status_code != 400:
+                batch_controller.record(len(events_json), event_count, latency_sec,
+                    success=response.status_code == 200)
+
+            if response.status_code == 200 or response.status_code in Splunk._REJECTED_STATUS_CODES:
+                self.circuit_breaker.record_success()
+                return response
+
+            self.circuit_breaker.record_failure()
+            if not self.circuit_breaker.allow_request():
+                break
+
+            delay = backoff.next_delay(response.retry_after_sec)
+            logging.info('Splunk call failed. Retrying in %.1f seconds...', delay)
+            time.sleep(delay)
+
+        logging.warning('Splunk HEC is unavailable. Pausing delivery')
+        return None
+
+    def _post(self, url, headers, events_json) -> HecResponse:
         try:
             response = requests.post(
                 url,
@@ -174,10 +393,23 @@ class Splunk(Handler):
                 data=events_json,
                 timeout=Splunk._TIMEOUT_SEC,
                 verify=self.config.splunk.hec_ssl_verify)
-            if response.status_code != 200:
-                logging.error('Splunk HEC responded with [%s]', response.status_code)
-                return False
-            return True
+            if response.status_code == 200:
+                return HecResponse(status_code=200)
+
+            logging.error('Splunk HEC responded with [%s]', response.status_code)
+            retry_after_sec = None
+            if response.status_code in Splunk._THROTTLED_STATUS_CODES:
+                retry_after_sec = parse_retry_after(response.headers.get('Retry-After'))
+            return HecResponse(
+                status_code=response.status_code,
+                retry_after_sec=retry_after_sec,
+                text=response.text)
         except Exception as exception:
             logging.error('Splunk HEC exception [%s]', exception)
-            return False
+            return HecResponse(status_code=0, text=str(exception))
+
+    @staticmethod
+    def _is_endpoint_healthy(response: HecResponse) -> bool:
+        # Rejected events and auth errors aren't the endpoint's fault
+        return response.status_code != 0 and response.status_code < 500 \
+            and response.status_code not in Splunk._THROTTLED_STATUS_CODES
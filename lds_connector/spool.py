@@ -0,0 +1,411 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from .config import Config
+from .dns_record import DnsRecord, DnsRecordChange
+from .handler import Handler
+from .json import dumps_bytes
+from .log_file import LogEvent
+
+
+class Spool(Handler):
+    """
+    Handler that spools events to disk. A background thread drains the spool into the destination handler, so a slow
+    or unavailable destination doesn't stall log downloading.
+
+    The spool is a directory of append-only, GZIP compressed segments. Events are published once they're flushed to
+    the active segment. Segments are sealed when they're full. When publishing is forced, the active segment is sealed
+    once the drain thread has delivered the segments before it, so a backlog is delivered in full segments rather than
+    one small segment per forced publish. Sealed segments are delivered oldest first and deleted once the destination
+    accepts them. Segments left over from a previous run are delivered on startup.
+
+    How many of a segment's events the destination has accepted is saved alongside it, so a segment that was partly
+    delivered before a restart resumes after those events.
+    """
+    _SEALED_SUFFIX = '.seg.gz'
+    _ACTIVE_SUFFIX = '.seg.gz.active'
+    _OFFSET_SUFFIX = '.offset'
+    _RECORD_LOG = b'L'
+    _RECORD_DNS = b'D'
+    _RECORD_DNS_CHANGE = b'C'
+    _UNAVAILABLE_SLEEP_SEC = 1
+
+    def __init__(self, config: Config, handler: Handler):
+        assert config.spool is not None
+
+        self.config = config
+        self.handler = handler
+        self.spool_dir = config.spool.directory
+
+        self.log_queue: List[bytes] = []
+        self.dns_queue: List[bytes] = []
+
+        self.condition = threading.Condition()
+        self.sealed_segments: List[str] = []
+        self.sealed_bytes = 0
+        self.active_file = None
+        self.active_path: Optional[str] = None
+        # Whether the active segment should be sealed once the drain thread is idle
+        self.seal_requested = False
+        self.next_sequence = 0
+        self.running = True
+
+        if not os.path.isdir(self.spool_dir):
+            os.makedirs(self.spool_dir)
+        self._recover()
+
+        self.drain_thread = threading.Thread(target=self._drain, name='spool-drain', daemon=True)
+        self.drain_thread.start()
+
+    def add_log_line(self, log_event: LogEvent) -> None:
+        """
+        Add a log line to the queue. It's written to the spool when published.
+
+        Parameters:
+            log_event (LogEvent): The log event.
+
+        Returns: None
+        """
+        if log_event.serialized is None:
+            self.serialize_log_line(log_event)
+        self.log_queue.append(log_event.serialized)
+
+    def serialize_log_line(self, log_event: LogEvent) -> None:
+        """
+        Convert a log line to the spool record queued by add_log_line. Safe to call concurrently
+
+        Parameters:
+            log_event (LogEvent): The log event.
+
+        Returns: None
+        """
+        log_event.serialized = Spool._RECORD_LOG + repr(log_event.timestamp.timestamp()).encode('ascii') + b'\t' \
+            + log_event.log_line.encode('utf-8') + b'\n'
+
+    def add_dns_record(self, dns_record: DnsRecord) -> None:
+        """
+        Add a DNS record to the queue. It's written to the spool when published.
+
+        Parameters:
+            dns_record (DnsRecord): The DNS record.
+
+        Returns: None
+        """
+        record_type = Spool._RECORD_DNS_CHANGE if isinstance(dns_record, DnsRecordChange) else Spool._RECORD_DNS
+        self.dns_queue.append(record_type + dumps_bytes(dns_record) + b'\n')
+
+    def publish_log_lines(self, force=False) -> bool:
+        """
+        Write queued log lines to the spool
+
+        Parameters:
+            force (bool): If true, write queued events and seal the segment. Otherwise, write queued events iff
+                queue size >= flush size.
+
+        Returns:
+            bool: If events were written, true. Otherwise, false.
+        """
+        return self._publish(self.log_queue, force)
+
+    def publish_dns_records(self, force=False) -> bool:
+        """
+        Write queued DNS records to the spool
+
+        Parameters:
+            force (bool): If true, write queued events and seal the segment. Otherwise, write queued events iff
+                queue size >= flush size.
+
+        Returns:
+            bool: If events were written, true. Otherwise, false.
+        """
+        return self._publish(self.dns_queue, force)
+
+    def clear(self):
+        """
+        Clear event queues. Events already written to the spool are still delivered
+
+        Parameters: None
+        Returns: None
+        """
+        self.log_queue.clear()
+        self.dns_queue.clear()
+
+    def clear_dns_records(self):
+        """
+        Clear DNS record queue. Records already written to the spool are still delivered
+
+        Parameters: None
+        Returns: None
+        """
+        self.dns_queue.clear()
+
+    def close(self):
+        """
+        Seal the active segment, stop draining, and close the destination handler. Undelivered segments are delivered
+        on the next startup
+
+        Parameters: None
+        Returns: None
+        """
+        with self.condition:
+            self._seal()
+            self.running = False
+            self.condition.notify_all()
+        self.drain_thread.join()
+        self.handler.close()
+
+    def pending_segments(self) -> int:
+        """
+        Get the number of undelivered segments, including the active segment
+
+        Parameters: None
+
+        Returns:
+            int: The number of undelivered segments
+        """
+        with self.condition:
+            return len(self.sealed_segments) + (1 if self.active_file is not None else 0)
+
+    def _publish(self, queue: List[bytes], force: bool) -> bool:
+        assert self.config.spool is not None
+
+        if len(queue) == 0:
+            if force:
+                with self.condition:
+                    self._request_seal()
+            return False
+
+        if len(queue) < self.config.spool.flush_events and not force:
+            return False
+
+        with self.condition:
+            # Backpressure. Wait for the drain thread to free space
+            while self.sealed_bytes >= self.config.spool.max_bytes and self.running:
+                logging.debug('Spool is full. Waiting for it to drain')
+                self.condition.wait()
+
+            if self.active_file is None:
+                self._open_active()
+            assert self.active_file is not None
+            self.active_file.write(b''.join(queue))
+            self.active_file.flush(zlib.Z_SYNC_FLUSH)
+            os.fsync(self.active_file.fileobj.fileno())
+
+            if self.active_file.fileobj.tell() >= self.config.spool.segment_bytes:
+                self._seal()
+            elif force:
+                self._request_seal()
+
+        queue.clear()
+        return True
+
+    def _open_active(self) -> None:
+        self.active_path = os.path.join(self.spool_dir, f'{self.next_sequence:016d}{Spool._ACTIVE_SUFFIX}')
+        self.next_sequence += 1
+        self.active_file = gzip.open(self.active_path, 'wb')
+
+    def _request_seal(self) -> None:
+        if self.active_file is None:
+            return
+        self.seal_requested = True
+        self.condition.notify_all()
+
+    def _seal(self) -> None:
+        self.seal_requested = False
+        if self.active_file is None:
+            return
+        assert self.active_path is not None
+
+        self.active_file.close()
+        sealed_path = self.active_path[:-len(Spool._ACTIVE_SUFFIX)] + Spool._SEALED_SUFFIX
+        os.rename(self.active_path, sealed_path)
+        self.active_file = None
+        self.active_path = None
+
+        self.sealed_segments.append(sealed_path)
+        self.sealed_bytes += os.path.getsize(sealed_path)
+        self.condition.notify_all()
+
+    def _recover(self) -> None:
+        names = sorted(os.listdir(self.spool_dir))
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            if name.endswith(Spool._ACTIVE_SUFFIX):
+                # Segment was still being written when the previous run stopped. Its flushed events are readable
+                sealed_path = path[:-len(Spool._ACTIVE_SUFFIX)] + Spool._SEALED_SUFFIX
+                os.rename(path, sealed_path)
+                path = sealed_path
+            elif name.endswith(Spool._OFFSET_SUFFIX):
+                if not os.path.isfile(path[:-len(Spool._OFFSET_SUFFIX)]):
+                    # Its segment was deleted, but the previous run stopped before the offset was
+                    os.remove(path)
+                continue
+            elif not name.endswith(Spool._SEALED_SUFFIX):
+                continue
+
+            self.sealed_segments.append(path)
+            self.sealed_bytes += os.path.getsize(path)
+            self.next_sequence = max(self.next_sequence, int(os.path.basename(path).split('.')[0]) + 1)
+
+        if self.sealed_segments:
+            logging.info('Replaying %d spooled segments from previous run', len(self.sealed_segments))
+
+    def _drain(self) -> None:
+        while True:
+            with self.condition:
+                while self.running and not self.sealed_segments:
+                    if self.seal_requested:
+                        # Caught up. Deliver the forced events without waiting for the segment to fill
+                        self._seal()
+                        continue
+                    self.condition.wait()
+                if not self.running:
+                    return
+                segment_path = self.sealed_segments[0]
+
+            if not self._deliver_segment(segment_path):
+                # Stopped while the destination was unavailable. The segment is delivered on the next startup
+                return
+
+            with self.condition:
+                self.sealed_bytes -= os.path.getsize(segment_path)
+                # The offset goes first, so it's never left behind for a later segment with the same name
+                Spool._remove_offset(segment_path)
+                os.remove(segment_path)
+                self.sealed_segments.pop(0)
+                self.condition.notify_all()
+
+    def _deliver_segment(self, segment_path: str) -> bool:
+        logging.debug('Delivering spooled segment %s', segment_path)
+
+        log_events = []
+        dns_records = []
+        for record in Spool._read_segment(segment_path):
+            if record[:1] == Spool._RECORD_LOG:
+                timestamp, _, log_line = record[1:].partition(b'\t')
+                log_events.append(LogEvent(
+                    log_line=log_line.decode('utf-8'),
+                    timestamp=datetime.fromtimestamp(float(timestamp), timezone.utc)
+                ))
+            elif record[:1] == Spool._RECORD_DNS:
+                dns_records.append(DnsRecord(**json.loads(record[1:])))
+            elif record[:1] == Spool._RECORD_DNS_CHANGE:
+                dns_records.append(DnsRecordChange(**json.loads(record[1:])))
+
+        # Log events are delivered before DNS records, so a single offset covers both
+        offset = Spool._read_offset(segment_path)
+        if offset > 0:
+            logging.info('Resuming spooled segment %s after %d delivered events', segment_path, offset)
+        log_offset = min(offset, len(log_events))
+
+        return self._deliver_events(segment_path, log_events, log_offset, 0, self.handler.add_log_line,
+                self.handler.publish_log_lines) \
+            and self._deliver_events(segment_path, dns_records, offset - log_offset, len(log_events),
+                self.handler.add_dns_record, self.handler.publish_dns_records)
+
+    def _deliver_events(self, segment_path: str, events: list, delivered: int, base_offset: int, add, publish) -> bool:
+        """
+        Deliver a segment's events, starting after those already delivered. The segment's offset is saved after each
+        accepted batch
+
+        Parameters:
+            segment_path (str): The segment
+            events (list): The events of one kind
+            delivered (int): How many of the events were already accepted by the destination
+            base_offset (int): The segment offset of the first event
+            add: Queues an event in the destination handler
+            publish: Publishes the queued events
+
+        Returns:
+            bool: If every event was delivered, true. If the spool stopped first, false.
+        """
+        while delivered < len(events):
+            pending = 0
+            for event in events[delivered:]:
+                add(event)
+                pending += 1
+                if publish():
+                    delivered += pending
+                    pending = 0
+                    Spool._write_offset(segment_path, base_offset + delivered)
+
+            if pending == 0 or publish(force=True):
+                delivered += pending
+                if pending > 0:
+                    Spool._write_offset(segment_path, base_offset + delivered)
+                continue
+
+            # Destination is unavailable. Wait before trying again
+            self.handler.clear()
+            while not self.handler.is_available() or not self.running:
+                if not self.running:
+                    return False
+                time.sleep(Spool._UNAVAILABLE_SLEEP_SEC)
+
+        return True
+
+    @staticmethod
+    def _read_offset(segment_path: str) -> int:
+        try:
+            with open(segment_path + Spool._OFFSET_SUFFIX, 'r', encoding='ascii') as offset_file:
+                return int(offset_file.read())
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            logging.warning('Spooled segment %s has an unreadable offset. Delivering it from the start', segment_path)
+            return 0
+
+    @staticmethod
+    def _write_offset(segment_path: str, offset: int) -> None:
+        offset_path = segment_path + Spool._OFFSET_SUFFIX
+        with open(offset_path + '.tmp', 'w', encoding='ascii') as offset_file:
+            offset_file.write(str(offset))
+        os.replace(offset_path + '.tmp', offset_path)
+
+    @staticmethod
+    def _remove_offset(segment_path: str) -> None:
+        if os.path.isfile(segment_path + Spool._OFFSET_SUFFIX):
+            os.remove(segment_path + Spool._OFFSET_SUFFIX)
+
+    @staticmethod
+    def _read_segment(segment_path: str) -> List[bytes]:
+        records = []
+        try:
+            with gzip.open(segment_path, 'rb') as segment_file:
+                for record in segment_file:
+                    if record.endswith(b'\n'):
+                        records.append(record[:-1])
+        except (EOFError, OSError, zlib.error) as error:
+            # Segment was cut off by a crash. Deliver the events that were flushed
+            logging.warning('Spooled segment %s is truncated. Delivering its complete events [%s]', segment_path, error)
+        return records
+
+
+def create_spool(config: Config, handler: Handler) -> Handler:
+    if config.spool is None:
+        return handler
+    return Spool(config, handler)
@@ -17,9 +17,11 @@
 
 import json
 import logging
+import time
 from datetime import datetime, timezone
+from typing import Iterable, Tuple
 
-from .config import Config, SysLogProtocol, SysLogTransport, SysLogDelimiter
+from .config import Config, SysLogDatagramOverflow, SysLogProtocol, SysLogTransport, SysLogDelimiter
 from .dns_record import DnsRecord
 from .handler import Handler
 from .json import CustomJsonEncoder
@@ -39,6 +41,11 @@ class SysLog(Handler):
         self.config: Config = config
         self.log_queue: list[LogEvent] = []
         self.dns_queue: list[str] = []
+        # Approximate queued message sizes, used to publish once a batch reaches batch_bytes
+        self.log_queue_bytes = 0
+        self.dns_queue_bytes = 0
+        # After a batch times out, delivery pauses until this time, from time.monotonic
+        self.paused_until = 0.0
 
         protocol = None
         if config.syslog.protocol == SysLogProtocol.RFC3164:
@@ -55,6 +62,8 @@ class SysLog(Handler):
             transport = SysLogger.TRANSPORT_TCP
         elif config.syslog.transport == SysLogTransport.TCP_TLS:
             transport = SysLogger.TRANSPORT_TCP_TLS
+        elif config.syslog.transport == SysLogTransport.RELP:
+            transport = SysLogger.TRANSPORT_RELP
         else:
             assert False, 'Unexpected state. Syslog transport was unknown: ' + str(config.syslog.transport)
 
@@ -73,6 +82,9 @@ class SysLog(Handler):
             assert False, 'Unexpected state. Syslog delimiter method was unknown: ' \
                 + str(config.syslog.delimiter_method)
 
+        datagram_overflow = SysLogger.OVERFLOW_SPLIT \
+            if config.syslog.datagram_overflow == SysLogDatagramOverflow.SPLIT else SysLogger.OVERFLOW_TRUNCATE
+
         self.syslogger = SysLogger(
             transport=transport,
             address=(config.syslog.host, config.syslog.port),
@@ -81,7 +93,20 @@ class SysLog(Handler):
             delimiter_method=delimiter_method,
             from_host = config.syslog.from_host,
             tls_ca_file=None if config.syslog.tls is None else config.syslog.tls.ca_file,
-            tls_check_hostname = True if config.syslog.tls is None else config.syslog.tls.verify
+            tls_check_hostname = True if config.syslog.tls is None else config.syslog.tls.verify,
+            max_write_bytes=config.syslog.max_write_bytes,
+            connections=config.syslog.connections,
+            additional_addresses=[
+                SysLog._parse_host(host, config.syslog.port) for host in config.syslog.additional_hosts],
+            udp_max_rate_per_sec=config.syslog.udp_max_rate_per_sec,
+            udp_burst=config.syslog.udp_burst,
+            max_datagram_bytes=config.syslog.max_datagram_bytes,
+            datagram_overflow=datagram_overflow,
+            dns_cache_sec=config.syslog.dns_cache_sec,
+            retry_initial_sec=config.syslog.retry.initial_sec,
+            retry_max_sec=config.syslog.retry.max_sec,
+            relp_window=config.syslog.relp_window,
+            send_timeout_sec=config.syslog.send_timeout_sec
         )
 
 
@@ -95,6 +120,7 @@ class SysLog(Handler):
         Returns: None
         """
         self.log_queue.append(log_event)
+        self.log_queue_bytes += len(log_event.log_line.encode('utf-8'))
 
 
     def add_dns_record(self, dns_record: DnsRecord) -> None:
@@ -108,6 +134,7 @@ class SysLog(Handler):
         """
         dns_json = json.dumps(dns_record, cls=CustomJsonEncoder)
         self.dns_queue.append(dns_json)
+        self.dns_queue_bytes += len(dns_json.encode('utf-8'))
 
 
     def publish_log_lines(self, force=False) -> bool:
@@ -115,20 +142,26 @@ class SysLog(Handler):
         Publish queued log line SysLog messages to SysLog server
 
         Parameters:
-            force (bool): If true, send queued events. Otherwise, send queued events iff queue size >= batch size.
+            force (bool): If true, send queued events. Otherwise, send queued events iff queue size >= batch size or
+                queued bytes >= batch bytes.
 
         Returns:
             bool: If events were published, true. Otherwise, false.
         """
         if len(self.log_queue) == 0:
             return False
+        if not force and not self._is_batch_full(len(self.log_queue), self.log_queue_bytes):
+            return False
 
         logging.debug('Publishing log lines to SysLog server')
         assert self.config.syslog is not None
-        for log_event in self.log_queue:
-            self.syslogger.log_info(self.config.syslog.lds_app_name, log_event.timestamp, log_event.log_line)
+        if not self._log_info_batch(
+                self.config.syslog.lds_app_name,
+                ((log_event.timestamp, log_event.log_line) for log_event in self.log_queue)):
+            return False
 
         self.log_queue.clear()
+        self.log_queue_bytes = 0
         logging.debug('Published log lines to SysLog server')
         return True
 
@@ -138,21 +171,28 @@ class SysLog(Handler):
         Publish queued DNS record SysLog messages to SysLog server 
 
         Parameters:
-            force (bool): If true, send queued events. Otherwise, send queued events iff queue size >= batch size.
+            force (bool): If true, send queued events. Otherwise, send queued events iff queue size >= batch size or
+                queued bytes >= batch bytes.
 
         Returns:
             bool: If events were published, true. Otherwise, false.
         """
         if len(self.dns_queue) == 0:
             return False
+        if not force and not self._is_batch_full(len(self.dns_queue), self.dns_queue_bytes):
+            return False
 
         logging.debug('Publishing DNS records to SysLog server')
         assert self.config.syslog is not None
         assert self.config.syslog.edgedns_app_name is not None
-        for dns_record in self.dns_queue:
-            self.syslogger.log_info(self.config.syslog.edgedns_app_name, datetime.now(timezone.utc), dns_record)
+        now = datetime.now(timezone.utc)
+        if not self._log_info_batch(
+                self.config.syslog.edgedns_app_name,
+                ((now, dns_record) for dns_record in self.dns_queue)):
+            return False
 
         self.dns_queue.clear()
+        self.dns_queue_bytes = 0
         logging.debug('Published DNS records to SysLog server')
         return True
 
@@ -166,3 +206,50 @@ class SysLog(Handler):
         """
         self.log_queue.clear()
         self.dns_queue.clear()
+        self.log_queue_bytes = 0
+        self.dns_queue_bytes = 0
+
+    def is_available(self) -> bool:
+        """
+        Whether the syslog servers are accepting messages. False for syslog.retry.reset_sec after a batch isn't
+        written within syslog.send_timeout_sec
+
+        Parameters: None
+
+        Returns:
+            bool: If messages can be published, true. Otherwise, false.
+        """
+        return time.monotonic() >= self.paused_until
+
+    def _log_info_batch(self, app_name: str, messages: Iterable[Tuple[datetime, str]]) -> bool:
+        try:
+            self.syslogger.log_info_batch(app_name, messages)
+        except TimeoutError as timeout_error:
+            assert self.config.syslog is not None
+            logging.warning('%s. Pausing delivery for %d seconds', timeout_error, self.config.syslog.retry.reset_sec)
+            self.paused_until = time.monotonic() + self.config.syslog.retry.reset_sec
+            return False
+        return True
+
+    def clear_dns_records(self):
+        """
+        Clear DNS record queue
+
+        Parameters: None
+        Returns: None
+        """
+        self.dns_queue.clear()
+        self.dns_queue_bytes = 0
+
+
+    def _is_batch_full(self, queue_size: int, queue_bytes: int) -> bool:
+        assert self.config.syslog is not None
+        return queue_size >= self.config.syslog.event_batch_size or queue_bytes >= self.config.syslog.batch_bytes
+
+
+    @staticmethod
+    def _parse_host(host: str, default_port: int) -> Tuple[str, int]:
+        name, _, port = host.rpartition(':')
+        if name and port.isdigit():
+            return name, int(port)
+        return host, default_port
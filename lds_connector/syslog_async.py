@@ -0,0 +1,232 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import logging
+import ssl
+import threading
+from typing import List, Optional, Tuple
+
+from .retry import Backoff
+
+
+class AsyncSysLogConnection:
+    """
+    A single TCP or TLS connection to a syslog server. Writes queued batches in order. If a write fails, the batch and
+    those queued behind it fail with ConnectionError, so they can be sent on another connection. The connection then
+    backs off before it's used again, and reconnects.
+    """
+    _CONNECT_TIMEOUT_SEC = 10
+    _WRITE_TIMEOUT_SEC = 30
+
+    def __init__(self, address: Tuple[str, int], ssl_context: Optional[ssl.SSLContext], check_hostname: bool,
+            queue_size: int, backoff: Backoff):
+        self.address = address
+        self.ssl_context = ssl_context
+        self.check_hostname = check_hostname
+        self.queue_size = queue_size
+        self.backoff = backoff
+
+        # Created on the event loop
+        self.queue: Optional[asyncio.Queue] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # Batches queued but not yet written or failed. Used to pick the least busy connection
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+        # Event loop time before which the connection isn't used, after a failure
+        self.failed_until = 0.0
+
+    async def write(self, data: bytes) -> None:
+        """
+        Queue a batch and wait until it's written. Waits for space if the connection's queue is full
+
+        Parameters:
+            data (bytes): The framed syslog messages
+
+        Returns: None
+
+        Raises:
+            ConnectionError: If the batch couldn't be written
+        """
+        assert self.queue is not None
+        done = asyncio.get_running_loop().create_future()
+        with self.pending_lock:
+            self.pending += 1
+        try:
+            await self.queue.put((data, done))
+        except asyncio.CancelledError:
+            with self.pending_lock:
+                self.pending -= 1
+            raise
+        await done
+
+    async def run(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        while True:
+            data, done = await self.queue.get()
+            with self.pending_lock:
+                self.pending -= 1
+            if done.done():
+                # The sender stopped waiting for this batch
+                continue
+
+            try:
+                if self.writer is None:
+                    await asyncio.wait_for(self._connect(), AsyncSysLogConnection._CONNECT_TIMEOUT_SEC)
+                assert self.writer is not None
+                self.writer.write(data)
+                await asyncio.wait_for(self.writer.drain(), AsyncSysLogConnection._WRITE_TIMEOUT_SEC)
+                self.backoff.reset()
+                self.failed_until = 0.0
+                done.set_result(None)
+            except Exception as exc:
+                logging.error('Syslog publish to %s:%d failed: %s', self.address[0], self.address[1], exc)
+                self._close()
+                self.failed_until = asyncio.get_running_loop().time() + self.backoff.next_delay()
+                self._fail(done)
+                # Fail the queued batches now, rather than make them wait out this connection's backoff
+                while not self.queue.empty():
+                    _, queued_done = self.queue.get_nowait()
+                    with self.pending_lock:
+                        self.pending -= 1
+                    self._fail(queued_done)
+
+    def _fail(self, done: asyncio.Future) -> None:
+        if not done.done():
+            done.set_exception(ConnectionError(f'Syslog connection to {self.address[0]}:{self.address[1]} failed'))
+
+    async def _connect(self) -> None:
+        host, port = self.address
+        server_hostname = None
+        if self.ssl_context is not None:
+            # An empty server hostname disables hostname verification
+            server_hostname = host if self.check_hostname else ''
+        _, self.writer = await asyncio.open_connection(
+            host, port, ssl=self.ssl_context, server_hostname=server_hostname)
+
+    def close(self) -> None:
+        """
+        Close the connection, if open
+
+        Parameters: None
+        Returns: None
+        """
+        self._close()
+
+    def _close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class AsyncSysLogTransport:
+    """
+    Sends syslog messages over several TCP or TLS connections in parallel. The connections are spread across the
+    syslog servers. Each batch goes to the connection with the fewest batches waiting to be written, taking turns
+    between connections that are equally busy. Each connection buffers a limited number of batches, so a slow server
+    slows down only its own connections. Batches that fail on one connection are sent on another, and failed
+    connections are avoided until their backoff expires.
+
+    The connections run on an asyncio event loop in a background thread.
+    """
+    _QUEUE_SIZE = 4
+
+    def __init__(self, addresses: List[Tuple[str, int]], connections: int, ssl_context: Optional[ssl.SSLContext],
+            check_hostname: bool, retry_initial_sec: float = 1, retry_max_sec: float = 60):
+        assert len(addresses) > 0
+        self.connections = [
+            AsyncSysLogConnection(addresses[index % len(addresses)], ssl_context, check_hostname,
+                AsyncSysLogTransport._QUEUE_SIZE, Backoff(initial_sec=retry_initial_sec, max_sec=retry_max_sec))
+            for index in range(max(connections, len(addresses)))
+        ]
+
+        # Where the search for the least busy connection starts. Advances with each batch
+        self.next_connection = 0
+
+        self.tasks: List[asyncio.Task] = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name='syslog-async', daemon=True)
+        self.thread.start()
+
+        started = threading.Event()
+        self.loop.call_soon_threadsafe(self._start_connections, started)
+        started.wait()
+
+    def send(self, data: bytes) -> concurrent.futures.Future:
+        """
+        Send a batch of framed syslog messages on the least busy connection
+
+        Parameters:
+            data (bytes): The framed syslog messages
+
+        Returns:
+            concurrent.futures.Future: Completes once the batch is written. Cancel it to stop retrying
+        """
+        return asyncio.run_coroutine_threadsafe(self._send(data), self.loop)
+
+    def close(self) -> None:
+        """
+        Stop the event loop. Batches that aren't written yet are dropped
+
+        Parameters: None
+        Returns: None
+        """
+        if self.loop.is_closed() or not self.thread.is_alive():
+            return
+        asyncio.run_coroutine_threadsafe(self._stop_connections(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def _send(self, data: bytes) -> None:
+        while True:
+            connection = self._pick_connection()
+            delay = connection.failed_until - self.loop.time()
+            if delay > 0:
+                # Every connection has failed recently. Wait for the first to come out of backoff
+                await asyncio.sleep(delay)
+            try:
+                await connection.write(data)
+                return
+            except ConnectionError:
+                logging.debug('Resending syslog batch on another connection')
+
+    def _pick_connection(self) -> AsyncSysLogConnection:
+        # Runs on the event loop. Healthy connections first, then the least busy. Ties take turns
+        start = self.next_connection
+        self.next_connection = (start + 1) % len(self.connections)
+        now = self.loop.time()
+        return min(self.connections[start:] + self.connections[:start],
+            key=lambda c: (max(c.failed_until - now, 0.0), c.pending))
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _start_connections(self, started: threading.Event) -> None:
+        for connection in self.connections:
+            self.tasks.append(self.loop.create_task(connection.run()))
+        # Each connection creates its queue when its task first runs. Signal once they all have
+        self.loop.call_soon(started.set)
+
+    async def _stop_connections(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for connection in self.connections:
+            connection.close()
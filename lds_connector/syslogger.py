@@ -1,22 +1,27 @@
+import concurrent.futures
+import errno
 import logging
 from dataclasses import dataclass
 from datetime import datetime
 import socket
 import ssl
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import time
 
+from .rate_limit import TokenBucket
+from .relp import RelpClient
+from .retry import Backoff
+from .syslog_async import AsyncSysLogTransport
+
+
 @dataclass
-class SysLogRecord:
-    severity: int
-    facility: int
-    time: datetime
-    hostname: str
-    app_name: str
-    process_id: Optional[str]          # Not yet supported
-    message_id: Optional[str]          # Not yet supported
-    structured_data: Optional[str]     # Not yet supported
-    message: str
+class SysLogCounters:
+    sent: int = 0
+    send_errors: int = 0
+    truncated: int = 0
+    split: int = 0
+    dropped: int = 0
+
 
 class SysLogger:
     # Severity codes
@@ -51,6 +56,7 @@ class SysLogger:
     TRANSPORT_UDP       = 0
     TRANSPORT_TCP       = 1
     TRANSPORT_TCP_TLS   = 2
+    TRANSPORT_RELP      = 3
 
     # Syslog formats
     PROTOCOL_RFC3164 = 0
@@ -63,9 +69,19 @@ class SysLogger:
     DELIM_NULL = 3
     DELIM_OCTET = 4
 
+    # Oversized datagram handling
+    OVERFLOW_TRUNCATE = 0
+    OVERFLOW_SPLIT = 1
+
     _SYSLOG_RFC3164_TIME_FORMAT = '%b %d %H:%M:%S'
     _SYSLOG_RFC5424_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
+    _DELIMITERS = {
+        DELIM_LF: b'\n',
+        DELIM_CRLF: b'\r\n',
+        DELIM_NULL: b'\x00'
+    }
+
     def __init__(
             self,
             transport: int,
@@ -75,7 +91,19 @@ class SysLogger:
             delimiter_method: int,
             from_host: Optional[str] = None,
             tls_ca_file: Optional[str] = None,
-            tls_check_hostname: bool = True
+            tls_check_hostname: bool = True,
+            max_write_bytes: int = 65536,
+            connections: int = 1,
+            additional_addresses: Optional[List[Tuple[str, int]]] = None,
+            udp_max_rate_per_sec: Optional[float] = None,
+            udp_burst: Optional[int] = None,
+            max_datagram_bytes: Optional[int] = None,
+            datagram_overflow: int = OVERFLOW_TRUNCATE,
+            dns_cache_sec: float = 300,
+            retry_initial_sec: float = 1,
+            retry_max_sec: float = 60,
+            relp_window: int = 128,
+            send_timeout_sec: Optional[float] = None
     ):
         self.transport = transport
         self.address = address
@@ -84,8 +112,38 @@ class SysLogger:
         self.from_address = from_host
         self.delimiter_method = delimiter_method
         self.tls_check_hostname = tls_check_hostname
+        self.max_write_bytes = max_write_bytes
+        self.send_timeout_sec = send_timeout_sec
+        self.max_datagram_bytes = max_datagram_bytes
+        self.datagram_overflow = datagram_overflow
+        self.counters = SysLogCounters()
+
+        self.pacer: Optional[TokenBucket] = None
+        if transport == SysLogger.TRANSPORT_UDP and udp_max_rate_per_sec is not None:
+            self.pacer = TokenBucket(udp_max_rate_per_sec, udp_burst if udp_burst is not None else udp_max_rate_per_sec)
+
+        # Pre-rendered message parts. Only the timestamp and message vary between messages
+        self.hostname = from_host if from_host else socket.gethostname()
+        self.headers: Dict[str, Tuple[bytes, bytes]] = {}
+        self.delimiter = SysLogger._DELIMITERS.get(delimiter_method, b'')
+        self.time_format = SysLogger._SYSLOG_RFC5424_TIME_FORMAT if protocol == SysLogger.PROTOCOL_RFC5424 \
+            else SysLogger._SYSLOG_RFC3164_TIME_FORMAT
+        # Formatted timestamp of the last message. Messages usually arrive in time order, so it's mostly reused
+        self.last_time_key: Optional[Tuple[int, object]] = None
+        self.last_time_bytes = b''
 
         self.socket = None
+        # Address the socket is connected or sending to
+        self.sockaddr = None
+        self.backoff = Backoff(initial_sec=retry_initial_sec, max_sec=retry_max_sec)
+
+        # Resolved addresses, reused on reconnect until they expire
+        self.dns_cache_sec = dns_cache_sec
+        self.dns_results: list = []
+        self.dns_resolved_at = 0.0
+
+        # TLS session of the last connection. Resuming it on reconnect skips the full handshake
+        self.tls_session: Optional[ssl.SSLSession] = None
 
         self.ssl_context = None
         if self.transport == SysLogger.TRANSPORT_TCP_TLS:
@@ -94,8 +152,25 @@ class SysLogger:
             self.ssl_context.verify_mode = ssl.CERT_REQUIRED
             self.ssl_context.check_hostname = tls_check_hostname
 
+        # Parallel connections, if configured. Otherwise, a single blocking socket is used
+        self.async_transport: Optional[AsyncSysLogTransport] = None
+        addresses = [address] + (additional_addresses or [])
+        if transport in (SysLogger.TRANSPORT_TCP, SysLogger.TRANSPORT_TCP_TLS) \
+                and (connections > 1 or len(addresses) > 1):
+            self.async_transport = AsyncSysLogTransport(addresses, connections, self.ssl_context, tls_check_hostname,
+                retry_initial_sec, retry_max_sec)
+
+        # RELP frames its own messages and waits for the server to acknowledge each one
+        self.relp: Optional[RelpClient] = None
+        if transport == SysLogger.TRANSPORT_RELP:
+            self.relp = RelpClient(address, relp_window)
+
 
     def __del__(self):
+        if self.async_transport is not None:
+            self.async_transport.close()
+        if self.relp is not None:
+            self.relp.close()
         if self.socket is not None:
             if self.transport == SysLogger.TRANSPORT_TCP_TLS:
                 self.socket.shutdown(socket.SHUT_RDWR)
@@ -103,40 +178,214 @@ class SysLogger:
 
 
     def log_info(self, app_name: str, timestamp: datetime, message: str):
-        record = SysLogRecord(
-            severity = SysLogger.SEV_INFO,
-            facility = self.facility,
-            time = timestamp,
-            hostname = self.from_address if self.from_address else socket.gethostname(),
-            app_name = app_name,
-            process_id = None,
-            message_id = None,
-            structured_data = None,
-            message = message
-        )
-
-        event = None
+        self.log_info_batch(app_name, [(timestamp, message)])
+
+
+    def log_info_batch(self, app_name: str, messages: Iterable[Tuple[datetime, str]]):
+        """
+        Send informational messages. Over TCP, framed messages are coalesced into buffers of up to max_write_bytes and
+        each buffer is written at once. Over UDP, each message is its own datagram. Datagrams are paced and limited in
+        size, if configured. Over RELP, returns once the server has acknowledged every message
+
+        Parameters:
+            app_name (str): The app name header field
+            messages (Iterable[Tuple[datetime, str]]): The message timestamps and bodies
+
+        Returns: None
+
+        Raises:
+            TimeoutError: If batches sent on parallel connections weren't written within send_timeout_sec. Some
+                messages may have been sent
+        """
+        buffer = bytearray()
+        # Batches sent on parallel connections. Wait for them all before returning
+        futures = []
+        send_errors = self.counters.send_errors
+        if self.relp is not None:
+            self._send_relp(app_name, messages)
+            return
+
+        for timestamp, message in messages:
+            if self.transport == SysLogger.TRANSPORT_UDP:
+                for datagram in self._format_datagrams(app_name, timestamp, message):
+                    if self.pacer is not None:
+                        self.pacer.acquire()
+                    self._send_retry(datagram)
+                continue
+
+            event = self._format_event(app_name, timestamp, message)
+            if event is None:
+                continue
+
+            if buffer and len(buffer) + len(event) > self.max_write_bytes:
+                self._send_batch(bytes(buffer), futures)
+                del buffer[:]
+            buffer += event
+
+        if buffer:
+            self._send_batch(bytes(buffer), futures)
+
+        self._wait_for_batches(futures)
+
+        if self.counters.send_errors > send_errors:
+            logging.warning('Syslog send errors during batch: %d. Totals: %s',
+                self.counters.send_errors - send_errors, self.counters)
+
+
+    def _wait_for_batches(self, futures: List[concurrent.futures.Future]):
+        deadline = None if self.send_timeout_sec is None else time.monotonic() + self.send_timeout_sec
+        try:
+            for future in futures:
+                future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError as timeout_error:
+            # Stop retrying the batches that are left, so they aren't written after the caller gives up
+            for future in futures:
+                future.cancel()
+            self.counters.send_errors += 1
+            raise TimeoutError(f'Syslog batches not written within {self.send_timeout_sec} seconds') \
+                from timeout_error
+
+
+    def _send_relp(self, app_name: str, messages: Iterable[Tuple[datetime, str]]):
+        assert self.relp is not None
+        events = []
+        for timestamp, message in messages:
+            header = self._format_header(app_name, timestamp)
+            if header is not None:
+                events.append(header + message.encode('utf-8'))
+
+        # Resend whatever wasn't acknowledged until the server has it all
+        while events:
+            acked = self.relp.send(events)
+            self.counters.sent += acked
+            events = events[acked:]
+            if events:
+                self.counters.send_errors += 1
+                time.sleep(self.backoff.next_delay())
+        self.backoff.reset()
+
+
+    def _send_batch(self, batch: bytes, futures: list):
+        if self.async_transport is not None:
+            futures.append(self.async_transport.send(batch))
+        else:
+            self._send_retry(batch)
+
+
+    def _format_event(self, app_name: str, timestamp: datetime, message: str) -> Optional[bytes]:
+        header = self._format_header(app_name, timestamp)
+        if header is None:
+            return None
+        return self._frame(header + message.encode('utf-8'))
+
+
+    def _format_datagrams(self, app_name: str, timestamp: datetime, message: str) -> List[bytes]:
+        """
+        Format a message as one or more datagrams of at most max_datagram_bytes. An oversized message body is either
+        truncated or split across several messages with the same header
+
+        Parameters:
+            app_name (str): The app name header field
+            timestamp (datetime): The message timestamp
+            message (str): The message body
+
+        Returns:
+            List[bytes]: The framed datagrams. If the protocol is invalid, empty.
+        """
+        header = self._format_header(app_name, timestamp)
+        if header is None:
+            return []
+
+        body = message.encode('utf-8')
+        if self.max_datagram_bytes is None:
+            return [self._frame(header + body)]
+
+        overhead = len(header) + len(self.delimiter)
+        if self.delimiter_method == SysLogger.DELIM_OCTET:
+            overhead += len(str(self.max_datagram_bytes)) + 1
+        body_limit = max(1, self.max_datagram_bytes - overhead)
+        if len(body) <= body_limit:
+            return [self._frame(header + body)]
+
+        if self.datagram_overflow == SysLogger.OVERFLOW_SPLIT:
+            self.counters.split += 1
+            datagrams = []
+            while body:
+                cut = SysLogger._utf8_boundary(body, body_limit)
+                datagrams.append(self._frame(header + body[:cut]))
+                body = body[cut:]
+            return datagrams
+
+        self.counters.truncated += 1
+        return [self._frame(header + body[:SysLogger._utf8_boundary(body, body_limit)])]
+
+
+    def _format_header(self, app_name: str, timestamp: datetime) -> Optional[bytes]:
+        header = self.headers.get(app_name, None)
+        if header is None:
+            header = self._render_header(app_name)
+            if header is None:
+                return None
+
+        prefix, infix = header
+        return prefix + self._format_time(timestamp) + infix
+
+
+    def _frame(self, event: bytes) -> bytes:
+        event += self.delimiter
+        if self.delimiter_method == SysLogger.DELIM_OCTET:
+            # RFC 6587 octet counts are in bytes, not characters
+            event = str(len(event)).encode('ascii') + b' ' + event
+        return event
+
+
+    @staticmethod
+    def _utf8_boundary(data: bytes, limit: int) -> int:
+        # Back off continuation bytes so multi-byte characters aren't cut in half
+        if limit >= len(data):
+            return len(data)
+        cut = limit
+        while cut > 0 and data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        return cut if cut > 0 else limit
+
+
+    def _render_header(self, app_name: str) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Render the static header parts for an app name. They go before and after the timestamp
+
+        Parameters:
+            app_name (str): The app name header field
+
+        Returns:
+            Optional[Tuple[bytes, bytes]]: The header parts. If the protocol is invalid, None.
+        """
+        pri = self._encode_prio(SysLogger.SEV_INFO)
         if self.protocol == SysLogger.PROTOCOL_RFC3164:
-            event = self._format_rfc3164(record)
+            header = (f'<{pri}>', f' {self.hostname} {app_name}: ')
         elif self.protocol == SysLogger.PROTOCOL_RFC5424:
-            event = self._format_rfc5424(record)
+            header = (f'<{pri}>1 ', f' {self.hostname} {app_name} - - - ')
         else:
             logging.error('Invalid syslog flavor: %s', self.protocol)
-            return
+            return None
 
-        if self.delimiter_method == SysLogger.DELIM_LF:
-            event += '\n'
-        elif self.delimiter_method == SysLogger.DELIM_CRLF:
-            event += '\r\n'
-        elif self.delimiter_method == SysLogger.DELIM_NULL:
-            event += '\x00'
-        elif self.delimiter_method == SysLogger.DELIM_OCTET:
-            event = f'{len(event)} {event}'
+        rendered = (header[0].encode('utf-8'), header[1].encode('utf-8'))
+        self.headers[app_name] = rendered
+        return rendered
 
-        event_bytes = event.encode('utf-8')
 
-        while not self._send(event_bytes):
-            time.sleep(1)
+    def _format_time(self, timestamp: datetime) -> bytes:
+        time_key = (int(timestamp.timestamp()), timestamp.utcoffset())
+        if time_key != self.last_time_key:
+            self.last_time_key = time_key
+            self.last_time_bytes = timestamp.strftime(self.time_format).encode('ascii')
+        return self.last_time_bytes
+
+
+    def _send_retry(self, event: bytes):
+        while not self._send(event):
+            time.sleep(self.backoff.next_delay())
+        self.backoff.reset()
 
 
     def _send(self, event: bytes) -> bool:
@@ -146,16 +395,60 @@ class SysLogger:
 
             assert self.socket is not None, 'Unexpected state. Socket was not created'
             if self.transport == SysLogger.TRANSPORT_UDP:
-                self.socket.sendto(event, self.address)
-            elif self.transport == SysLogger.TRANSPORT_TCP or SysLogger.TRANSPORT_TCP_TLS:
+                self.socket.sendto(event, self.sockaddr)
+            elif self.transport in (SysLogger.TRANSPORT_TCP, SysLogger.TRANSPORT_TCP_TLS):
                 self.socket.sendall(event)
+            self.counters.sent += 1
+            return True
+        except OSError as exc:
+            if self.transport != SysLogger.TRANSPORT_UDP or exc.errno != errno.EMSGSIZE:
+                return self._send_failed(exc)
+            # The datagram will never fit, so retrying can't help. Drop it and carry on
+            self.counters.dropped += 1
+            logging.warning('Syslog datagram of %d bytes dropped. Too large to send: %s', len(event), exc)
             return True
         except Exception as exc:
-            logging.error('Syslog publish failed: %s', exc)
-            if self.socket is not None:
-                self.socket.close()
-                self.socket = None
-            return False
+            return self._send_failed(exc)
+
+
+    def _send_failed(self, exc: Exception) -> bool:
+        self.counters.send_errors += 1
+        logging.error('Syslog publish failed: %s', exc)
+        if self.socket is not None:
+            self._save_tls_session()
+            self.socket.close()
+            self.socket = None
+        return False
+
+
+    def _save_tls_session(self):
+        # TLS 1.3 session tickets can arrive after the handshake, so the session is read again on close
+        session = getattr(self.socket, 'session', None) if self.transport == SysLogger.TRANSPORT_TCP_TLS else None
+        if session is not None:
+            self.tls_session = session
+
+
+    def _resolve(self, socktype: int) -> list:
+        """
+        Resolve the syslog server address. Results are cached for dns_cache_sec
+
+        Parameters:
+            socktype (int): The socket type
+
+        Returns:
+            list: The getaddrinfo results
+        """
+        if self.dns_results and time.monotonic() - self.dns_resolved_at < self.dns_cache_sec:
+            return self.dns_results
+
+        host, port = self.address
+        results = socket.getaddrinfo(host, port, 0, socktype)
+        if not results:
+            raise OSError("getaddrinfo returned an empty list")
+
+        self.dns_results = results
+        self.dns_resolved_at = time.monotonic()
+        return results
 
 
     def _create_socket(self):
@@ -165,10 +458,8 @@ class SysLogger:
         elif self.transport in (SysLogger.TRANSPORT_TCP, SysLogger.TRANSPORT_TCP_TLS):
             socktype = socket.SOCK_STREAM
 
-        host, port = self.address
-        results = socket.getaddrinfo(host, port, 0, socktype)
-        if not results:
-            raise OSError("getaddrinfo returned an empty list")
+        host, _ = self.address
+        results = self._resolve(socktype)
 
         # Open a socket using each result until successful
         err = None
@@ -179,37 +470,34 @@ class SysLogger:
                 sock = socket.socket(address_fam, socktype, proto)
                 if socktype == socket.SOCK_STREAM:
                     sock.connect(sockaddr)
+                err = None
                 break
             except OSError as os_error:
                 err = os_error
                 if sock is not None:
                     sock.close()
 
-        # None of sockets were successful
+        # None of sockets were successful. The server may have moved, so resolve again next time
         if err is not None:
+            self.dns_results = []
             raise err
         assert sock is not None, 'Unexpected state. Socket was not created'
 
         if self.transport == SysLogger.TRANSPORT_TCP_TLS:
             assert self.ssl_context is not None, 'Unexpected state. SSL context was not created'
+            wrap_args = {}
             if self.tls_check_hostname:
-                sock = self.ssl_context.wrap_socket(sock, server_hostname=host)
-            else:
-                sock = self.ssl_context.wrap_socket(sock)
+                wrap_args['server_hostname'] = host
+            if self.tls_session is not None:
+                wrap_args['session'] = self.tls_session
+            # A server that no longer accepts the session does a full handshake instead of failing
+            sock = self.ssl_context.wrap_socket(sock, **wrap_args)
+            if self.tls_session is not None:
+                logging.debug('Syslog TLS session reused: %s', getattr(sock, 'session_reused', False))
+            self.tls_session = getattr(sock, 'session', None) or self.tls_session
 
         self.socket = sock
-
-
-    def _format_rfc3164(self, record: SysLogRecord) -> str:
-        pri_str = self._encode_prio(record.severity)
-        timestamp_str = record.time.strftime(SysLogger._SYSLOG_RFC3164_TIME_FORMAT)
-        return f'<{pri_str}>{timestamp_str} {record.hostname} {record.app_name}: {record.message}'
-
-
-    def _format_rfc5424(self, record: SysLogRecord) -> str:
-        pri_str = self._encode_prio(record.severity)
-        timestamp_str = record.time.strftime(SysLogger._SYSLOG_RFC5424_TIME_FORMAT)
-        return f'<{pri_str}>1 {timestamp_str} {record.hostname} {record.app_name} - - - {record.message}'
+        self.sockaddr = sockaddr
 
 
     def _encode_prio(self, severity: int) -> int:
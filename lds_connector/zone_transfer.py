@@ -0,0 +1,577 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import hmac
+import ipaddress
+import logging
+import random
+import socket
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .config import ZoneTransferConfig
+from .dns_record import DnsRecord
+
+# (owner name, type)
+RecordSetKey = Tuple[str, str]
+
+TYPE_SOA = 6
+TYPE_TSIG = 250
+TYPE_IXFR = 251
+TYPE_AXFR = 252
+CLASS_IN = 1
+CLASS_ANY = 255
+
+_TYPE_NAMES = {
+    1: 'A', 2: 'NS', 5: 'CNAME', 6: 'SOA', 12: 'PTR', 13: 'HINFO', 15: 'MX', 16: 'TXT', 28: 'AAAA', 29: 'LOC',
+    33: 'SRV', 35: 'NAPTR', 39: 'DNAME', 43: 'DS', 44: 'SSHFP', 46: 'RRSIG', 47: 'NSEC', 48: 'DNSKEY', 50: 'NSEC3',
+    51: 'NSEC3PARAM', 52: 'TLSA', 64: 'SVCB', 65: 'HTTPS', 99: 'SPF', 257: 'CAA'
+}
+
+_TSIG_ALGORITHMS = {
+    'hmac-sha1': ('hmac-sha1.', hashlib.sha1),
+    'hmac-sha256': ('hmac-sha256.', hashlib.sha256),
+    'hmac-sha512': ('hmac-sha512.', hashlib.sha512)
+}
+
+
+class ZoneTransferError(Exception):
+    pass
+
+
+@dataclass
+class ResourceRecord:
+    name: str
+    type: int
+    ttl: int
+    rdata: str
+
+
+@dataclass
+class _ZoneCopy:
+    serial: int
+    # Record set to TTL and rdata
+    record_sets: Dict[RecordSetKey, Tuple[int, List[str]]]
+
+
+class TsigKey:
+    """
+    Transaction signature (TSIG) key. Signs requests, and verifies the signed responses to them
+    """
+    _FUDGE_SEC = 300
+
+    def __init__(self, name: str, secret: str, algorithm: str):
+        self.name = name
+        self.secret = base64.b64decode(secret)
+        self.algorithm_name, self.digest = _TSIG_ALGORITHMS[algorithm]
+
+    def sign(self, message: bytes) -> Tuple[bytes, bytes]:
+        """
+        Sign a request
+
+        Parameters:
+            message (bytes): The request, without a TSIG record
+
+        Returns:
+            Tuple[bytes, bytes]: The request with its TSIG record appended, and the request MAC
+        """
+        time_signed = int(time.time())
+        mac = hmac.new(self.secret, message + self._variables(time_signed, TsigKey._FUDGE_SEC, 0, b''),
+            self.digest).digest()
+
+        message_id = struct.unpack('!H', message[0:2])[0]
+        rdata = encode_name(self.algorithm_name) + _encode_time(time_signed) + \
+            struct.pack('!HH', TsigKey._FUDGE_SEC, len(mac)) + mac + struct.pack('!HHH', message_id, 0, 0)
+        record = encode_name(self.name) + struct.pack('!HHIH', TYPE_TSIG, CLASS_ANY, 0, len(rdata)) + rdata
+
+        arcount = struct.unpack('!H', message[10:12])[0]
+        return message[:10] + struct.pack('!H', arcount + 1) + message[12:] + record, mac
+
+    def verify(self, message: bytes, tsig_offset: int, prior_mac: bytes, unsigned: bytes, first: bool) -> bytes:
+        """
+        Verify a signed response
+
+        Parameters:
+            message (bytes): The response
+            tsig_offset (int): Where the response's TSIG record starts
+            prior_mac (bytes): The request MAC for the first response. Otherwise, the MAC of the last signed response
+            unsigned (bytes): The unsigned responses since the last signed one
+            first (bool): Whether this is the first response
+
+        Returns:
+            bytes: The response's MAC
+        """
+        _, offset = decode_name(message, tsig_offset)
+        offset += 10
+        _, offset = decode_name(message, offset)
+        time_signed = _decode_time(message[offset:offset + 6])
+        fudge, mac_size = struct.unpack('!HH', message[offset + 6:offset + 10])
+        offset += 10
+        mac = message[offset:offset + mac_size]
+        offset += mac_size
+        original_id, error, other_len = struct.unpack('!HHH', message[offset:offset + 6])
+        other = message[offset + 6:offset + 6 + other_len]
+
+        if error != 0:
+            raise ZoneTransferError(f'Zone transfer TSIG error: {error}')
+
+        # The MAC covers the response as it was before the TSIG record was added
+        arcount = struct.unpack('!H', message[10:12])[0]
+        stripped = struct.pack('!H', original_id) + message[2:10] + struct.pack('!H', arcount - 1) + \
+            message[12:tsig_offset]
+
+        content = struct.pack('!H', len(prior_mac)) + prior_mac + unsigned + stripped
+        if first:
+            content += self._variables(time_signed, fudge, error, other)
+        else:
+            content += _encode_time(time_signed) + struct.pack('!H', fudge)
+        expected_mac = hmac.new(self.secret, content, self.digest).digest()
+
+        if not hmac.compare_digest(mac, expected_mac):
+            raise ZoneTransferError('Zone transfer TSIG signature is invalid')
+        if abs(time.time() - time_signed) > fudge:
+            raise ZoneTransferError('Zone transfer TSIG signature has expired')
+        return mac
+
+    def _variables(self, time_signed: int, fudge: int, error: int, other: bytes) -> bytes:
+        return encode_name(self.name.lower()) + struct.pack('!HI', CLASS_ANY, 0) + \
+            encode_name(self.algorithm_name.lower()) + _encode_time(time_signed) + \
+            struct.pack('!HHH', fudge, error, len(other)) + other
+
+
+class ZoneTransferClient:
+    """
+    Fetches zones by zone transfer over TCP. With AXFR, the whole zone is transferred each time. With IXFR, only the
+    changes since the last transfer are, and they're applied to a copy of the zone kept in memory. Either way, the
+    whole zone's record sets are returned, the same as from the Edge DNS API.
+
+    If a TSIG key is given, requests are signed and responses must be signed with the same key.
+    """
+
+    def __init__(self, address: Tuple[str, int], incremental: bool, tsig_key: Optional[TsigKey] = None,
+            timeout_sec: float = 30):
+        self.address = address
+        self.incremental = incremental
+        self.tsig_key = tsig_key
+        self.timeout_sec = timeout_sec
+
+        # Zones from the last transfer, for IXFR
+        self.zones: Dict[str, _ZoneCopy] = {}
+
+    def get_records(self, zone: str, deadline: Optional[float] = None) -> Optional[List[DnsRecord]]:
+        """
+        Transfer a zone
+
+        Parameters:
+            zone (str): The zone name
+            deadline (Optional[float]): When to give up on the transfer, from time.monotonic. If None, only each read
+                times out
+
+        Returns:
+            Optional[List[DnsRecord]]: The zone's record sets. If the transfer failed or timed out, None.
+        """
+        try:
+            zone_copy = self._transfer(zone, deadline)
+        except (OSError, ZoneTransferError, struct.error, IndexError, ValueError) as error:
+            logging.error('Failed transferring Edge DNS zone [%s]: %s', zone, error)
+            return None
+
+        if self.incremental:
+            self.zones[zone] = zone_copy
+
+        time_fetched_sec = time.time()
+        return [
+            DnsRecord(
+                time_fetched_sec=time_fetched_sec,
+                zone=zone,
+                name=name,
+                type=record_type,
+                ttl_sec=ttl_sec,
+                rdata=list(rdata)
+            )
+            for (name, record_type), (ttl_sec, rdata) in zone_copy.record_sets.items()
+        ]
+
+    def _transfer(self, zone: str, deadline: Optional[float]) -> _ZoneCopy:
+        previous = self.zones.get(zone, None) if self.incremental else None
+        query, query_id = ZoneTransferClient._create_query(zone, previous)
+        prior_mac = b''
+        if self.tsig_key is not None:
+            query, prior_mac = self.tsig_key.sign(query)
+
+        transfer = _Transfer(previous)
+        unsigned = b''
+        first = True
+        with socket.create_connection(self.address, timeout=self._read_timeout(deadline)) as sock:
+            sock.sendall(struct.pack('!H', len(query)) + query)
+            reader = sock.makefile('rb')
+            try:
+                while not transfer.done:
+                    sock.settimeout(self._read_timeout(deadline))
+                    message = _read(reader, struct.unpack('!H', _read(reader, 2))[0])
+                    records, tsig_offset = ZoneTransferClient._parse_response(message, query_id)
+
+                    if self.tsig_key is not None:
+                        if tsig_offset is not None:
+                            prior_mac = self.tsig_key.verify(message, tsig_offset, prior_mac, unsigned, first)
+                            unsigned = b''
+                        elif first:
+                            raise ZoneTransferError('Zone transfer response is not signed')
+                        else:
+                            unsigned += message
+                    first = False
+
+                    for record in records:
+                        transfer.add(record)
+                    transfer.end_message()
+            finally:
+                reader.close()
+
+        if unsigned:
+            raise ZoneTransferError('Zone transfer ended with an unsigned response')
+        return transfer.result()
+
+    def _read_timeout(self, deadline: Optional[float]) -> float:
+        if deadline is None:
+            return self.timeout_sec
+        remaining_sec = deadline - time.monotonic()
+        if remaining_sec <= 0:
+            raise ZoneTransferError('Zone transfer timed out')
+        return min(self.timeout_sec, remaining_sec)
+
+    @staticmethod
+    def _create_query(zone: str, previous: Optional[_ZoneCopy]) -> Tuple[bytes, int]:
+        query_id = random.randint(0, 0xFFFF)
+        query_type = TYPE_AXFR if previous is None else TYPE_IXFR
+        nscount = 0 if previous is None else 1
+
+        message = struct.pack('!HHHHHH', query_id, 0, 1, 0, nscount, 0)
+        message += encode_name(zone) + struct.pack('!HH', query_type, CLASS_IN)
+        if previous is not None:
+            # IXFR gives the serial of the zone copy in the authority section
+            rdata = b'\x00\x00' + struct.pack('!IIIII', previous.serial, 0, 0, 0, 0)
+            message += encode_name(zone) + struct.pack('!HHIH', TYPE_SOA, CLASS_IN, 0, len(rdata)) + rdata
+        return message, query_id
+
+    @staticmethod
+    def _parse_response(message: bytes, query_id: int) -> Tuple[List[ResourceRecord], Optional[int]]:
+        """
+        Parse a zone transfer response
+
+        Parameters:
+            message (bytes): The response
+            query_id (int): The query's message ID
+
+        Returns:
+            Tuple[List[ResourceRecord], Optional[int]]: The answer records, and where the TSIG record starts, if any
+        """
+        message_id, flags, qdcount, ancount, nscount, arcount = struct.unpack('!HHHHHH', message[0:12])
+        if message_id != query_id:
+            raise ZoneTransferError(f'Zone transfer response has unexpected message ID: {message_id}')
+        if flags & 0x000F != 0:
+            raise ZoneTransferError(f'Zone transfer refused. Response code: {flags & 0x000F}')
+
+        offset = 12
+        for _ in range(qdcount):
+            _, offset = decode_name(message, offset)
+            offset += 4
+
+        records = []
+        tsig_offset = None
+        for index in range(ancount + nscount + arcount):
+            record_offset = offset
+            name, offset = decode_name(message, offset)
+            record_type, record_class, ttl, rdlength = struct.unpack('!HHIH', message[offset:offset + 10])
+            offset += 10
+            if index < ancount and record_class == CLASS_IN:
+                records.append(ResourceRecord(
+                    name=name.lower(),
+                    type=record_type,
+                    ttl=ttl,
+                    rdata=rdata_text(message, record_type, offset, rdlength)
+                ))
+            if record_type == TYPE_TSIG and index == ancount + nscount + arcount - 1:
+                tsig_offset = record_offset
+            offset += rdlength
+
+        return records, tsig_offset
+
+
+class _Transfer:
+    """
+    Applies the records of an AXFR or IXFR response, in order
+
+    An AXFR response, or an IXFR response with the whole zone, is the SOA record, every record, then the SOA record
+    again. An incremental IXFR response is the new SOA record, then for each version: the old SOA record, the deleted
+    records, the new SOA record, and the added records. It ends with the new SOA record again.
+    """
+
+    def __init__(self, previous: Optional[_ZoneCopy]):
+        self.previous = previous
+        self.record_sets: Dict[RecordSetKey, Tuple[int, List[str]]] = {}
+        self.soa: Optional[ResourceRecord] = None
+        self.serial = 0
+        self.count = 0
+        self.incremental = False
+        self.deleting = False
+        self.done = False
+
+    def add(self, record: ResourceRecord) -> None:
+        if self.done:
+            raise ZoneTransferError('Zone transfer response has records after the final SOA record')
+        self.count += 1
+
+        if self.count == 1:
+            if record.type != TYPE_SOA:
+                raise ZoneTransferError('Zone transfer response does not start with an SOA record')
+            self.soa = record
+            self.serial = _soa_serial(record)
+            return
+
+        is_soa = record.type == TYPE_SOA
+        if self.count == 2:
+            if is_soa and self.previous is not None and _soa_serial(record) != self.serial:
+                # Incremental. Changes are applied to a copy of the previous zone
+                self.incremental = True
+                self.deleting = True
+                self.record_sets = {key: (ttl, list(rdata)) for key, (ttl, rdata) in self.previous.record_sets.items()}
+                return
+            self._add_record(self.soa)
+
+        if not self.incremental:
+            if is_soa:
+                self.done = True
+            else:
+                self._add_record(record)
+            return
+
+        if is_soa:
+            if self.deleting:
+                self.deleting = False
+            elif _soa_serial(record) == self.serial:
+                self.done = True
+            else:
+                self.deleting = True
+        elif self.deleting:
+            self._delete_record(record)
+        else:
+            self._add_record(record)
+
+    def end_message(self) -> None:
+        # If the zone copy is up to date, the IXFR response is only the current SOA record
+        if self.count == 1 and self.previous is not None and not _serial_newer(self.serial, self.previous.serial):
+            self.done = True
+
+    def result(self) -> _ZoneCopy:
+        assert self.soa is not None
+        if self.count == 1:
+            assert self.previous is not None
+            return self.previous
+        if self.incremental:
+            key = (self.soa.name, _type_name(TYPE_SOA))
+            self.record_sets[key] = (self.soa.ttl, [self.soa.rdata])
+        return _ZoneCopy(serial=self.serial, record_sets=self.record_sets)
+
+    def _add_record(self, record: ResourceRecord) -> None:
+        key = (record.name, _type_name(record.type))
+        _, rdata = self.record_sets.get(key, (record.ttl, []))
+        if record.rdata not in rdata:
+            rdata.append(record.rdata)
+        self.record_sets[key] = (record.ttl, rdata)
+
+    def _delete_record(self, record: ResourceRecord) -> None:
+        key = (record.name, _type_name(record.type))
+        record_set = self.record_sets.get(key, None)
+        if record_set is None or record.rdata not in record_set[1]:
+            return
+        record_set[1].remove(record.rdata)
+        if not record_set[1]:
+            del self.record_sets[key]
+
+
+def create_zone_transfer_client(config: ZoneTransferConfig, incremental: bool) -> ZoneTransferClient:
+    tsig_key = None
+    if config.tsig_key_name is not None and config.tsig_secret is not None:
+        tsig_key = TsigKey(config.tsig_key_name, config.tsig_secret, config.tsig_algorithm)
+    return ZoneTransferClient(
+        address=(config.host, config.port),
+        incremental=incremental,
+        tsig_key=tsig_key,
+        timeout_sec=config.timeout_sec)
+
+
+def encode_name(name: str) -> bytes:
+    """
+    Encode a domain name in wire format, uncompressed
+
+    Parameters:
+        name (str): The domain name. A trailing dot is optional
+
+    Returns:
+        bytes: The wire format name
+    """
+    wire = b''
+    for label in name.rstrip('.').split('.'):
+        if label:
+            encoded = label.encode('ascii')
+            if len(encoded) > 63:
+                raise ValueError(f'Domain name label is too long: {label}')
+            wire += struct.pack('!B', len(encoded)) + encoded
+    return wire + b'\x00'
+
+
+def decode_name(message: bytes, offset: int) -> Tuple[str, int]:
+    """
+    Decode a wire format domain name, following compression pointers
+
+    Parameters:
+        message (bytes): The DNS message
+        offset (int): Where the name starts
+
+    Returns:
+        Tuple[str, int]: The name, without a trailing dot, and where the name ends
+    """
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            jumps += 1
+            if jumps > 64:
+                raise ZoneTransferError('Domain name compression loop')
+            offset = struct.unpack('!H', message[offset:offset + 2])[0] & 0x3FFF
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(_label_text(message[offset:offset + length]))
+        offset += length
+    return '.'.join(labels), offset if end is None else end
+
+
+def rdata_text(message: bytes, record_type: int, offset: int, length: int) -> str:
+    """
+    Format rdata in presentation format. Domain names in rdata end with a dot. Types without a known format use the
+    generic format
+
+    Parameters:
+        message (bytes): The DNS message
+        record_type (int): The record type
+        offset (int): Where the rdata starts
+        length (int): The rdata length
+
+    Returns:
+        str: The rdata
+    """
+    rdata = message[offset:offset + length]
+    type_name = _TYPE_NAMES.get(record_type, None)
+
+    if type_name == 'A':
+        return str(ipaddress.IPv4Address(rdata))
+    if type_name == 'AAAA':
+        return str(ipaddress.IPv6Address(rdata))
+    if type_name in ('NS', 'CNAME', 'PTR', 'DNAME'):
+        return _absolute(decode_name(message, offset)[0])
+    if type_name == 'MX':
+        return f'{struct.unpack("!H", rdata[0:2])[0]} {_absolute(decode_name(message, offset + 2)[0])}'
+    if type_name == 'SOA':
+        mname, name_end = decode_name(message, offset)
+        rname, name_end = decode_name(message, name_end)
+        numbers = struct.unpack('!IIIII', message[name_end:name_end + 20])
+        return ' '.join([_absolute(mname), _absolute(rname)] + [str(number) for number in numbers])
+    if type_name == 'SRV':
+        priority, weight, port = struct.unpack('!HHH', rdata[0:6])
+        return f'{priority} {weight} {port} {_absolute(decode_name(message, offset + 6)[0])}'
+    if type_name in ('TXT', 'SPF'):
+        strings = []
+        index = 0
+        while index < len(rdata):
+            strings.append(_quote(rdata[index + 1:index + 1 + rdata[index]]))
+            index += 1 + rdata[index]
+        return ' '.join(strings)
+    if type_name == 'CAA':
+        tag_length = rdata[1]
+        tag = rdata[2:2 + tag_length].decode('ascii')
+        return f'{rdata[0]} {tag} {_quote(rdata[2 + tag_length:])}'
+
+    return f'\\# {len(rdata)} {rdata.hex().upper()}' if rdata else '\\# 0'
+
+
+def _read(reader, count: int) -> bytes:
+    data = reader.read(count)
+    if len(data) < count:
+        raise ZoneTransferError('Zone transfer connection closed by server')
+    return data
+
+
+def _type_name(record_type: int) -> str:
+    return _TYPE_NAMES.get(record_type, f'TYPE{record_type}')
+
+
+def _soa_serial(record: ResourceRecord) -> int:
+    return int(record.rdata.split()[2])
+
+
+def _serial_newer(serial: int, other: int) -> bool:
+    # Serial number arithmetic. Serials wrap around
+    return serial != other and (serial - other) % 2**32 < 2**31
+
+
+def _encode_time(time_signed: int) -> bytes:
+    return struct.pack('!HI', time_signed >> 32, time_signed & 0xFFFFFFFF)
+
+
+def _decode_time(data: bytes) -> int:
+    high, low = struct.unpack('!HI', data)
+    return (high << 32) | low
+
+
+def _absolute(name: str) -> str:
+    return name + '.'
+
+
+def _label_text(label: bytes) -> str:
+    text = ''
+    for byte in label:
+        char = chr(byte)
+        if char in '.\\"();@$ ':
+            text += '\\' + char
+        elif 0x21 <= byte <= 0x7E:
+            text += char
+        else:
+            text += f'\\{byte:03d}'
+    return text
+
+
+def _quote(data: bytes) -> str:
+    text = ''
+    for byte in data:
+        char = chr(byte)
+        if char in '"\\':
+            text += '\\' + char
+        elif 0x20 <= byte <= 0x7E:
+            text += char
+        else:
+            text += f'\\{byte:03d}'
+    return f'"{text}"'
@@ -0,0 +1,109 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from lds_connector.batch_controller import AimdBatchController, create_batch_controller
+from lds_connector.config import AdaptiveBatchConfig
+
+
+class AimdBatchControllerTest(unittest.TestCase):
+
+    @staticmethod
+    def create_controller():
+        return AimdBatchController('test', AdaptiveBatchConfig(
+            target_latency_sec=1,
+            max_error_rate=0.1,
+            min_bytes=1000,
+            max_bytes=10000,
+            initial_bytes=4000,
+            increase_bytes=1000
+        ))
+
+    def test_batch_events(self):
+        controller = AimdBatchControllerTest.create_controller()
+        self.assertEqual(controller.batch_events(default=8), 8)
+
+        controller.record(request_bytes=4000, event_count=40, latency_sec=0.1, success=True)
+
+        # 5000 byte batch of 100 byte events
+        self.assertEqual(controller.batch_events(default=8), 50)
+
+    def test_additive_increase(self):
+        controller = AimdBatchControllerTest.create_controller()
+
+        for _ in range(10):
+            controller.record(request_bytes=int(controller.batch_bytes), event_count=10, latency_sec=0.1, success=True)
+
+        self.assertEqual(controller.batch_bytes, 10000)
+
+    def test_no_increase_for_small_batches(self):
+        controller = AimdBatchControllerTest.create_controller()
+
+        controller.record(request_bytes=100, event_count=1, latency_sec=0.1, success=True)
+
+        self.assertEqual(controller.batch_bytes, 4000)
+
+    def test_decrease_on_latency(self):
+        controller = AimdBatchControllerTest.create_controller()
+
+        controller.record(request_bytes=4000, event_count=10, latency_sec=2, success=True)
+        self.assertEqual(controller.batch_bytes, 2000)
+
+        controller.record(request_bytes=2000, event_count=10, latency_sec=2, success=True)
+        controller.record(request_bytes=1000, event_count=10, latency_sec=2, success=True)
+        self.assertEqual(controller.batch_bytes, 1000)
+
+    def test_decrease_on_errors(self):
+        controller = AimdBatchControllerTest.create_controller()
+
+        controller.record(request_bytes=4000, event_count=10, latency_sec=0.1, success=False)
+        self.assertEqual(controller.batch_bytes, 2000)
+
+        # Error rate is still above the maximum. The batch holds rather than shrinking again
+        controller.record(request_bytes=2000, event_count=10, latency_sec=0.1, success=True)
+        self.assertEqual(controller.batch_bytes, 2000)
+
+        controller.record(request_bytes=2000, event_count=10, latency_sec=0.1, success=False)
+        self.assertEqual(controller.batch_bytes, 1000)
+
+        metrics = controller.metrics()
+        self.assertEqual(metrics.requests, 3)
+        self.assertEqual(metrics.failures, 2)
+        self.assertEqual(metrics.batch_bytes, 1000)
+        self.assertAlmostEqual(metrics.avg_latency_sec, 0.1)
+
+    def test_single_failure_decreases_once(self):
+        controller = AimdBatchControllerTest.create_controller()
+
+        controller.record(request_bytes=4000, event_count=10, latency_sec=0.1, success=False)
+        for _ in range(3):
+            controller.record(request_bytes=2000, event_count=10, latency_sec=0.1, success=True)
+            self.assertGreater(controller.error_rate, 0.1)
+            self.assertEqual(controller.batch_bytes, 2000)
+
+        # Once the error rate recovers, the batch grows again
+        controller.record(request_bytes=2000, event_count=10, latency_sec=0.1, success=True)
+        self.assertLessEqual(controller.error_rate, 0.1)
+        self.assertEqual(controller.batch_bytes, 3000)
+
+    def test_create_disabled(self):
+        self.assertIsNone(create_batch_controller('test', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
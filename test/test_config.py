@@ -19,7 +19,8 @@ import unittest
 from os import path
 from test import test_data
 
-from lds_connector.config import read_yaml_config, is_config_valid, SysLogTransport, SysLogProtocol, SysLogTlsConfig
+from lds_connector.config import read_yaml_config, is_config_valid, SysLogTransport, SysLogProtocol, SysLogTlsConfig, \
+    HecLoadBalancing, RetryConfig, SpoolConfig, AdaptiveBatchConfig, EdgeDnsSource, ZoneTransferConfig
 
 
 class ConfigTest(unittest.TestCase):
@@ -60,6 +61,23 @@ class ConfigTest(unittest.TestCase):
             self.assertEqual(config, expected_config)
 
 
+    def test_splunk_records_transfer(self):
+        expected_config = test_data.create_splunk_config()
+        assert expected_config.edgedns is not None
+        expected_config.edgedns.source = EdgeDnsSource.IXFR
+        expected_config.edgedns.transfer = ZoneTransferConfig(
+            host='192.0.2.53', tsig_key_name='transfer-key', tsig_secret='c2VjcmV0')
+
+        config_filename = path.join(test_data.DATA_DIR, 'test_config_splunk_records_transfer.yaml')
+        with open(config_filename, 'r', encoding='utf-8') as config_file:
+            config = read_yaml_config(config_file)
+            self.assertEqual(config, expected_config)
+            self.assertTrue(is_config_valid(config))
+
+            config.edgedns.transfer = None
+            self.assertFalse(is_config_valid(config))
+
+
     def test_splunk_records_defaults(self):
         expected_config = test_data.create_splunk_config()
         assert expected_config.splunk is not None
@@ -79,6 +97,72 @@ class ConfigTest(unittest.TestCase):
             self.assertEqual(config, expected_config)
 
 
+    def test_splunk_raw(self):
+        expected_config = test_data.create_splunk_config()
+        assert expected_config.splunk is not None
+        expected_config.splunk.lds_hec.use_raw_endpoint = True
+
+        config_filename = path.join(test_data.DATA_DIR, 'test_config_splunk_raw.yaml')
+        with open(config_filename, 'r', encoding='utf-8') as config_file:
+            config = read_yaml_config(config_file)
+            self.assertEqual(config, expected_config)
+
+
+    def test_splunk_endpoints(self):
+        expected_config = test_data.create_splunk_config()
+        assert expected_config.splunk is not None
+        expected_config.splunk.additional_hosts = ['127.0.0.2', '127.0.0.3:8089']
+        expected_config.splunk.load_balancing = HecLoadBalancing.LEAST_OUTSTANDING
+        expected_config.splunk.endpoint_eject_sec = 60
+
+        config_filename = path.join(test_data.DATA_DIR, 'test_config_splunk_endpoints.yaml')
+        with open(config_filename, 'r', encoding='utf-8') as config_file:
+            config = read_yaml_config(config_file)
+            self.assertEqual(config, expected_config)
+
+
+    def test_splunk_retry(self):
+        expected_config = test_data.create_splunk_config()
+        expected_config.open = None
+        expected_config.edgedns = None
+        assert expected_config.splunk is not None
+        expected_config.splunk.edgedns_hec = None
+        expected_config.splunk.dead_letter_path = 'dead_letter.txt'
+        expected_config.splunk.retry = RetryConfig(initial_sec=2, max_sec=60, failure_threshold=10, reset_sec=60)
+
+        config_filename = path.join(test_data.DATA_DIR, 'test_config_splunk_retry.yaml')
+        with open(config_filename, 'r', encoding='utf-8') as config_file:
+            config = read_yaml_config(config_file)
+            self.assertEqual(config, expected_config)
+
+    def test_splunk_adaptive_batch(self):
+        expected_config = test_data.create_splunk_config()
+        expected_config.open = None
+        expected_config.edgedns = None
+        assert expected_config.splunk is not None
+        expected_config.splunk.edgedns_hec = None
+        expected_config.splunk.adaptive_batch = AdaptiveBatchConfig(target_latency_sec=0.5, max_bytes=524288)
+
+        config_filename = path.join(test_data.DATA_DIR, 'test_config_splunk_adaptive_batch.yaml')
+        with open(config_filename, 'r', encoding='utf-8') as config_file:
+            config = read_yaml_config(config_file)
+            self.assertEqual(config, expected_config)
+
+
+    def test_spool(self):
+        expected_config = test_data.create_splunk_config()
+        expected_config.open = None
+        expected_config.edgedns = None
+        assert expected_config.splunk is not None
+        expected_config.splunk.edgedns_hec = None
+        expected_config.spool = SpoolConfig(directory=path.abspath('spool'), max_bytes=1048576)
+
+        config_filename = path.join(test_data.DATA_DIR, 'test_config_spool.yaml')
+        with open(config_filename, 'r', encoding='utf-8') as config_file:
+            config = read_yaml_config(config_file)
+            self.assertEqual(config, expected_config)
+
+
     def test_syslog_no_records(self):
         expected_config = test_data.create_syslog_config()
         expected_config.open = None
@@ -202,5 +286,19 @@ class ConfigTest(unittest.TestCase):
         self.assertFalse(is_config_valid(parsed_config))
 
 
+    def test_lds_invalid_download_workers(self):
+        parsed_config = test_data.create_splunk_config()
+        parsed_config.lds.download_workers = 0
+
+        self.assertFalse(is_config_valid(parsed_config))
+
+
+    def test_lds_invalid_parse_workers(self):
+        parsed_config = test_data.create_splunk_config()
+        parsed_config.lds.parse_workers = 0
+
+        self.assertFalse(is_config_valid(parsed_config))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -18,13 +18,16 @@
 import itertools
 import os
 import shutil
+import time
 import unittest
 from os import path
 from test import test_data, test_util
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, call, patch
 from typing import List
 
 from lds_connector.connector import Connector, build_connector
+from lds_connector.dns_index import DnsRecordIndex
+from lds_connector.pipeline_stats import STAGE_SEND
 from lds_connector.splunk import Splunk
 from lds_connector.syslog import SysLog
 
@@ -89,7 +92,7 @@ class ConnectorTest(unittest.TestCase):
         mock_log_manager.update_last_log_files.assert_called_once()
         self.assertEqual(mock_log_manager.get_next_log.call_count, 2)
         self.assertEqual(mock_event_handler.add_log_line.call_count, test_data.NS_FILE1_LINES)
-        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES + 1)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES)
         for log_event in test_data.get_dns_log_events():
             mock_event_handler.add_log_line.assert_any_call(log_event)
 
@@ -119,7 +122,7 @@ class ConnectorTest(unittest.TestCase):
         mock_log_manager.update_last_log_files.assert_called_once()
         self.assertEqual(mock_log_manager.get_next_log.call_count, 2)
         self.assertEqual(mock_event_handler.add_log_line.call_count, test_data.NS_FILE1_LINES)
-        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES + 1)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES )
         for log_event in test_data.get_dns_log_events():
             mock_event_handler.add_log_line.assert_any_call(log_event)
 
@@ -170,13 +173,226 @@ class ConnectorTest(unittest.TestCase):
         self.assertEqual(mock_log_manager.update_last_log_files.call_count, 2)
         self.assertEqual(mock_log_manager.get_next_log.call_count, 3)
         self.assertEqual(mock_event_handler.add_log_line.call_count, test_data.NS_FILE1_LINES + test_data.NS_FILE2_LINES)
-        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES + test_data.NS_FILE2_LINES + 2)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES + test_data.NS_FILE2_LINES)
+
+
+    def test_log_delivery_linger_while_downloading(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+        config.lds.batch_linger_sec = 0.1
+
+        log_file1 = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file1)
+        mock_event_handler = MagicMock()
+        # Batches are never full, so lines are only published once they linger
+        mock_event_handler.publish_log_lines = MagicMock(side_effect=lambda force: force)
+        connector = Connector(config, MagicMock(), None, mock_event_handler)
+        published_while_downloading = []
+
+        def get_next_log():
+            if connector.log_manager.get_next_log.call_count == 1:
+                return log_file1
+            # The next log file is slow to download. The queued lines are published meanwhile
+            deadline = time.monotonic() + 5
+            while not log_file1.processed and time.monotonic() < deadline:
+                time.sleep(0.01)
+            published_while_downloading.append(log_file1.processed)
+            return None
+
+        connector.log_manager.get_next_log = MagicMock(side_effect=get_next_log)
+
+        connector.process_log_files()
+
+        self.assertEqual(published_while_downloading, [True])
+        mock_event_handler.publish_log_lines.assert_called_with(force=True)
+
+
+    @patch.object(Connector, '_CHUNK_LINES', 2)
+    def test_log_delivery_pipeline(self):
+        '''
+        Chunks are parsed and serialized concurrently, but sent in order
+        '''
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+        config.lds.parse_workers = 3
+        config.lds.serialize_workers = 2
+        config.lds.queued_chunks = 2
+
+        log_file1 = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file1)
+        log_file2 = test_data.get_ns_file2()
+        test_util.download_uncompress_file(log_file2)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file1, log_file2, None])
+        mock_event_handler = MagicMock()
+        mock_event_handler.publish_log_lines = MagicMock(side_effect=lambda force: force)
+
+        connector = Connector(config, mock_log_manager, None, mock_event_handler)
+        connector.process_log_files()
+        connector.close()
+
+        self.assertTrue(log_file1.processed)
+        self.assertTrue(log_file2.processed)
+        self.assertEqual(log_file2.last_processed_line, test_data.NS_FILE2_LINES)
+        # Progress is saved in log file order
+        self.assertEqual([c[0][0] for c in mock_log_manager.update_last_log_files.call_args_list],
+            [log_file1, log_file2])
+        actual_log_events = [c[0][0] for c in mock_event_handler.add_log_line.call_args_list]
+        self.assertEqual(actual_log_events, test_data.get_dns_log_events() + test_data.get_dns_log_events())
+        self.assertEqual(mock_event_handler.serialize_log_line.call_count, len(actual_log_events))
+        mock_log_manager.close.assert_called_once()
+
+
+    def test_close(self):
+        config = test_data.create_splunk_config()
+        mock_log_manager = MagicMock()
+        mock_event_handler = MagicMock()
+        mock_dns_event_handler = MagicMock()
+
+        connector = Connector(config, mock_log_manager, None, mock_event_handler,
+            dns_event_handler=mock_dns_event_handler)
+        connector.close()
+
+        # Spooled events are sealed and the handlers' connections closed
+        mock_log_manager.close.assert_called_once()
+        mock_event_handler.close.assert_called_once()
+        mock_dns_event_handler.close.assert_called_once()
+
+
+    def test_log_delivery_stats_checkpoint(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+
+        log_file = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file, None])
+        # Saving progress is slow
+        mock_log_manager.update_last_log_files = MagicMock(side_effect=lambda _: time.sleep(0.2))
+
+        connector = Connector(config, mock_log_manager, None, MagicMock())
+        connector.stats.reset = MagicMock()
+        connector.process_log_files()
+
+        # Saving progress isn't counted as sending
+        mock_log_manager.update_last_log_files.assert_called()
+        self.assertLess(connector.stats.stages[STAGE_SEND].busy_sec, 0.2)
+
+
+    def test_log_delivery_stats(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+
+        log_file = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file, None])
+
+        connector = Connector(config, mock_log_manager, None, MagicMock())
+
+        with self.assertLogs(level='INFO') as logs:
+            connector.process_log_files()
+
+        # Each stage's line count and busy time is logged once the poll finishes
+        summary = [line for line in logs.output if 'Log pipeline stages' in line][0]
+        self.assertIn(f'parse {test_data.NS_FILE1_LINES}x', summary)
+        self.assertIn(f'send {test_data.NS_FILE1_LINES}x', summary)
+        self.assertEqual(connector.stats.summary(), '')
+
+
+    def test_log_delivery_deadline(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+
+        log_file1 = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file1)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file1, test_data.get_ns_file2(), None])
+        mock_event_handler = MagicMock()
+        # Only forced publishes send the batch
+        mock_event_handler.publish_log_lines = MagicMock(side_effect=lambda force: force)
+
+        connector = Connector(config, mock_log_manager, None, mock_event_handler)
+
+        # The deadline has passed. The log file in progress is finished, and no more are started
+        connector.process_log_files(deadline=time.monotonic())
+
+        self.assertTrue(log_file1.processed)
+        self.assertEqual(mock_log_manager.get_next_log.call_count, 1)
+        # The partial batch is still published, and the log file's progress saved
+        mock_event_handler.publish_log_lines.assert_called_with(force=True)
+        mock_log_manager.update_last_log_files.assert_called_once()
 
         expected_log_events = test_data.get_dns_log_events() + test_data.get_dns_log_events()
         for log_event in expected_log_events:
             mock_event_handler.add_log_line.assert_any_call(log_event)
 
 
+    def test_log_delivery_batch_across_files(self):
+        '''
+        The handler only publishes when forced. Lines from both files are published in one batch at the end
+        '''
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+
+        log_file1 = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file1)
+        log_file2 = test_data.get_ns_file2()
+        test_util.download_uncompress_file(log_file2)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file1, log_file2, None])
+        mock_event_handler = MagicMock()
+        mock_event_handler.publish_log_lines = MagicMock(side_effect=lambda force=False: force)
+
+        connector = Connector(config, mock_log_manager, None, mock_event_handler)
+
+        connector.process_log_files()
+
+        self.assertTrue(log_file1.processed)
+        self.assertEqual(log_file1.last_processed_line, test_data.NS_FILE1_LINES)
+        self.assertTrue(log_file2.processed)
+        self.assertEqual(log_file2.last_processed_line, test_data.NS_FILE2_LINES)
+
+        self.assertEqual(mock_log_manager.update_last_log_files.call_args_list, [call(log_file1), call(log_file2)])
+        mock_event_handler.clear.assert_not_called()
+        self.assertEqual(mock_event_handler.add_log_line.call_count, test_data.NS_FILE1_LINES + test_data.NS_FILE2_LINES)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES + test_data.NS_FILE2_LINES + 1)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_args_list[-1], call(force=True))
+        self.assertEqual(len([c for c in mock_event_handler.publish_log_lines.call_args_list if c[1]['force']]), 1)
+
+
+    def test_log_delivery_batch_linger(self):
+        '''
+        The linger time has elapsed for every line, so each publish is forced
+        '''
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+        config.lds.batch_linger_sec = 0
+
+        log_file = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file, None])
+        mock_event_handler = MagicMock()
+        mock_event_handler.publish_log_lines = MagicMock(side_effect=lambda force=False: force)
+
+        connector = Connector(config, mock_log_manager, None, mock_event_handler)
+
+        connector.process_log_files()
+
+        self.assertTrue(log_file.processed)
+        self.assertEqual(log_file.last_processed_line, test_data.NS_FILE1_LINES)
+        mock_log_manager.update_last_log_files.assert_called_once_with(log_file)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_args_list, [call(force=True)] * test_data.NS_FILE1_LINES)
+
+
     # Record delivery tests
 
     def test_record_delivery(self):
@@ -184,7 +400,8 @@ class ConnectorTest(unittest.TestCase):
         mock_log_manager = MagicMock()
         mock_log_manager.get_next_log = MagicMock(return_value=None)
         mock_edgedns_manager = MagicMock()
-        mock_edgedns_manager.get_records = MagicMock(return_value=[test_data.create_dns_record1(), test_data.create_dns_record2()])
+        mock_edgedns_manager.iter_record_pages = MagicMock(
+            return_value=(page for page in [[test_data.create_dns_record1(), test_data.create_dns_record2()]]))
         mock_event_handler = MagicMock()
         
         connector = Connector(config, mock_log_manager, mock_edgedns_manager, mock_event_handler)
@@ -192,13 +409,145 @@ class ConnectorTest(unittest.TestCase):
         connector.process_dns_records()
 
         mock_log_manager.get_next_log.assert_not_called()
-        mock_edgedns_manager.get_records.assert_called_once()
+        mock_edgedns_manager.iter_record_pages.assert_called_once()
         self.assertEqual(mock_event_handler.add_dns_record.call_count, 2)
         mock_event_handler.add_dns_record.assert_any_call(test_data.create_dns_record1())
         mock_event_handler.add_dns_record.assert_any_call(test_data.create_dns_record2())
         self.assertEqual(mock_event_handler.publish_dns_records.call_count, 3)
 
 
+    def test_record_delivery_index(self):
+        config = test_data.create_splunk_config()
+        mock_edgedns_manager = MagicMock()
+        mock_edgedns_manager.iter_record_pages = MagicMock(return_value=(page for page in [[test_data.create_dns_record3()]]))
+        mock_edgedns_manager.complete_zones = {'edgedns.zone'}
+        dns_index = DnsRecordIndex()
+
+        connector = Connector(config, MagicMock(), mock_edgedns_manager, MagicMock(), dns_index=dns_index)
+
+        connector.process_dns_records()
+
+        self.assertEqual(dns_index.lookup('cam.edgedns.zone', 'A'), (test_data.create_dns_record3(), True))
+
+        # Log lines are enriched with the indexed records
+        log_event = connector._create_log_event(
+            '416458 - 1672715199 03/01/2023 03:06:39,52.37.159.152,52149,cam.edgedns.zone,IN,A,E,4096,D,,\n')
+        assert log_event is not None
+        self.assertTrue(log_event.log_line.endswith(',A,300,true'))
+
+
+    def test_record_delivery_streamed(self):
+        config = test_data.create_splunk_config()
+        mock_event_handler = MagicMock()
+
+        def iter_record_pages(skip_unchanged):
+            yield [test_data.create_dns_record1()]
+            # The first page is published before the next is fetched
+            self.assertEqual(mock_event_handler.add_dns_record.call_count, 1)
+            self.assertEqual(mock_event_handler.publish_dns_records.call_count, 1)
+            yield [test_data.create_dns_record2()]
+
+        mock_edgedns_manager = MagicMock()
+        mock_edgedns_manager.iter_record_pages = MagicMock(side_effect=iter_record_pages)
+
+        connector = Connector(config, MagicMock(), mock_edgedns_manager, mock_event_handler)
+
+        connector.process_dns_records()
+
+        self.assertEqual(mock_event_handler.add_dns_record.call_count, 2)
+        mock_event_handler.add_dns_record.assert_called_with(test_data.create_dns_record2())
+
+
+    def test_record_delivery_changes_only(self):
+        config = test_data.create_splunk_config()
+        mock_edgedns_manager = MagicMock()
+        mock_edgedns_manager.iter_record_pages = MagicMock(return_value=(page for page in [[test_data.create_dns_record1()]]))
+        mock_edgedns_manager.complete_zones = {'edgedns.zone'}
+        mock_event_handler = MagicMock()
+        mock_event_handler.is_available = MagicMock(return_value=True)
+        mock_dns_snapshot = MagicMock()
+        mock_dns_snapshot.diff_records = MagicMock(return_value=[])
+        mock_dns_snapshot.finish = MagicMock(return_value=[])
+
+        connector = Connector(config, MagicMock(), mock_edgedns_manager, mock_event_handler, mock_dns_snapshot)
+
+        connector.process_dns_records()
+
+        mock_dns_snapshot.start.assert_called_once()
+        mock_dns_snapshot.diff_records.assert_called_once_with([test_data.create_dns_record1()])
+        mock_dns_snapshot.finish.assert_called_once_with(complete_zones={'edgedns.zone'})
+        mock_event_handler.add_dns_record.assert_not_called()
+        mock_dns_snapshot.commit.assert_called_once()
+        mock_edgedns_manager.commit_zone_serials.assert_called_once()
+
+
+    def test_record_delivery_full_resync(self):
+        config = test_data.create_splunk_config()
+        mock_edgedns_manager = MagicMock()
+        mock_edgedns_manager.iter_record_pages = MagicMock(return_value=(page for page in []))
+        mock_dns_snapshot = MagicMock()
+        mock_dns_snapshot.is_full_sync_due = MagicMock(return_value=True)
+        mock_dns_snapshot.finish = MagicMock(return_value=[])
+
+        connector = Connector(config, MagicMock(), mock_edgedns_manager, MagicMock(), mock_dns_snapshot)
+
+        connector.process_dns_records()
+
+        # Unchanged zones aren't skipped when every record must be sent
+        mock_edgedns_manager.iter_record_pages.assert_called_once_with(skip_unchanged=False)
+
+
+    def test_record_delivery_changes_unavailable(self):
+        config = test_data.create_splunk_config()
+        mock_edgedns_manager = MagicMock()
+        mock_edgedns_manager.iter_record_pages = MagicMock(return_value=(page for page in [[test_data.create_dns_record1()]]))
+        mock_event_handler = MagicMock()
+        mock_event_handler.is_available = MagicMock(return_value=False)
+        mock_dns_snapshot = MagicMock()
+        mock_dns_snapshot.diff_records = MagicMock(return_value=[test_data.create_dns_record1()])
+        mock_dns_snapshot.finish = MagicMock(return_value=[])
+
+        connector = Connector(config, MagicMock(), mock_edgedns_manager, mock_event_handler, mock_dns_snapshot)
+
+        connector.process_dns_records()
+
+        mock_event_handler.add_dns_record.assert_called_once_with(test_data.create_dns_record1())
+        mock_dns_snapshot.commit.assert_not_called()
+        mock_edgedns_manager.commit_zone_serials.assert_not_called()
+        mock_event_handler.clear_dns_records.assert_called_once()
+
+
+    def test_record_delivery_unavailable_stops_fetching(self):
+        config = test_data.create_splunk_config()
+        pages_fetched = []
+
+        pages_closed = []
+
+        def iter_record_pages(skip_unchanged):
+            try:
+                for record in [test_data.create_dns_record1(), test_data.create_dns_record2()]:
+                    pages_fetched.append(record)
+                    yield [record]
+            finally:
+                pages_closed.append(True)
+
+        mock_edgedns_manager = MagicMock()
+        mock_edgedns_manager.iter_record_pages = MagicMock(side_effect=iter_record_pages)
+        mock_event_handler = MagicMock()
+        mock_event_handler.is_available = MagicMock(return_value=False)
+
+        connector = Connector(config, MagicMock(), mock_edgedns_manager, mock_event_handler)
+
+        connector.process_dns_records()
+
+        # No more pages are fetched once the destination is down, and the queued records are dropped
+        self.assertEqual(len(pages_fetched), 1)
+        self.assertEqual(pages_closed, [True])
+        mock_event_handler.publish_dns_records.assert_called_once_with()
+        mock_event_handler.clear_dns_records.assert_called_once()
+        mock_edgedns_manager.commit_zone_serials.assert_not_called()
+
+
     # Build connector tests
     
     def test_build_connector_record_delivery_disabled(self):
@@ -230,6 +579,14 @@ class ConnectorTest(unittest.TestCase):
 
         assert isinstance(connector.event_handler, SysLog)
 
+    def test_build_connector_dns_event_handler(self):
+        config = test_data.create_splunk_config()
+        connector = build_connector(config)
+
+        # DNS records are sent through their own handler, so they don't hold up log lines
+        assert isinstance(connector.dns_event_handler, Splunk)
+        self.assertIsNot(connector.dns_event_handler, connector.event_handler)
+
     # Other
 
     def test_event_handler_exception(self):
@@ -252,8 +609,9 @@ class ConnectorTest(unittest.TestCase):
 
         connector.process_log_files()
 
+        # The third line was queued before the exception. It's published with the next file's lines
         self.assertFalse(log_file1.processed)
-        self.assertEqual(log_file1.last_processed_line, 2)
+        self.assertEqual(log_file1.last_processed_line, 3)
         self.assertFalse(os.path.isfile(log_file1.local_path_txt))
 
         self.assertTrue(log_file2.processed)
@@ -263,13 +621,42 @@ class ConnectorTest(unittest.TestCase):
         self.assertEqual(mock_log_manager.update_last_log_files.call_count, 2)
         self.assertEqual(mock_log_manager.get_next_log.call_count, 3)
         self.assertEqual(mock_event_handler.add_log_line.call_count, 3 + test_data.NS_FILE2_LINES)
-        self.assertEqual(mock_event_handler.publish_log_lines.call_count, 3 + test_data.NS_FILE2_LINES + 1)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, 3 + test_data.NS_FILE2_LINES)
 
         expected_log_events = test_data.get_dns_log_events()[0:2] + test_data.get_dns_log_events()
         for log_event in expected_log_events:
             mock_event_handler.add_log_line.assert_any_call(log_event)
 
 
+    def test_log_delivery_destination_unavailable(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.send_records = False
+
+        log_file1 = test_data.get_ns_file1()
+        test_util.download_uncompress_file(log_file1)
+        mock_log_manager = MagicMock()
+        mock_log_manager.get_next_log = MagicMock(side_effect=[log_file1, None])
+        mock_event_handler = MagicMock()
+        mock_event_handler.publish_log_lines = MagicMock(side_effect=[True, True, False])
+        mock_event_handler.is_available = MagicMock(return_value=False)
+
+        connector = Connector(config, mock_log_manager, None, mock_event_handler)
+
+        connector.process_log_files()
+
+        self.assertFalse(log_file1.processed)
+        self.assertEqual(log_file1.last_processed_line, 2)
+        self.assertFalse(os.path.isfile(log_file1.local_path_txt))
+
+        mock_log_manager.update_last_log_files.assert_not_called()
+        mock_log_manager.requeue_log_files.assert_called_once_with([log_file1])
+        # Reading runs ahead of sending, so the next log file may already have been asked for
+        self.assertLessEqual(mock_log_manager.get_next_log.call_count, 2)
+        self.assertEqual(mock_event_handler.add_log_line.call_count, 3)
+        mock_event_handler.clear.assert_called_once()
+
+
     def test_log_delivery_invalid_line(self):
         '''
         Line 7 of the log file is nonsense. Skip it
@@ -295,7 +682,7 @@ class ConnectorTest(unittest.TestCase):
         mock_log_manager.update_last_log_files.assert_called_once()
         self.assertEqual(mock_log_manager.get_next_log.call_count, 2)
         self.assertEqual(mock_event_handler.add_log_line.call_count, test_data.NS_FILE4_LINES - 1)
-        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE4_LINES)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE4_LINES - 1)
         expected_log_events = test_data.get_dns_log_events()
         expected_log_events.pop(8)
         for log_event in test_data.get_dns_log_events():
@@ -331,7 +718,7 @@ class ConnectorTest(unittest.TestCase):
         mock_log_manager.update_last_log_files.assert_called_once()
         self.assertEqual(mock_log_manager.get_next_log.call_count, 2)
         self.assertEqual(mock_event_handler.add_log_line.call_count, test_data.NS_FILE1_LINES - last_processed_line)
-        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES - last_processed_line + 1)
+        self.assertEqual(mock_event_handler.publish_log_lines.call_count, test_data.NS_FILE1_LINES - last_processed_line)
         expected_log_events = test_data.get_dns_log_events()[last_processed_line:]
         for log_event in expected_log_events:
             mock_event_handler.add_log_line.assert_any_call(log_event)
@@ -0,0 +1,141 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from datetime import datetime, timezone
+from test import test_data
+
+from lds_connector.dns_index import DnsRecordIndex, create_dns_index
+from lds_connector.dns_record import DnsRecord
+from lds_connector.log_file import LogEvent
+
+
+class DnsRecordIndexTest(unittest.TestCase):
+
+    @staticmethod
+    def create_record(name: str, record_type: str, ttl_sec: int = 300, zone: str = 'edgedns.zone') -> DnsRecord:
+        return DnsRecord(time_fetched_sec=0, zone=zone, name=name, type=record_type, ttl_sec=ttl_sec, rdata=[])
+
+    @staticmethod
+    def create_index(records) -> DnsRecordIndex:
+        index = DnsRecordIndex()
+        index.start()
+        index.add_records(records)
+        index.finish(complete_zones={record.zone for record in records})
+        return index
+
+    @staticmethod
+    def create_log_event(qname: str, qtype: str) -> LogEvent:
+        return LogEvent(
+            log_line=f'416458 - 1672715199 03/01/2023 03:06:39,52.37.159.152,52149,{qname},IN,{qtype},E,4096,D,,',
+            timestamp=datetime.fromtimestamp(1672715199, timezone.utc))
+
+    def test_lookup(self):
+        index = DnsRecordIndexTest.create_index([
+            test_data.create_dns_record1(),
+            test_data.create_dns_record2(),
+            test_data.create_dns_record3(),
+            DnsRecordIndexTest.create_record('www.edgedns.zone', 'CNAME', 60)
+        ])
+
+        self.assertEqual(index.lookup('cam.edgedns.zone', 'A'), (test_data.create_dns_record3(), True))
+        self.assertEqual(index.lookup('CAM.edgedns.zone.', 'a'), (test_data.create_dns_record3(), True))
+        # CNAMEs answer every type
+        self.assertEqual(index.lookup('www.edgedns.zone', 'AAAA')[0].type, 'CNAME')
+        # The name exists, but not the type
+        self.assertEqual(index.lookup('cam.edgedns.zone', 'AAAA'), (None, True))
+        self.assertEqual(index.lookup('missing.edgedns.zone', 'A'), (None, False))
+        # Names outside the indexed zones are unknown
+        self.assertIsNone(index.lookup('other.zone', 'A'))
+
+    def test_lookup_wildcard(self):
+        index = DnsRecordIndexTest.create_index([
+            test_data.create_dns_record2(),
+            DnsRecordIndexTest.create_record('*.edgedns.zone', 'A', 60),
+            DnsRecordIndexTest.create_record('cam.edgedns.zone', 'TXT'),
+        ])
+
+        self.assertEqual(index.lookup('a.b.edgedns.zone', 'A')[0].name, '*.edgedns.zone')
+        # An existing name isn't answered by the wildcard, nor are names below it
+        self.assertEqual(index.lookup('cam.edgedns.zone', 'A'), (None, True))
+        self.assertEqual(index.lookup('a.cam.edgedns.zone', 'A'), (None, False))
+
+    def test_lookup_empty_non_terminal(self):
+        index = DnsRecordIndexTest.create_index([
+            DnsRecordIndexTest.create_record('a.b.c.edgedns.zone', 'A'),
+            DnsRecordIndexTest.create_record('edgedns.zone', 'SOA')
+        ])
+
+        # b.c exists because a.b.c sits beneath it, even without records of its own
+        self.assertEqual(index.lookup('b.c.edgedns.zone', 'A'), (None, True))
+        self.assertEqual(index.lookup('c.edgedns.zone', 'TXT'), (None, True))
+        self.assertEqual(index.lookup('x.c.edgedns.zone', 'A'), (None, False))
+
+    def test_lookup_wildcard_empty_non_terminal(self):
+        index = DnsRecordIndexTest.create_index([
+            DnsRecordIndexTest.create_record('*.edgedns.zone', 'A', 60),
+            DnsRecordIndexTest.create_record('a.b.edgedns.zone', 'A'),
+        ])
+
+        # b is an empty non-terminal. It's the closest encloser, so the apex wildcard doesn't apply beneath it
+        self.assertEqual(index.lookup('b.edgedns.zone', 'A'), (None, True))
+        self.assertEqual(index.lookup('x.b.edgedns.zone', 'A'), (None, False))
+        self.assertEqual(index.lookup('x.edgedns.zone', 'A')[0].name, '*.edgedns.zone')
+
+    def test_refresh(self):
+        index = DnsRecordIndexTest.create_index([
+            test_data.create_dns_record3(),
+            DnsRecordIndexTest.create_record('other.zone', 'A', zone='other.zone')
+        ])
+
+        index.start()
+        index.add_records([DnsRecordIndexTest.create_record('new.edgedns.zone', 'A')])
+        # The index is unchanged until the poll finishes
+        self.assertEqual(index.lookup('new.edgedns.zone', 'A'), (None, False))
+
+        # other.zone failed to fetch, so it keeps its records
+        index.finish(complete_zones={'edgedns.zone'})
+        self.assertEqual(index.lookup('new.edgedns.zone', 'A')[1], True)
+        self.assertEqual(index.lookup('cam.edgedns.zone', 'A'), (None, False))
+        self.assertEqual(index.lookup('other.zone', 'A')[1], True)
+
+    def test_enrich(self):
+        index = DnsRecordIndexTest.create_index([test_data.create_dns_record2(), test_data.create_dns_record3()])
+
+        log_event = DnsRecordIndexTest.create_log_event('cam.edgedns.zone', 'A')
+        index.enrich(log_event)
+        self.assertTrue(log_event.log_line.endswith('D,,,A,300,true'))
+
+        log_event = DnsRecordIndexTest.create_log_event('missing.edgedns.zone', 'A')
+        index.enrich(log_event)
+        self.assertTrue(log_event.log_line.endswith('D,,,,,false'))
+
+        log_event = DnsRecordIndexTest.create_log_event('other.zone', 'A')
+        index.enrich(log_event)
+        self.assertTrue(log_event.log_line.endswith('D,,,,,'))
+
+    def test_create_disabled(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        self.assertIsNone(create_dns_index(config))
+
+        config.edgedns.enrich_logs = True
+        self.assertIsNotNone(create_dns_index(config))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import unittest
+from os import path
+from test import test_data
+from unittest.mock import MagicMock, patch
+
+from lds_connector.dns_record import DnsRecordChange
+from lds_connector.dns_snapshot import DnsRecordSnapshot, create_dns_snapshot
+
+
+class DnsRecordSnapshotTest(unittest.TestCase):
+    SNAPSHOT_PATH = path.join(test_data.TEMP_DIR, 'dns_snapshot.pickle')
+
+    def setUp(self) -> None:
+        super().setUp()
+        if path.isdir(test_data.TEMP_DIR):
+            shutil.rmtree(test_data.TEMP_DIR)
+        os.mkdir(test_data.TEMP_DIR)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        if path.isdir(test_data.TEMP_DIR):
+            shutil.rmtree(test_data.TEMP_DIR)
+
+    @staticmethod
+    def create_records():
+        return [test_data.create_dns_record1(), test_data.create_dns_record2(), test_data.create_dns_record3()]
+
+    def create_synced_snapshot(self) -> DnsRecordSnapshot:
+        snapshot = DnsRecordSnapshot(DnsRecordSnapshotTest.SNAPSHOT_PATH, full_resync_sec=0)
+        snapshot.diff(DnsRecordSnapshotTest.create_records())
+        snapshot.commit()
+        return snapshot
+
+    def test_first_diff_is_full(self):
+        snapshot = DnsRecordSnapshot(DnsRecordSnapshotTest.SNAPSHOT_PATH, full_resync_sec=0)
+
+        records = DnsRecordSnapshotTest.create_records()
+        self.assertEqual(snapshot.diff(records), records)
+
+    def test_diff_unchanged(self):
+        snapshot = self.create_synced_snapshot()
+
+        # Record set order doesn't matter
+        records = DnsRecordSnapshotTest.create_records()
+        records[0].rdata = list(reversed(records[0].rdata))
+        self.assertEqual(snapshot.diff(records), [])
+
+    def test_diff_changes(self):
+        snapshot = self.create_synced_snapshot()
+
+        records = DnsRecordSnapshotTest.create_records()
+        removed = records.pop(1)
+        records[0].ttl_sec = 60
+        added = test_data.create_dns_record1()
+        added.name = 'new.edgedns.zone'
+        records.append(added)
+
+        changes = snapshot.diff(records)
+
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(changes[0], DnsRecordSnapshot._change(records[0], DnsRecordChange.CHANGED))
+        self.assertEqual(changes[1], DnsRecordSnapshot._change(added, DnsRecordChange.ADDED))
+        assert isinstance(changes[2], DnsRecordChange)
+        self.assertEqual((changes[2].name, changes[2].type, changes[2].change),
+            (removed.name, removed.type, DnsRecordChange.REMOVED))
+
+    def test_diff_pages(self):
+        snapshot = self.create_synced_snapshot()
+
+        records = DnsRecordSnapshotTest.create_records()
+        records[2].ttl_sec = 60
+
+        snapshot.start()
+        self.assertEqual(snapshot.diff_records(records[0:1]), [])
+        self.assertEqual(snapshot.diff_records(records[2:3]),
+            [DnsRecordSnapshot._change(records[2], DnsRecordChange.CHANGED)])
+
+        # Removals are only known once every page is compared
+        removed = snapshot.finish()
+        self.assertEqual(len(removed), 1)
+        assert isinstance(removed[0], DnsRecordChange)
+        self.assertEqual((removed[0].name, removed[0].type, removed[0].change),
+            (records[1].name, records[1].type, DnsRecordChange.REMOVED))
+
+    def test_diff_incomplete_fetch(self):
+        snapshot = self.create_synced_snapshot()
+
+        # Records missing from a partial fetch aren't removed
+        records = DnsRecordSnapshotTest.create_records()[0:1]
+        self.assertEqual(snapshot.diff(records, complete_zones=set()), [])
+        snapshot.commit()
+        self.assertEqual(snapshot.diff(DnsRecordSnapshotTest.create_records()), [])
+
+    def test_diff_incomplete_zone(self):
+        snapshot = self.create_synced_snapshot()
+        other_zone_record = test_data.create_dns_record1()
+        other_zone_record.zone = 'other.zone'
+        snapshot.diff(DnsRecordSnapshotTest.create_records() + [other_zone_record])
+        snapshot.commit()
+
+        # The other zone failed to fetch. Only the complete zone's missing records are removed
+        records = DnsRecordSnapshotTest.create_records()[0:2]
+        changes = snapshot.diff(records, complete_zones={'edgedns.zone'})
+        self.assertEqual(len(changes), 1)
+        assert isinstance(changes[0], DnsRecordChange)
+        self.assertEqual((changes[0].zone, changes[0].change), ('edgedns.zone', DnsRecordChange.REMOVED))
+
+        snapshot.commit()
+        self.assertEqual(snapshot.diff(records + [other_zone_record]), [])
+
+    def test_diff_not_committed(self):
+        snapshot = self.create_synced_snapshot()
+
+        records = DnsRecordSnapshotTest.create_records()
+        records[0].ttl_sec = 60
+        self.assertEqual(len(snapshot.diff(records)), 1)
+
+        # Changes are delivered again until committed
+        self.assertEqual(len(snapshot.diff(records)), 1)
+
+    def test_persisted(self):
+        self.create_synced_snapshot()
+
+        snapshot = DnsRecordSnapshot(DnsRecordSnapshotTest.SNAPSHOT_PATH, full_resync_sec=0)
+        self.assertEqual(snapshot.diff(DnsRecordSnapshotTest.create_records()), [])
+
+    def test_persisted_missing_directory(self):
+        snapshot_path = path.join(test_data.TEMP_DIR, 'missing', 'dns_snapshot.pickle')
+        snapshot = DnsRecordSnapshot(snapshot_path, full_resync_sec=0)
+        snapshot.diff(DnsRecordSnapshotTest.create_records())
+        snapshot.commit()
+
+        snapshot = DnsRecordSnapshot(snapshot_path, full_resync_sec=0)
+        self.assertEqual(snapshot.diff(DnsRecordSnapshotTest.create_records()), [])
+
+    def test_commit_failed(self):
+        snapshot = self.create_synced_snapshot()
+        records = DnsRecordSnapshotTest.create_records()
+        records[0].ttl_sec = 60
+        snapshot.diff(records)
+
+        with patch('lds_connector.dns_snapshot.pickle.dump', side_effect=OSError('Disk full')):
+            self.assertRaises(OSError, snapshot.commit)
+
+        # The previous snapshot is kept on disk and in memory, so the change is delivered again
+        self.assertEqual(len(snapshot.diff(records)), 1)
+        snapshot = DnsRecordSnapshot(DnsRecordSnapshotTest.SNAPSHOT_PATH, full_resync_sec=0)
+        self.assertEqual(len(snapshot.diff(records)), 1)
+
+    @patch('lds_connector.dns_snapshot.time.time')
+    def test_full_resync(self, mock_time: MagicMock):
+        mock_time.return_value = 1000.0
+        snapshot = DnsRecordSnapshot(DnsRecordSnapshotTest.SNAPSHOT_PATH, full_resync_sec=3600)
+        snapshot.diff(DnsRecordSnapshotTest.create_records())
+        snapshot.commit()
+
+        mock_time.return_value = 2000.0
+        self.assertEqual(snapshot.diff(DnsRecordSnapshotTest.create_records()), [])
+
+        mock_time.return_value = 4600.0
+        records = DnsRecordSnapshotTest.create_records()
+        self.assertEqual(snapshot.diff(records), records)
+
+    def test_create_disabled(self):
+        config = test_data.create_splunk_config()
+        self.assertIsNone(create_dns_snapshot(config))
+
+
+if __name__ == '__main__':
+    unittest.main()
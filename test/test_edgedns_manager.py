@@ -15,21 +15,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 import unittest
+from datetime import datetime, timezone
 from test import test_data, test_util
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import json
 
 import requests
 
+from lds_connector.config import EdgeDnsSource, ZoneTransferConfig
 from lds_connector.edgedns_manager import EdgeDnsManager
 from lds_connector.json import CustomJsonEncoder
 
 
 class MockResponse(requests.Response):
-    def __init__(self, status_code: int, json_data):
+    def __init__(self, status_code: int, json_data, headers=None):
         self.status_code = status_code
         self.json_data = json_data
+        self.headers = headers or {}
 
     def json(self):
         return self.json_data
@@ -78,6 +82,300 @@ class EdgeDnsManagerTest(unittest.TestCase):
             record.time_fetched_sec=0
 
         self.assertEqual(actual_records, expected_records)
+        self.assertEqual(edgedns_manager.complete_zones, {'edgedns.zone'})
+
+    def test_get_records_concurrent_pages(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.page_size = 1
+        config.edgedns.fetch_workers = 2
+        edgedns_manager = EdgeDnsManager(config)
+
+        records = test_util.read_json('test_recordset1.json')['recordsets']
+        def get_page(url, params, timeout):
+            page = params.get('page', 1)
+            return MockResponse(200, {
+                'metadata': {'page': page, 'lastPage': len(records), 'pageSize': params['pageSize']},
+                'recordsets': [records[page - 1]]
+            })
+        edgedns_manager.open_session.get = MagicMock(side_effect=get_page)
+
+        expected_records = [
+            test_data.create_dns_record1(),
+            test_data.create_dns_record2(),
+            test_data.create_dns_record3()
+        ]
+
+        actual_records = edgedns_manager.get_records()
+        for record in actual_records:
+            record.time_fetched_sec=0
+
+        # Pages are fetched concurrently but returned in order
+        self.assertEqual(actual_records, expected_records)
+        self.assertEqual(edgedns_manager.complete_zones, {'edgedns.zone'})
+        self.assertEqual(
+            sorted(call_args[1]['params'].get('page', 1) for call_args in edgedns_manager.open_session.get.call_args_list),
+            [1, 2, 3])
+
+    def test_iter_record_pages(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.page_size = 1
+        config.edgedns.zone_workers = 1
+        config.edgedns.fetch_workers = 1
+        edgedns_manager = EdgeDnsManager(config)
+
+        records = test_util.read_json('test_recordset1.json')['recordsets']
+        def get_page(url, params, timeout):
+            page = params.get('page', 1)
+            return MockResponse(200, {
+                'metadata': {'page': page, 'lastPage': 100, 'pageSize': params['pageSize']},
+                'recordsets': [records[0]]
+            })
+        edgedns_manager.open_session.get = MagicMock(side_effect=get_page)
+
+        pages = edgedns_manager.iter_record_pages()
+        self.assertEqual(len(next(pages)), 1)
+
+        # Fetching pauses while the page queue is full
+        time.sleep(0.2)
+        self.assertLessEqual(edgedns_manager.open_session.get.call_count, edgedns_manager.page_queue_size + 3)
+
+        # Fetching stops if the pages are no longer wanted
+        pages.close()
+        call_count = edgedns_manager.open_session.get.call_count
+        time.sleep(0.2)
+        self.assertEqual(edgedns_manager.open_session.get.call_count, call_count)
+        self.assertEqual(edgedns_manager.complete_zones, set())
+
+    def test_iter_record_pages_close(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.zone_names = ['edgedns2.zone', 'edgedns3.zone']
+        config.edgedns.zone_workers = 3
+        edgedns_manager = EdgeDnsManager(config)
+        edgedns_manager.page_queue_size = 1
+
+        records = test_util.read_json('test_recordset1.json')['recordsets']
+        def get_page(url, params, timeout):
+            return MockResponse(200, {
+                'metadata': {'page': 1, 'lastPage': 1, 'pageSize': 100},
+                'recordsets': [records[0]]
+            })
+        edgedns_manager.open_session.get = MagicMock(side_effect=get_page)
+
+        pages = edgedns_manager.iter_record_pages()
+        self.assertEqual(len(next(pages)), 1)
+        time.sleep(0.05)
+
+        # Workers blocked on the full page queue are released as soon as the consumer closes the generator
+        started = time.monotonic()
+        pages.close()
+        self.assertLess(time.monotonic() - started, EdgeDnsManager._PAGE_PUT_TIMEOUT_SEC)
+        self.assertEqual(edgedns_manager.open_session.get.call_count, 3)
+        self.assertLess(len(edgedns_manager.complete_zones), 3)
+
+    def test_iter_record_pages_zone_transfer(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.source = EdgeDnsSource.AXFR
+        config.edgedns.transfer = ZoneTransferConfig(host='127.0.0.1')
+        config.edgedns.page_size = 2
+        edgedns_manager = EdgeDnsManager(config)
+        assert edgedns_manager.zone_transfer is not None
+        edgedns_manager.open_session.get = MagicMock()
+        records = [test_data.create_dns_record1(), test_data.create_dns_record2(), test_data.create_dns_record3()]
+        edgedns_manager.zone_transfer.get_records = MagicMock(return_value=records)
+
+        pages = list(edgedns_manager.iter_record_pages())
+
+        # The record sets come from the zone transfer, not the API
+        self.assertEqual(pages, [records[0:2], records[2:3]])
+        edgedns_manager.zone_transfer.get_records.assert_called_once_with(
+            'edgedns.zone', deadline=edgedns_manager.poll_deadline)
+        edgedns_manager.open_session.get.assert_not_called()
+        self.assertEqual(edgedns_manager.complete_zones, {'edgedns.zone'})
+
+        edgedns_manager.zone_transfer.get_records = MagicMock(return_value=None)
+        self.assertEqual(list(edgedns_manager.iter_record_pages()), [])
+        self.assertEqual(edgedns_manager.complete_zones, set())
+
+    @staticmethod
+    def get_zone_page(url, params, timeout=None):
+        # Each zone has the records from test_recordset1.json, renamed into the zone
+        zone = url.split('/zones/')[1].split('/')[0]
+        recordset = test_util.read_json('test_recordset1.json')
+        for record in recordset['recordsets']:
+            record['name'] = record['name'].replace('edgedns.zone', zone)
+        return MockResponse(200, recordset)
+
+    def test_get_records_multiple_zones(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.zone_names = ['edgedns.zone', 'other.zone']
+        edgedns_manager = EdgeDnsManager(config)
+        edgedns_manager.open_session.get = MagicMock(side_effect=EdgeDnsManagerTest.get_zone_page)
+
+        actual_records = edgedns_manager.get_records()
+
+        # Duplicate zones are fetched once
+        self.assertEqual(edgedns_manager.open_session.get.call_count, 2)
+        # Zones are fetched concurrently, so their pages may interleave
+        actual_records.sort(key=lambda record: record.zone)
+        self.assertEqual([record.zone for record in actual_records], ['edgedns.zone'] * 3 + ['other.zone'] * 3)
+        self.assertEqual(actual_records[3].name, 'other.zone')
+        self.assertEqual(edgedns_manager.complete_zones, {'edgedns.zone', 'other.zone'})
+
+    def test_get_records_all_zones(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.all_zones = True
+        config.edgedns.contract_id = 'C-123'
+        edgedns_manager = EdgeDnsManager(config)
+
+        def get(url, params, timeout):
+            if url.endswith('/zones'):
+                self.assertEqual(params['contractIds'], 'C-123')
+                return MockResponse(200, {'zones': [{'zone': 'a.zone'}, {'zone': 'b.zone'}]})
+            return EdgeDnsManagerTest.get_zone_page(url, params)
+        edgedns_manager.open_session.get = MagicMock(side_effect=get)
+
+        actual_records = edgedns_manager.get_records()
+
+        self.assertEqual(len(actual_records), 6)
+        self.assertEqual(edgedns_manager.complete_zones, {'a.zone', 'b.zone'})
+
+        # If listing fails, the previously listed zones are used
+        edgedns_manager.open_session.get = MagicMock(side_effect=lambda url, params, timeout: \
+            MockResponse(403, None) if url.endswith('/zones') else EdgeDnsManagerTest.get_zone_page(url, params))
+        self.assertEqual(len(edgedns_manager.get_records()), 6)
+
+    @patch('lds_connector.edgedns_manager.time.sleep')
+    def test_get_records_retry(self, mock_sleep: MagicMock):
+        config = test_data.create_splunk_config()
+        edgedns_manager = EdgeDnsManager(config)
+
+        edgedns_manager.open_session.get = MagicMock(
+            side_effect = [
+                MockResponse(429, None, {'Retry-After': '3'}),
+                requests.ConnectionError(),
+                MockResponse(200, test_util.read_json('test_recordset1.json'))
+            ]
+        )
+
+        actual_records = edgedns_manager.get_records()
+
+        self.assertEqual(len(actual_records), 3)
+        # Throttling pauses until Retry-After. The connection error backs off
+        self.assertAlmostEqual(mock_sleep.call_args_list[0][0][0], 3, places=1)
+        self.assertLessEqual(mock_sleep.call_args_list[1][0][0], 2)
+        self.assertEqual(edgedns_manager.open_session.get.call_args_list[0][1]['timeout'], 30)
+
+    @patch('lds_connector.edgedns_manager.time.sleep')
+    def test_get_records_rate_limited(self, mock_sleep: MagicMock):
+        config = test_data.create_splunk_config()
+        edgedns_manager = EdgeDnsManager(config)
+
+        next_sec = time.time() + 10
+        rate_limit_next = datetime.fromtimestamp(next_sec, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        edgedns_manager.open_session.get = MagicMock(
+            return_value=MockResponse(200, test_util.read_json('test_recordset1.json'),
+                {'X-RateLimit-Remaining': '0', 'X-RateLimit-Next': rate_limit_next}))
+
+        self.assertEqual(len(edgedns_manager.get_records()), 3)
+        self.assertAlmostEqual(edgedns_manager.rate_limited_until, next_sec, places=3)
+
+        # The next request waits until the rate limit allows it
+        self.assertEqual(len(edgedns_manager.get_records()), 3)
+        self.assertAlmostEqual(mock_sleep.call_args_list[0][0][0], 10, places=0)
+
+    @patch('lds_connector.edgedns_manager.time.sleep')
+    def test_get_records_poll_timeout(self, mock_sleep: MagicMock):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.poll_timeout_sec = 60
+        edgedns_manager = EdgeDnsManager(config)
+
+        # Throttled for longer than the poll may take
+        edgedns_manager.open_session.get = MagicMock(return_value=MockResponse(429, None, {'Retry-After': '3600'}))
+
+        self.assertEqual(edgedns_manager.get_records(), [])
+        self.assertEqual(edgedns_manager.open_session.get.call_count, 1)
+        self.assertEqual(edgedns_manager.complete_zones, set())
+        self.assertLessEqual(sum(call_args[0][0] for call_args in mock_sleep.call_args_list), 60)
+
+    @patch('lds_connector.edgedns_manager.time.sleep')
+    def test_get_records_poll_timeout_unthrottled(self, mock_sleep: MagicMock):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.poll_timeout_sec = 60
+        edgedns_manager = EdgeDnsManager(config)
+
+        # Each request takes 40 seconds and fails. Nothing is throttled
+        clock = [1000.0]
+        def get(*args, **kwargs):
+            clock[0] += 40
+            return MockResponse(503, None)
+        edgedns_manager.open_session.get = MagicMock(side_effect=get)
+
+        with patch('lds_connector.edgedns_manager.time.monotonic', side_effect=lambda: clock[0]):
+            self.assertEqual(edgedns_manager.get_records(), [])
+
+        # The poll gives up at its deadline instead of retrying up to the failure threshold
+        self.assertEqual(edgedns_manager.open_session.get.call_count, 2)
+        self.assertEqual(edgedns_manager.complete_zones, set())
+
+    def test_get_records_poll_timeout_pages(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.poll_timeout_sec = 60
+        config.edgedns.fetch_workers = 1
+        edgedns_manager = EdgeDnsManager(config)
+
+        # Each page takes 40 seconds
+        clock = [1000.0]
+        def get(url, params, timeout=None):
+            clock[0] += 40
+            page = test_util.read_json('test_recordset1.json')
+            page['metadata']['page'] = params.get('page', 1)
+            page['metadata']['lastPage'] = 5
+            return MockResponse(200, page)
+        edgedns_manager.open_session.get = MagicMock(side_effect=get)
+
+        with patch('lds_connector.edgedns_manager.time.monotonic', side_effect=lambda: clock[0]):
+            self.assertEqual(len(edgedns_manager.get_records()), 6)
+
+        # Pages after the deadline aren't fetched
+        self.assertEqual(edgedns_manager.open_session.get.call_count, 2)
+        self.assertEqual(edgedns_manager.complete_zones, set())
+
+    def test_get_records_skip_unchanged_zones(self):
+        config = test_data.create_splunk_config()
+        assert config.edgedns is not None
+        config.edgedns.skip_unchanged_zones = True
+        edgedns_manager = EdgeDnsManager(config)
+
+        serial = [2019102601]
+        def get(url, params, timeout):
+            if url.endswith('/types/SOA'):
+                return MockResponse(200, {'rdata': [f'a1-247.akam.net. hostmaster.edgedns.zone. {serial[0]} 3600 600 604800 300']})
+            return EdgeDnsManagerTest.get_zone_page(url, params)
+        edgedns_manager.open_session.get = MagicMock(side_effect=get)
+
+        self.assertEqual(len(edgedns_manager.get_records()), 3)
+        self.assertEqual(edgedns_manager.pending_zone_serials, {'edgedns.zone': 2019102601})
+
+        # Not skipped until the records are delivered
+        self.assertEqual(len(edgedns_manager.get_records()), 3)
+        edgedns_manager.commit_zone_serials()
+
+        self.assertEqual(edgedns_manager.get_records(), [])
+        self.assertEqual(edgedns_manager.complete_zones, set())
+        self.assertEqual(len(edgedns_manager.get_records(skip_unchanged=False)), 3)
+
+        serial[0] += 1
+        self.assertEqual(len(edgedns_manager.get_records()), 3)
+        self.assertEqual(edgedns_manager.complete_zones, {'edgedns.zone'})
 
     def test_get_records_response_not_200(self):
         config = test_data.create_splunk_config()
@@ -112,6 +410,7 @@ class EdgeDnsManagerTest(unittest.TestCase):
             record.time_fetched_sec=0
 
         self.assertEqual(actual_records, expected_records)
+        self.assertEqual(edgedns_manager.complete_zones, set())
 
     def test_get_records_response_missing_key(self):
         config = test_data.create_splunk_config()
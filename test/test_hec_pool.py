@@ -0,0 +1,129 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from test import test_data
+from unittest.mock import MagicMock, patch
+
+from lds_connector.config import HecLoadBalancing
+from lds_connector.hec_pool import HecEndpointPool
+
+
+class HecEndpointPoolTest(unittest.TestCase):
+
+    @staticmethod
+    def create_config(load_balancing=HecLoadBalancing.ROUND_ROBIN):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.additional_hosts = ['127.0.0.2', '127.0.0.3:8089']
+        config.splunk.load_balancing = load_balancing
+        return config
+
+    def test_endpoints(self):
+        pool = HecEndpointPool(HecEndpointPoolTest.create_config())
+
+        self.assertEqual([endpoint.base_url for endpoint in pool.endpoints], [
+            'http://127.0.0.1:8088',
+            'http://127.0.0.2:8088',
+            'http://127.0.0.3:8089'
+        ])
+
+    def test_round_robin(self):
+        pool = HecEndpointPool(HecEndpointPoolTest.create_config())
+
+        actual_urls = []
+        for _ in range(4):
+            endpoint = pool.acquire()
+            actual_urls.append(endpoint.base_url)
+            pool.release(endpoint, healthy=True)
+
+        self.assertEqual(actual_urls, [
+            'http://127.0.0.1:8088',
+            'http://127.0.0.2:8088',
+            'http://127.0.0.3:8089',
+            'http://127.0.0.1:8088'
+        ])
+
+    def test_least_outstanding(self):
+        pool = HecEndpointPool(HecEndpointPoolTest.create_config(HecLoadBalancing.LEAST_OUTSTANDING))
+
+        endpoint1 = pool.acquire()
+        endpoint2 = pool.acquire()
+        pool.release(endpoint1, healthy=True)
+        endpoint3 = pool.acquire()
+        endpoint4 = pool.acquire()
+
+        self.assertEqual(endpoint1.base_url, 'http://127.0.0.1:8088')
+        self.assertEqual(endpoint2.base_url, 'http://127.0.0.2:8088')
+        self.assertEqual(endpoint3.base_url, 'http://127.0.0.3:8089')
+        self.assertEqual(endpoint4.base_url, 'http://127.0.0.1:8088')
+
+    @patch('lds_connector.hec_pool.requests')
+    @patch('lds_connector.hec_pool.time.time')
+    def test_eject_and_health_check(self, mock_time: MagicMock, mock_requests: MagicMock):
+        config = HecEndpointPoolTest.create_config()
+        config.splunk.additional_hosts = ['127.0.0.2']
+        pool = HecEndpointPool(config)
+        mock_time.return_value = 1000
+
+        # First endpoint fails. It's ejected and skipped
+        endpoint = pool.acquire()
+        pool.release(endpoint, healthy=False)
+        self.assertEqual(pool.acquire().base_url, 'http://127.0.0.2:8088')
+        self.assertEqual(pool.acquire().base_url, 'http://127.0.0.2:8088')
+        self.assertEqual(pool.acquire().base_url, 'http://127.0.0.2:8088')
+        mock_requests.get.assert_not_called()
+
+        # Ejection expires but health check fails. It's ejected again
+        mock_time.return_value = 1000 + config.splunk.endpoint_eject_sec
+        mock_requests.get.return_value = MagicMock(status_code=503)
+        self.assertEqual(pool.acquire().base_url, 'http://127.0.0.2:8088')
+        mock_requests.get.assert_called_once_with(
+            'http://127.0.0.1:8088/services/collector/health',
+            timeout=HecEndpointPool._TIMEOUT_SEC,
+            verify=True)
+
+        # Health check passes. It's used again
+        mock_time.return_value = 1000 + 2 * config.splunk.endpoint_eject_sec
+        mock_requests.get.return_value = MagicMock(status_code=200)
+        self.assertEqual(pool.acquire().base_url, 'http://127.0.0.2:8088')
+        self.assertEqual(pool.acquire().base_url, 'http://127.0.0.1:8088')
+
+    def test_all_ejected(self):
+        config = HecEndpointPoolTest.create_config()
+        config.splunk.additional_hosts = ['127.0.0.2']
+        pool = HecEndpointPool(config)
+
+        endpoint1 = pool.acquire()
+        pool.release(endpoint1, healthy=False)
+        endpoint2 = pool.acquire()
+        pool.release(endpoint2, healthy=False)
+
+        self.assertEqual(pool.acquire(), endpoint1)
+
+    def test_single_endpoint_not_ejected(self):
+        pool = HecEndpointPool(test_data.create_splunk_config())
+
+        endpoint = pool.acquire()
+        pool.release(endpoint, healthy=False)
+
+        self.assertEqual(endpoint.ejected_until, 0)
+        self.assertEqual(pool.acquire(), endpoint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from lds_connector.jobs import PeriodicJob, run_jobs
+
+
+class PeriodicJobTest(unittest.TestCase):
+
+    def test_periodic(self):
+        runs = []
+        job = PeriodicJob('test', lambda deadline: runs.append(deadline), period_sec=0.05)
+
+        job.start()
+        time.sleep(0.22)
+        job.stop()
+        job.thread.join(1)
+
+        self.assertFalse(job.thread.is_alive())
+        self.assertGreaterEqual(len(runs), 3)
+        self.assertLessEqual(len(runs), 6)
+        # No deadline configured
+        self.assertEqual(set(runs), {None})
+
+    def test_deadline(self):
+        deadlines = []
+        job = PeriodicJob('test', lambda deadline: deadlines.append((time.monotonic(), deadline)), period_sec=10,
+            deadline_sec=5)
+
+        job.start()
+        time.sleep(0.05)
+        job.stop()
+        job.thread.join(1)
+
+        started, deadline = deadlines[0]
+        self.assertAlmostEqual(deadline - started, 5, delta=0.05)
+
+    def test_no_overlap(self):
+        active = []
+        overlapped = threading.Event()
+        runs = []
+
+        def action(_):
+            if active:
+                overlapped.set()
+            active.append(True)
+            # Each run takes longer than the period
+            time.sleep(0.05)
+            runs.append(time.monotonic())
+            active.pop()
+
+        job = PeriodicJob('test', action, period_sec=0.01)
+        job.start()
+        time.sleep(0.2)
+        job.stop()
+        job.thread.join(1)
+
+        self.assertFalse(overlapped.is_set())
+        self.assertGreaterEqual(len(runs), 2)
+
+    def test_period_after_finish(self):
+        starts = []
+
+        def action(_):
+            starts.append(time.monotonic())
+            time.sleep(0.05)
+
+        job = PeriodicJob('test', action, period_sec=0.05)
+        job.start()
+        time.sleep(0.25)
+        job.stop()
+        job.join()
+
+        # Each run starts a period after the previous run finished
+        self.assertGreaterEqual(len(starts), 2)
+        for previous, current in zip(starts, starts[1:]):
+            self.assertGreaterEqual(current - previous, 0.1)
+
+    def test_join(self):
+        started = threading.Event()
+        finished = []
+
+        def action(_):
+            started.set()
+            time.sleep(0.1)
+            finished.append(True)
+
+        job = PeriodicJob('test', action, period_sec=10, deadline_sec=5)
+        job.start()
+        started.wait(1)
+        job.stop()
+
+        # The run in progress finishes before join returns
+        self.assertTrue(job.join())
+        self.assertEqual(finished, [True])
+
+    def test_join_deadline(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def action(_):
+            started.set()
+            release.wait(5)
+
+        job = PeriodicJob('test', action, period_sec=10, deadline_sec=0.05)
+        job.start()
+        started.wait(1)
+        job.stop()
+
+        # Waiting gives up once the run's deadline passes
+        begin = time.monotonic()
+        with self.assertLogs(level='WARNING'):
+            self.assertFalse(job.join())
+        self.assertLess(time.monotonic() - begin, 1)
+        release.set()
+
+    def test_exception(self):
+        runs = []
+
+        def action(_):
+            runs.append(True)
+            raise RuntimeError('Poll failed')
+
+        job = PeriodicJob('test', action, period_sec=0.02)
+        with self.assertLogs(level='ERROR'):
+            job.start()
+            time.sleep(0.1)
+        job.stop()
+        job.thread.join(1)
+
+        # The job keeps running after a failed run
+        self.assertGreaterEqual(len(runs), 2)
+
+    def test_independent(self):
+        fast_runs = []
+        slow_started = threading.Event()
+        release = threading.Event()
+
+        def slow(_):
+            slow_started.set()
+            release.wait(1)
+
+        jobs = [
+            PeriodicJob('slow', slow, period_sec=10),
+            PeriodicJob('fast', lambda _: fast_runs.append(True), period_sec=0.02)
+        ]
+        thread = threading.Thread(target=run_jobs, args=(jobs,), daemon=True)
+        thread.start()
+        slow_started.wait(1)
+        time.sleep(0.1)
+
+        # The slow job doesn't delay the fast one
+        self.assertGreaterEqual(len(fast_runs), 3)
+
+        for job in jobs:
+            job.stop()
+        release.set()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,7 @@ from unittest.mock import MagicMock
 import pickle
 
 from lds_connector.log_manager import LogManager, LogFile, LogNameProps
+from lds_connector.pipeline_stats import STAGE_DOWNLOAD
 
 
 class LogManagerTest(unittest.TestCase):
@@ -34,13 +35,23 @@ class LogManagerTest(unittest.TestCase):
             shutil.rmtree(test_data.TEMP_DIR)
 
         os.mkdir(test_data.TEMP_DIR)
+        self.log_managers = []
 
     def tearDown(self) -> None:
         super().tearDown()
 
+        # Finish any log file downloads in progress before deleting the download directory
+        for log_manager in self.log_managers:
+            log_manager.close()
+
         if path.isdir(test_data.TEMP_DIR):
             shutil.rmtree(test_data.TEMP_DIR)
 
+    def create_log_manager(self, config) -> LogManager:
+        log_manager = LogManager(config)
+        self.log_managers.append(log_manager)
+        return log_manager
+
     @staticmethod
     def set_last_processed(log_manager: LogManager, log_file: LogFile):
         log_file.processed = True
@@ -226,7 +237,7 @@ class LogManagerTest(unittest.TestCase):
         """
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
 
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
@@ -252,7 +263,7 @@ class LogManagerTest(unittest.TestCase):
         """
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3(), test_data.get_ns_file5()])
         log_manager._download = MagicMock(wraps=test_util.download_file)
@@ -288,7 +299,7 @@ class LogManagerTest(unittest.TestCase):
     def test_get_next_log_none(self):
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
         log_manager._download = MagicMock(wraps=test_util.download_file)
@@ -312,7 +323,7 @@ class LogManagerTest(unittest.TestCase):
         """
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
         log_manager._download = MagicMock(wraps=test_util.download_file)
@@ -329,7 +340,8 @@ class LogManagerTest(unittest.TestCase):
         log_manager.update_last_log_files()
 
         # Reinitialize log manager to simulate script restart
-        log_manager = LogManager(config)
+        log_manager.close()
+        log_manager = self.create_log_manager(config)
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
         log_manager._download = MagicMock(wraps=test_util.download_file)
@@ -338,6 +350,147 @@ class LogManagerTest(unittest.TestCase):
         assert log_file3 is not None
         self.assertEqual(log_file3.filename_gz, test_data.get_ns_file3().filename_gz)
 
+    def test_requeue_log_file_resume(self):
+        config = test_data.create_splunk_config()
+        config.lds.log_download_dir = test_data.TEMP_DIR
+        log_manager = self.create_log_manager(config)
+        log_manager._list = MagicMock(return_value = \
+            [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
+        log_manager._download = MagicMock(wraps=test_util.download_file)
+
+        log_file1 = log_manager.get_next_log()
+        assert log_file1 is not None
+        log_file1.last_processed_line = 5
+        log_manager.requeue_log_files([log_file1])
+
+        resumed_log_file = log_manager.get_next_log()
+        assert resumed_log_file is not None
+        self.assertEqual(resumed_log_file.filename_gz, test_data.get_ns_file1().filename_gz)
+        self.assertEqual(resumed_log_file.last_processed_line, 5)
+        self.assertFalse(resumed_log_file.processed)
+
+
+    def test_requeue_log_files(self):
+        """
+        If the first two log files are read but their events aren't delivered
+        Then they aren't saved as the zone's last log file
+        And they're retried in order
+        """
+        config = test_data.create_splunk_config()
+        config.lds.log_download_dir = test_data.TEMP_DIR
+        log_manager = self.create_log_manager(config)
+        log_manager._list = MagicMock(return_value = \
+            [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
+        log_manager._download = MagicMock(wraps=test_util.download_file)
+
+        log_file1 = log_manager.get_next_log()
+        log_file2 = log_manager.get_next_log()
+        assert log_file1 is not None and log_file2 is not None
+        log_manager.get_next_log()
+        self.assertEqual(log_manager.last_log_files_by_zone, {})
+
+        log_manager.requeue_log_files([log_file1, log_file2])
+
+        self.assertEqual(log_manager.get_next_log(), log_file1)
+        self.assertEqual(log_manager.get_next_log(), log_file2)
+
+
+    def test_get_next_log_prefetch(self):
+        """
+        If a log file is fetched
+        Then the following log files are downloaded while it's processed
+        """
+        config = test_data.create_splunk_config()
+        config.lds.log_download_dir = test_data.TEMP_DIR
+        config.lds.download_workers = 2
+        config.lds.prefetch_log_files = 2
+        log_manager = self.create_log_manager(config)
+        log_manager._list = MagicMock(return_value = \
+            [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
+        log_manager._download = MagicMock(wraps=test_util.download_file)
+
+        log_file1 = log_manager.get_next_log()
+
+        self.assertEqual([log_file.filename_gz for log_file, _ in log_manager.prefetched],
+            [test_data.get_ns_file2().filename_gz, test_data.get_ns_file3().filename_gz])
+        for _, future in log_manager.prefetched:
+            future.result()
+        self.assertEqual(log_manager._download.call_count, 3)
+        self.assertEqual(log_manager.stats.stages[STAGE_DOWNLOAD].max_queue_depth, 2)
+
+        # The list is only refreshed once every listed log file is processed
+        self.assertEqual(log_manager.get_next_log().filename_gz, test_data.get_ns_file2().filename_gz)
+        self.assertEqual(log_manager.get_next_log().filename_gz, test_data.get_ns_file3().filename_gz)
+        log_manager._list.assert_called_once()
+        assert log_file1 is not None
+        self.assertTrue(os.path.isfile(log_file1.local_path_txt))
+
+    def test_get_next_log_download_failed(self):
+        """
+        If the next log file fails to download
+        Then no log file is returned, and it's retried first on the next call
+        """
+        config = test_data.create_splunk_config()
+        config.lds.log_download_dir = test_data.TEMP_DIR
+        log_manager = self.create_log_manager(config)
+        log_manager._list = MagicMock(return_value = [test_data.get_ns_file1(), test_data.get_ns_file2()])
+        attempts = []
+
+        def download(log_file):
+            attempts.append(log_file.filename_gz)
+            if len(attempts) == 1:
+                raise OSError('Connection reset')
+            test_util.download_file(log_file)
+        log_manager._download = MagicMock(side_effect=download)
+
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(log_manager.get_next_log())
+
+        log_file = log_manager.get_next_log()
+        assert log_file is not None
+        self.assertEqual(log_file.filename_gz, test_data.get_ns_file1().filename_gz)
+        self.assertTrue(os.path.isfile(log_file.local_path_txt))
+        self.assertEqual(attempts.count(log_file.filename_gz), 2)
+
+    def test_get_next_log_no_prefetch(self):
+        config = test_data.create_splunk_config()
+        config.lds.log_download_dir = test_data.TEMP_DIR
+        config.lds.prefetch_log_files = 0
+        log_manager = self.create_log_manager(config)
+        log_manager._list = MagicMock(return_value = [test_data.get_ns_file1(), test_data.get_ns_file2()])
+        log_manager._download = MagicMock(wraps=test_util.download_file)
+
+        log_manager.get_next_log()
+
+        self.assertEqual(len(log_manager.prefetched), 0)
+        log_manager._download.assert_called_once()
+
+    def test_requeue_log_files_prefetched(self):
+        """
+        If a log file is retried while later log files are downloaded ahead
+        Then it's retried before them, and their downloads are discarded
+        """
+        config = test_data.create_splunk_config()
+        config.lds.log_download_dir = test_data.TEMP_DIR
+        config.lds.prefetch_log_files = 2
+        log_manager = self.create_log_manager(config)
+        log_manager._list = MagicMock(return_value = \
+            [test_data.get_ns_file2(), test_data.get_ns_file1(), test_data.get_ns_file3()])
+        log_manager._download = MagicMock(wraps=test_util.download_file)
+
+        log_file1 = log_manager.get_next_log()
+        assert log_file1 is not None
+        prefetched = [log_file for log_file, _ in log_manager.prefetched]
+
+        log_manager.requeue_log_files([log_file1])
+
+        for log_file in prefetched:
+            self.assertFalse(os.path.isfile(log_file.local_path_txt))
+        self.assertEqual(log_manager.get_next_log(), log_file1)
+        self.assertEqual(log_manager.get_next_log().filename_gz, test_data.get_ns_file2().filename_gz)
+        self.assertEqual(log_manager.get_next_log().filename_gz, test_data.get_ns_file3().filename_gz)
+
+
     def test_read_resume_data(self):
         """
         If there is a resume pickle file
@@ -353,7 +506,7 @@ class LogManagerTest(unittest.TestCase):
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
 
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
 
         self.assertEqual(log_manager.last_log_files_by_zone, {'cam': resume_data})
 
@@ -372,7 +525,7 @@ class LogManagerTest(unittest.TestCase):
 
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file1(), test_data.get_ns_file2(), test_data.get_ns_file3()])
         log_manager._download = MagicMock(wraps=test_util.download_file)
@@ -395,7 +548,7 @@ class LogManagerTest(unittest.TestCase):
 
         config = test_data.create_splunk_config()
         config.lds.log_download_dir = test_data.TEMP_DIR
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
 
         log_manager._list = MagicMock(return_value = \
             [test_data.get_ns_file1(), test_data.get_ns_file2(), test_data.get_ns_file3()])
@@ -432,7 +585,7 @@ class LogManagerTest(unittest.TestCase):
         mock_response.text = mock_response_text
 
         config = test_data.create_splunk_config()
-        log_manager = LogManager(config)
+        log_manager = self.create_log_manager(config)
 
         log_manager.netstorage = MagicMock()
         log_manager.netstorage.list = MagicMock(return_value=(True, mock_response))
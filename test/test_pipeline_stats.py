@@ -0,0 +1,55 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import patch
+
+from lds_connector.pipeline_stats import PipelineStats, STAGE_DOWNLOAD, STAGE_PARSE, STAGE_SEND
+
+
+class PipelineStatsTest(unittest.TestCase):
+
+    def test_summary(self):
+        stats = PipelineStats()
+        stats.add(STAGE_PARSE, 0.5, items=100)
+        stats.add(STAGE_PARSE, 0.25, items=50)
+        stats.set_queue_depth(STAGE_DOWNLOAD, 2)
+        stats.set_queue_depth(STAGE_DOWNLOAD, 1)
+        with patch('time.monotonic', side_effect=[10, 11.5]):
+            with stats.measure(STAGE_DOWNLOAD):
+                pass
+
+        self.assertEqual(stats.stages[STAGE_PARSE].items, 150)
+        # Stages are summarized in pipeline order. Idle stages are left out
+        self.assertEqual(stats.summary(), 'download 1x 1.50s (queue 1, max 2), parse 150x 0.75s')
+
+    def test_reset(self):
+        stats = PipelineStats()
+        stats.add(STAGE_SEND, 2, items=10)
+        stats.set_queue_depth(STAGE_DOWNLOAD, 3)
+        stats.set_queue_depth(STAGE_DOWNLOAD, 1)
+
+        stats.reset()
+
+        self.assertEqual(stats.summary(), '')
+        # Items still queued are carried over
+        self.assertEqual(stats.stages[STAGE_DOWNLOAD].queue_depth, 1)
+        self.assertEqual(stats.stages[STAGE_DOWNLOAD].max_queue_depth, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lds_connector.rate_limit import TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    @patch('lds_connector.rate_limit.time.sleep')
+    @patch('lds_connector.rate_limit.time.monotonic')
+    def test_acquire(self, mock_monotonic: MagicMock, mock_sleep: MagicMock):
+        mock_monotonic.return_value = 100.0
+        bucket = TokenBucket(rate_per_sec=10, burst=5)
+
+        for _ in range(5):
+            bucket.acquire()
+        mock_sleep.assert_not_called()
+
+        bucket.acquire()
+        mock_sleep.assert_called_once_with(0.1)
+
+    @patch('lds_connector.rate_limit.time.sleep')
+    @patch('lds_connector.rate_limit.time.monotonic')
+    def test_refill(self, mock_monotonic: MagicMock, mock_sleep: MagicMock):
+        mock_monotonic.return_value = 100.0
+        bucket = TokenBucket(rate_per_sec=10, burst=5)
+        for _ in range(5):
+            bucket.acquire()
+
+        # Refills up to the burst size only
+        mock_monotonic.return_value = 200.0
+        for _ in range(5):
+            bucket.acquire()
+        mock_sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socketserver
+import threading
+import unittest
+from test import test_data
+from unittest.mock import MagicMock, patch
+
+from lds_connector.config import SysLogTransport
+from lds_connector.relp import RelpClient
+from lds_connector.syslog import SysLog
+
+
+class _RelpHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal RELP server. Acknowledges syslog messages, except those the test asks it to reject or drop
+    """
+
+    def handle(self):
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                return
+            txnr, command, data = frame
+
+            if command == b'open':
+                self._respond(txnr, b'200 OK\nrelp_version=0\ncommands=syslog')
+            elif command == b'close':
+                self._respond(txnr, b'')
+                self.wfile.write(b'0 serverclose 0\n')
+                return
+            elif command == b'syslog':
+                with self.server.lock:
+                    self.server.frames_received += 1
+                    if self.server.drop_after is not None and self.server.frames_received > self.server.drop_after:
+                        self.server.drop_after = None
+                        return
+                    if data in self.server.reject:
+                        self.server.reject.remove(data)
+                        self._respond(txnr, b'500 rejected')
+                        continue
+                    self.server.messages.append(data)
+                self._respond(txnr, b'200 OK')
+
+    def _read_frame(self):
+        header = b''
+        while header.count(b' ') < 2:
+            char = self.rfile.read(1)
+            if not char:
+                return None
+            header += char
+        txnr, command, _ = header.split(b' ')
+        data_len = b''
+        char = self.rfile.read(1)
+        while char not in (b' ', b'\n'):
+            data_len += char
+            char = self.rfile.read(1)
+        data = b''
+        if char == b' ':
+            data = self.rfile.read(int(data_len))
+            self.rfile.read(1)
+        return txnr, command, data
+
+    def _respond(self, txnr: bytes, data: bytes):
+        frame = txnr + b' rsp ' + str(len(data)).encode('ascii')
+        if data:
+            frame += b' ' + data
+        self.wfile.write(frame + b'\n')
+
+
+class _RelpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _RelpHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.reject = []
+        self.frames_received = 0
+        self.drop_after = None
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class RelpClientTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = _RelpServer()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.server.stop()
+
+    def test_send(self):
+        client = RelpClient(self.server.server_address, window=4)
+        messages = [f'message {index}'.encode('utf-8') for index in range(10)]
+
+        self.assertEqual(client.send(messages), 10)
+        client.close()
+
+        self.assertEqual(self.server.messages, messages)
+
+    def test_send_rejected(self):
+        client = RelpClient(self.server.server_address, window=1)
+        messages = [b'message 0', b'message 1', b'message 2']
+        self.server.reject.append(b'message 1')
+
+        # Only the messages before the rejected one count as delivered
+        self.assertEqual(client.send(messages), 1)
+        self.assertIsNone(client.socket)
+
+        self.assertEqual(client.send(messages[1:]), 2)
+        client.close()
+        self.assertEqual(self.server.messages, messages)
+
+    def test_send_connection_lost(self):
+        client = RelpClient(self.server.server_address, window=1)
+        messages = [b'message 0', b'message 1', b'message 2']
+        self.server.drop_after = 2
+
+        self.assertEqual(client.send(messages), 2)
+        self.assertEqual(client.send(messages[2:]), 1)
+        client.close()
+        self.assertEqual(self.server.messages, messages)
+
+    @patch('lds_connector.syslogger.time.sleep', MagicMock())
+    def test_syslog_relp(self):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.RELP
+        config.syslog.host, config.syslog.port = self.server.server_address
+        config.syslog.relp_window = 2
+        syslog_handler = SysLog(config)
+        log_events = test_data.get_dns_log_events()
+        self.server.drop_after = 1
+
+        for log_event in log_events:
+            syslog_handler.add_log_line(log_event)
+        # Returns once every message is acknowledged, resending those lost with the connection
+        self.assertTrue(syslog_handler.publish_log_lines(force=True))
+
+        assert syslog_handler.syslogger.relp is not None
+        syslog_handler.syslogger.relp.close()
+        self.assertEqual(
+            [message.decode('utf-8').split(': ', 1)[1] for message in self.server.messages],
+            [log_event.log_line for log_event in log_events])
+        self.assertEqual(syslog_handler.syslogger.counters.sent, len(log_events))
+        self.assertEqual(syslog_handler.syslogger.counters.send_errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lds_connector.retry import Backoff, CircuitBreaker, parse_retry_after
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_backoff(self):
+        backoff = Backoff(initial_sec=1, max_sec=10)
+
+        for ceiling in [1, 2, 4, 8, 10, 10]:
+            delay = backoff.next_delay()
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+
+        backoff.reset()
+        self.assertLessEqual(backoff.next_delay(), 1)
+
+    def test_backoff_retry_after(self):
+        backoff = Backoff(initial_sec=1, max_sec=10)
+
+        self.assertEqual(backoff.next_delay(retry_after_sec=5), 5)
+        # Long delays are capped, so a server can't stall retries indefinitely
+        self.assertEqual(backoff.next_delay(retry_after_sec=86400), 10)
+
+    @patch('lds_connector.retry.time.time')
+    def test_circuit_breaker(self, mock_time: MagicMock):
+        mock_time.return_value = 1000
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_sec=60)
+
+        # Closed. Opens after consecutive failures
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        self.assertTrue(breaker.is_open())
+
+        # Half-open after reset period. Failed trial re-opens it
+        mock_time.return_value = 1060
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+        # Successful trial closes it
+        mock_time.return_value = 1120
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+
+    @patch('lds_connector.retry.time.time', MagicMock(return_value=1445412480.0))
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:30:00 GMT'), 120)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+if __name__ == '__main__':
+    unittest.main()
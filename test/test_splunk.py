@@ -16,30 +16,48 @@
 # limitations under the License.
 
 import itertools
+import os
+import shutil
 import unittest
 from unittest.mock import MagicMock, patch
 from os import path
 import socket
 import json
 from typing import Any, Dict
+from urllib.parse import urlencode
 
 from test import test_data
 
-from lds_connector.splunk import Splunk
+from lds_connector.splunk import Splunk, HecResponse
 from lds_connector.json import CustomJsonEncoder
-from lds_connector.config import Config
+from lds_connector.config import AdaptiveBatchConfig, Config
+from lds_connector.log_file import LogEvent
 
 
 class SplunkTest(unittest.TestCase):
     _TEST_LOG_FILENAME = path.abspath(path.join(path.dirname(__file__), 'data/test_logs.txt'))
 
+    def setUp(self) -> None:
+        super().setUp()
+
+        if path.isdir(test_data.TEMP_DIR):
+            shutil.rmtree(test_data.TEMP_DIR)
+
+        os.mkdir(test_data.TEMP_DIR)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+
+        if path.isdir(test_data.TEMP_DIR):
+            shutil.rmtree(test_data.TEMP_DIR)
+
     def test_publish_logs(self):
         config = test_data.create_splunk_config()
         assert config.splunk is not None
         config.splunk.lds_hec.event_batch_size = 1
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         log_event = test_data.get_dns_log_events()[0]
 
@@ -48,20 +66,33 @@ class SplunkTest(unittest.TestCase):
 
         expected_url = 'http://127.0.0.1:8088/services/collector/event'
         expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
-        expected_event = json.dumps({
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line,
-            'sourcetype': config.splunk.lds_hec.source_type,
-            'index': config.splunk.lds_hec.index
-        })
+        expected_event = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_event)])
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
             events_json = expected_event
         )
 
+    def test_publish_logs_serialized(self):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 1
+
+        splunk = Splunk(config)
+        splunk._post = MagicMock(return_value=HecResponse(200))
+
+        # Serialized ahead of time, as the serialize workers do
+        log_event = test_data.get_dns_log_events()[0]
+        splunk.serialize_log_line(log_event)
+        self.assertIsNotNone(log_event.serialized)
+
+        splunk.add_log_line(log_event)
+        self.assertTrue(splunk.publish_log_lines())
+
+        expected_event = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_event)])
+        self.assertEqual(splunk._post.call_args[1]['events_json'], expected_event)
+
+    @patch('lds_connector.splunk.time.sleep', MagicMock())
     @patch('lds_connector.splunk.requests')
     def test_publish_logs_retry(self, mock_requests):
         config = test_data.create_splunk_config()
@@ -82,14 +113,7 @@ class SplunkTest(unittest.TestCase):
 
         expected_url = 'http://127.0.0.1:8088/services/collector/event'
         expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
-        expected_event = json.dumps({
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line,
-            'sourcetype': config.splunk.lds_hec.source_type,
-            'index': config.splunk.lds_hec.index
-        })
+        expected_event = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_event)])
         mock_requests.post.assert_called_with(
             expected_url,
             headers=expected_headers,
@@ -98,6 +122,180 @@ class SplunkTest(unittest.TestCase):
             verify=True
         )
 
+    @patch('lds_connector.splunk.time.sleep')
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_retry_after(self, mock_requests, mock_sleep):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 1
+
+        splunk = Splunk(config)
+        mock_busy_response = MagicMock(status_code=503, headers={'Retry-After': '7'})
+        mock_requests.post.side_effect = [mock_busy_response, MagicMock(status_code=200)]
+
+        splunk.add_log_line(test_data.get_dns_log_events()[0])
+        self.assertTrue(splunk.publish_log_lines())
+
+        mock_sleep.assert_called_once_with(7.0)
+        self.assertEqual(mock_requests.post.call_count, 2)
+
+    @patch('lds_connector.splunk.time.sleep', MagicMock())
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_circuit_breaker(self, mock_requests):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 1
+        config.splunk.retry.failure_threshold = 3
+
+        splunk = Splunk(config)
+        mock_requests.post.return_value = MagicMock(status_code=503, headers={})
+
+        splunk.add_log_line(test_data.get_dns_log_events()[0])
+        self.assertFalse(splunk.publish_log_lines())
+
+        self.assertEqual(mock_requests.post.call_count, 3)
+        self.assertFalse(splunk.is_available())
+        self.assertEqual(len(splunk.log_queue), 1)
+
+        # Breaker is open. Nothing is sent
+        self.assertFalse(splunk.publish_log_lines(force=True))
+        self.assertEqual(mock_requests.post.call_count, 3)
+
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_rejected(self, mock_requests):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 1
+        config.splunk.dead_letter_path = path.join(test_data.TEMP_DIR, 'dead_letter.txt')
+
+        splunk = Splunk(config)
+        mock_requests.post.return_value = MagicMock(status_code=400, text='{"text":"Invalid data format","code":6}')
+
+        log_event = test_data.get_dns_log_events()[0]
+        splunk.add_log_line(log_event)
+        self.assertTrue(splunk.publish_log_lines())
+
+        mock_requests.post.assert_called_once()
+        self.assertEqual(len(splunk.log_queue), 0)
+        self.assertTrue(splunk.is_available())
+        with open(config.splunk.dead_letter_path, 'rb') as dead_letter_file:
+            expected_events = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_event)])
+            self.assertEqual(dead_letter_file.read(), expected_events + b'\n')
+
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_rejected_bisect(self, mock_requests):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 4
+        config.splunk.dead_letter_path = path.join(test_data.TEMP_DIR, 'dead_letter.txt')
+
+        log_events = test_data.get_dns_log_events()[0:4]
+        bad_event = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_events[2])])
+
+        # HEC rejects any batch containing the third event
+        def post(url, headers, data, timeout, verify):
+            return MagicMock(status_code=400 if bad_event in data else 200)
+        mock_requests.post.side_effect = post
+
+        splunk = Splunk(config)
+        for log_event in log_events:
+            splunk.add_log_line(log_event)
+        self.assertTrue(splunk.publish_log_lines())
+
+        actual_batches = [call_args[1]['data'] for call_args in mock_requests.post.call_args_list]
+        expected_events = [SplunkTest.create_expected_log_event(config, log_event) for log_event in log_events]
+        self.assertEqual(actual_batches, [
+            SplunkTest.to_events_json(expected_events),
+            SplunkTest.to_events_json(expected_events[0:2]),
+            SplunkTest.to_events_json(expected_events[2:4]),
+            SplunkTest.to_events_json(expected_events[2:3]),
+            SplunkTest.to_events_json(expected_events[3:4])
+        ])
+        self.assertEqual(len(splunk.log_queue), 0)
+        with open(config.splunk.dead_letter_path, 'rb') as dead_letter_file:
+            self.assertEqual(dead_letter_file.read(), bad_event + b'\n')
+
+    @patch('lds_connector.splunk.time.sleep', MagicMock())
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_rejected_bisect_circuit_breaker(self, mock_requests):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 4
+        config.splunk.retry.failure_threshold = 1
+
+        # HEC rejects the batch, accepts the first half, then becomes unavailable
+        mock_requests.post.side_effect = [
+            MagicMock(status_code=400),
+            MagicMock(status_code=200),
+            MagicMock(status_code=503, headers={})
+        ]
+
+        splunk = Splunk(config)
+        log_events = test_data.get_dns_log_events()[0:4]
+        for log_event in log_events:
+            splunk.add_log_line(log_event)
+        self.assertFalse(splunk.publish_log_lines())
+
+        self.assertEqual(mock_requests.post.call_count, 3)
+        self.assertEqual(len(splunk.log_queue), 2)
+
+    @patch('lds_connector.splunk.time.sleep', MagicMock())
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_retry_other_endpoint(self, mock_requests):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 1
+        config.splunk.additional_hosts = ['127.0.0.2']
+
+        splunk = Splunk(config)
+        mock_requests.post.side_effect = [MagicMock(status_code=503), MagicMock(status_code=200)]
+
+        splunk.add_log_line(test_data.get_dns_log_events()[0])
+        self.assertTrue(splunk.publish_log_lines())
+
+        actual_urls = [call_args[0][0] for call_args in mock_requests.post.call_args_list]
+        self.assertEqual(actual_urls, [
+            'http://127.0.0.1:8088/services/collector/event',
+            'http://127.0.0.2:8088/services/collector/event'
+        ])
+
+    @patch('lds_connector.splunk.requests')
+    def test_publish_logs_adaptive_batch(self, mock_requests):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.adaptive_batch = AdaptiveBatchConfig()
+        mock_requests.post.return_value = MagicMock(status_code=200)
+
+        splunk = Splunk(config)
+        assert splunk.lds_batch_controller is not None
+        log_events = test_data.get_dns_log_events()
+
+        # Until an event size is observed, the configured batch size is used
+        for log_event in log_events[0:2]:
+            splunk.add_log_line(log_event)
+        self.assertTrue(splunk.publish_log_lines(force=True))
+        self.assertEqual(splunk.lds_batch_controller.metrics().requests, 1)
+
+        # Queued events are split into requests of the adaptive batch size
+        assert splunk.lds_batch_controller.event_bytes is not None
+        splunk.lds_batch_controller.batch_bytes = splunk.lds_batch_controller.event_bytes * 4
+        for log_event in log_events[0:3]:
+            splunk.add_log_line(log_event)
+        self.assertFalse(splunk.publish_log_lines())
+        for log_event in log_events[3:10]:
+            splunk.add_log_line(log_event)
+        self.assertTrue(splunk.publish_log_lines())
+
+        self.assertEqual(mock_requests.post.call_count, 4)
+        self.assertEqual(len(splunk.log_queue), 0)
+        actual_events_json = [call_args[1]['data'] for call_args in mock_requests.post.call_args_list[1:]]
+        expected_events = [SplunkTest.create_expected_log_event(config, log_event) for log_event in log_events[0:10]]
+        self.assertEqual(actual_events_json, [
+            SplunkTest.to_events_json(expected_events[0:4]),
+            SplunkTest.to_events_json(expected_events[4:8]),
+            SplunkTest.to_events_json(expected_events[8:10])
+        ])
+
     @patch('lds_connector.splunk.requests')
     def test_publish_logs_no_verify(self, mock_requests):
         config = test_data.create_splunk_config()
@@ -117,14 +315,7 @@ class SplunkTest(unittest.TestCase):
 
         expected_url = 'http://127.0.0.1:8088/services/collector/event'
         expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
-        expected_event = json.dumps({
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line,
-            'sourcetype': config.splunk.lds_hec.source_type,
-            'index': config.splunk.lds_hec.index
-        })
+        expected_event = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_event)])
         mock_requests.post.assert_called_with(
             expected_url,
             headers=expected_headers,
@@ -140,7 +331,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.edgedns_hec.event_batch_size = 1
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         dns_record = test_data.create_dns_record1()
 
@@ -151,7 +342,7 @@ class SplunkTest(unittest.TestCase):
         expected_headers = {'Authorization': "Splunk test_edgedns_hec_token"}
         expected_event = SplunkTest.create_expected_record_event(config, dns_record)
 
-        expected_events_json = json.dumps(expected_event, cls=CustomJsonEncoder)
+        expected_events_json = SplunkTest.to_events_json([expected_event])
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
@@ -166,7 +357,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.lds_hec.event_batch_size = 1
         
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         log_event = test_data.get_dns_log_events()[0]
 
@@ -175,12 +366,7 @@ class SplunkTest(unittest.TestCase):
 
         expected_url = 'http://127.0.0.1:8088/services/collector/event'
         expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
-        expected_event = json.dumps({
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line
-        })
+        expected_event = SplunkTest.to_events_json([SplunkTest.create_expected_log_event(config, log_event, optionals=False)])
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
@@ -196,7 +382,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.edgedns_hec.event_batch_size = 1
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         dns_record = test_data.create_dns_record1()
 
@@ -207,7 +393,7 @@ class SplunkTest(unittest.TestCase):
         expected_headers = {'Authorization': "Splunk test_edgedns_hec_token"}
         expected_event = SplunkTest.create_expected_record_event(config, dns_record, optionals=False)
 
-        expected_events_json = json.dumps(expected_event, cls=CustomJsonEncoder)
+        expected_events_json = SplunkTest.to_events_json([expected_event])
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
@@ -220,7 +406,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.lds_hec.event_batch_size = 1
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         self.assertFalse(splunk.publish_log_lines())
 
@@ -233,7 +419,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.edgedns_hec.event_batch_size = 1
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         self.assertFalse(splunk.publish_dns_records())
 
@@ -245,7 +431,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.lds_hec.event_batch_size = 3
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         log_event1 = test_data.get_dns_log_events()[0]
         splunk.add_log_line(log_event1)
@@ -264,7 +450,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.edgedns_hec.event_batch_size = 3
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         dns_record = test_data.create_dns_record1()
 
@@ -282,7 +468,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.lds_hec.event_batch_size = 3
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         log_event = test_data.get_dns_log_events()[0]
         splunk.add_log_line(log_event)
@@ -296,15 +482,8 @@ class SplunkTest(unittest.TestCase):
 
         expected_url = 'http://127.0.0.1:8088/services/collector/event'
         expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
-        expected_event = {
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line,
-            'sourcetype': config.splunk.lds_hec.source_type,
-            'index': config.splunk.lds_hec.index
-        }
-        expected_events = '\n'.join([json.dumps(event) for event in [expected_event, expected_event, expected_event]])
+        expected_event = SplunkTest.create_expected_log_event(config, log_event)
+        expected_events = SplunkTest.to_events_json([expected_event, expected_event, expected_event])
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
@@ -318,7 +497,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.edgedns_hec.event_batch_size = 3
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         dns_record1 = test_data.create_dns_record1()
         dns_record2 = test_data.create_dns_record2()
@@ -341,7 +520,7 @@ class SplunkTest(unittest.TestCase):
             SplunkTest.create_expected_record_event(config, dns_record3)
         ]
 
-        expected_events = '\n'.join([json.dumps(event, cls=CustomJsonEncoder) for event in expected_events_json])
+        expected_events = SplunkTest.to_events_json(expected_events_json)
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
@@ -354,7 +533,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.lds_hec.event_batch_size = 3
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         log_event = test_data.get_dns_log_events()[0]
         splunk.add_log_line(log_event)
@@ -365,15 +544,8 @@ class SplunkTest(unittest.TestCase):
 
         expected_url = 'http://127.0.0.1:8088/services/collector/event'
         expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
-        expected_event = {
-            'time': log_event.timestamp.timestamp(),
-            'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': log_event.log_line,
-            'sourcetype': config.splunk.lds_hec.source_type,
-            'index': config.splunk.lds_hec.index
-        }
-        expected_events = '\n'.join([json.dumps(event) for event in [expected_event, expected_event]])
+        expected_event = SplunkTest.create_expected_log_event(config, log_event)
+        expected_events = SplunkTest.to_events_json([expected_event, expected_event])
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
@@ -387,7 +559,7 @@ class SplunkTest(unittest.TestCase):
         config.splunk.edgedns_hec.event_batch_size = 3
 
         splunk = Splunk(config)
-        splunk._post = MagicMock(return_value=True)
+        splunk._post = MagicMock(return_value=HecResponse(200))
 
         dns_record1 = test_data.create_dns_record1()
         dns_record2 = test_data.create_dns_record2()
@@ -405,30 +577,135 @@ class SplunkTest(unittest.TestCase):
             SplunkTest.create_expected_record_event(config, dns_record2)
         ]
 
-        expected_events = '\n'.join([json.dumps(event, cls=CustomJsonEncoder) for event in expected_events_json])
+        expected_events = SplunkTest.to_events_json(expected_events_json)
         splunk._post.assert_called_once_with(
             url=expected_url,
             headers=expected_headers,
             events_json=expected_events
         )
 
+    @patch('lds_connector.json.orjson', None)
+    def test_publish_without_orjson(self):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        assert config.splunk.edgedns_hec is not None
+        config.splunk.lds_hec.event_batch_size = 2
+        config.splunk.edgedns_hec.event_batch_size = 1
+
+        splunk = Splunk(config)
+        splunk._post = MagicMock(return_value=HecResponse(200))
+
+        log_events = test_data.get_dns_log_events()[0:2]
+        splunk.add_log_line(log_events[0])
+        splunk.add_log_line(log_events[1])
+        self.assertTrue(splunk.publish_log_lines())
+
+        dns_record = test_data.create_dns_record1()
+        splunk.add_dns_record(dns_record)
+        self.assertTrue(splunk.publish_dns_records())
+
+        expected_log_events = [SplunkTest.create_expected_log_event(config, log_event) for log_event in log_events]
+        expected_record_events = [SplunkTest.create_expected_record_event(config, dns_record)]
+        self.assertEqual(splunk._post.call_args_list[0][1]['events_json'],
+            SplunkTest.to_events_json(expected_log_events))
+        self.assertEqual(splunk._post.call_args_list[1][1]['events_json'],
+            SplunkTest.to_events_json(expected_record_events))
+
+    def test_publish_logs_raw(self):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        config.splunk.lds_hec.event_batch_size = 2
+        config.splunk.lds_hec.use_raw_endpoint = True
+
+        splunk = Splunk(config)
+        splunk._post = MagicMock(return_value=HecResponse(200))
+
+        log_events = test_data.get_dns_log_events()
+        splunk.add_log_line(log_events[0])
+        self.assertFalse(splunk.publish_log_lines())
+        splunk.add_log_line(log_events[1])
+        self.assertTrue(splunk.publish_log_lines())
+
+        expected_url = 'http://127.0.0.1:8088/services/collector/raw?' + urlencode({
+            'host': socket.gethostname(),
+            'source': 'lds-connector',
+            'sourcetype': config.splunk.lds_hec.source_type,
+            'index': config.splunk.lds_hec.index
+        })
+        expected_headers = {'Authorization': "Splunk test_lds_hec_token"}
+        expected_events = (log_events[0].log_line + '\n' + log_events[1].log_line).encode('utf-8')
+        splunk._post.assert_called_once_with(
+            url=expected_url,
+            headers=expected_headers,
+            events_json=expected_events
+        )
+
+    def test_publish_records_raw_no_optionals(self):
+        config = test_data.create_splunk_config()
+        assert config.splunk is not None
+        assert config.splunk.edgedns_hec is not None
+        config.splunk.edgedns_hec.source_type = None
+        config.splunk.edgedns_hec.index = None
+        config.splunk.edgedns_hec.event_batch_size = 1
+        config.splunk.edgedns_hec.use_raw_endpoint = True
+
+        splunk = Splunk(config)
+        splunk._post = MagicMock(return_value=HecResponse(200))
+
+        splunk.add_dns_record(test_data.create_dns_record1())
+        self.assertTrue(splunk.publish_dns_records())
+
+        expected_url = 'http://127.0.0.1:8088/services/collector/raw?' + urlencode({
+            'host': socket.gethostname(),
+            'source': 'lds-connector'
+        })
+        expected_headers = {'Authorization': "Splunk test_edgedns_hec_token"}
+        expected_events = json.dumps(test_data.create_dns_record1(), cls=CustomJsonEncoder, separators=(',', ':'))
+        splunk._post.assert_called_once_with(
+            url=expected_url,
+            headers=expected_headers,
+            events_json=expected_events.encode('utf-8')
+        )
+
+    @staticmethod
+    def create_expected_log_event(config: Config, log_event: LogEvent, optionals=True) -> Dict[str, Any]:
+        assert config.splunk is not None
+        event: Dict[str, Any] = {
+            'time': log_event.timestamp.timestamp(),
+            'host': socket.gethostname(),
+            'source': 'lds-connector'
+        }
+
+        if optionals:
+            event['sourcetype'] = config.splunk.lds_hec.source_type
+            event['index'] = config.splunk.lds_hec.index
+
+        event['event'] = log_event.log_line
+        return event
+
     @staticmethod
     def create_expected_record_event(config: Config, event, optionals=True) -> Dict[str, Any]:
         assert config.splunk is not None
         assert config.splunk.edgedns_hec is not None
+        record = event
         event = {
             'time': 0,
             'host': socket.gethostname(),
-            'source': 'lds-connector',
-            'event': event,
+            'source': 'lds-connector'
         }
 
         if optionals:
             event['sourcetype'] = config.splunk.edgedns_hec.source_type
             event['index'] = config.splunk.edgedns_hec.index
 
+        event['event'] = record
         return event
 
+    @staticmethod
+    def to_events_json(events) -> bytes:
+        return '\n'.join(
+            [json.dumps(event, cls=CustomJsonEncoder, separators=(',', ':')) for event in events]).encode('utf-8')
+
 
 if __name__ == '__main__':
     unittest.main()
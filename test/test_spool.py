@@ -0,0 +1,262 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import os
+import shutil
+import threading
+import time
+import unittest
+from os import path
+from test import test_data
+from unittest.mock import MagicMock, patch
+
+from lds_connector.config import SpoolConfig
+from lds_connector.dns_record import DnsRecordChange
+from lds_connector.dns_snapshot import DnsRecordSnapshot
+from lds_connector.handler import Handler
+from lds_connector.spool import Spool
+
+
+class SpoolTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        if path.isdir(test_data.TEMP_DIR):
+            shutil.rmtree(test_data.TEMP_DIR)
+
+        os.mkdir(test_data.TEMP_DIR)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+
+        if path.isdir(test_data.TEMP_DIR):
+            shutil.rmtree(test_data.TEMP_DIR)
+
+    @staticmethod
+    def create_config(flush_events=3):
+        config = test_data.create_splunk_config()
+        config.spool = SpoolConfig(directory=path.join(test_data.TEMP_DIR, 'spool'), flush_events=flush_events)
+        return config
+
+    @staticmethod
+    def create_handler():
+        handler = MagicMock(spec=Handler)
+        handler.publish_log_lines.return_value = True
+        handler.publish_dns_records.return_value = True
+        handler.is_available.return_value = True
+        return handler
+
+    def wait_for_drain(self, spool: Spool):
+        deadline = time.time() + 5
+        while spool.pending_segments() > 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(spool.pending_segments(), 0)
+
+    def test_log_lines(self):
+        handler = SpoolTest.create_handler()
+        spool = Spool(SpoolTest.create_config(), handler)
+        log_events = test_data.get_dns_log_events()
+
+        for log_event in log_events:
+            spool.add_log_line(log_event)
+            spool.publish_log_lines()
+        spool.publish_log_lines(force=True)
+        self.wait_for_drain(spool)
+        spool.close()
+
+        actual_events = [call[0][0] for call in handler.add_log_line.call_args_list]
+        self.assertEqual(actual_events, log_events)
+        self.assertEqual(os.listdir(path.join(test_data.TEMP_DIR, 'spool')), [])
+
+    def test_dns_records(self):
+        handler = SpoolTest.create_handler()
+        spool = Spool(SpoolTest.create_config(), handler)
+        dns_records = [test_data.create_dns_record1(), test_data.create_dns_record2(), test_data.create_dns_record3()]
+
+        for dns_record in dns_records:
+            spool.add_dns_record(dns_record)
+        self.assertTrue(spool.publish_dns_records(force=True))
+        self.wait_for_drain(spool)
+        spool.close()
+
+        actual_records = [call[0][0] for call in handler.add_dns_record.call_args_list]
+        self.assertEqual(actual_records, dns_records)
+
+    def test_dns_record_changes(self):
+        handler = SpoolTest.create_handler()
+        spool = Spool(SpoolTest.create_config(), handler)
+        record = test_data.create_dns_record1()
+        dns_records = [
+            DnsRecordSnapshot._change(record, DnsRecordChange.CHANGED),
+            test_data.create_dns_record2()
+        ]
+
+        for dns_record in dns_records:
+            spool.add_dns_record(dns_record)
+        self.assertTrue(spool.publish_dns_records(force=True))
+        self.wait_for_drain(spool)
+        spool.close()
+
+        # Changes are replayed as changes, not plain records
+        actual_records = [call[0][0] for call in handler.add_dns_record.call_args_list]
+        self.assertEqual(actual_records, dns_records)
+        self.assertIsInstance(actual_records[0], DnsRecordChange)
+        self.assertNotIsInstance(actual_records[1], DnsRecordChange)
+
+    def test_publish_below_flush(self):
+        handler = SpoolTest.create_handler()
+        spool = Spool(SpoolTest.create_config(flush_events=100), handler)
+
+        spool.add_log_line(test_data.get_dns_log_events()[0])
+        self.assertFalse(spool.publish_log_lines())
+        self.assertEqual(spool.pending_segments(), 0)
+        spool.close()
+
+        handler.add_log_line.assert_not_called()
+
+    def test_replay_after_restart(self):
+        config = SpoolTest.create_config()
+        log_events = test_data.get_dns_log_events()
+
+        # Destination is unavailable, so the first run can't deliver anything
+        unavailable_handler = SpoolTest.create_handler()
+        unavailable_handler.publish_log_lines.return_value = False
+        unavailable_handler.is_available.return_value = False
+        with patch.object(Spool, '_UNAVAILABLE_SLEEP_SEC', 0):
+            spool = Spool(config, unavailable_handler)
+            for log_event in log_events:
+                spool.add_log_line(log_event)
+            spool.publish_log_lines(force=True)
+            spool.close()
+        self.assertEqual(len(os.listdir(config.spool.directory)), 1)
+
+        handler = SpoolTest.create_handler()
+        spool = Spool(config, handler)
+        self.wait_for_drain(spool)
+        spool.close()
+
+        actual_events = [call[0][0] for call in handler.add_log_line.call_args_list]
+        self.assertEqual(actual_events, log_events)
+
+    def test_replay_truncated_segment(self):
+        config = SpoolTest.create_config()
+        log_events = test_data.get_dns_log_events()
+
+        # Simulate a crash while the segment was still being written. It's flushed but has no GZIP trailer
+        spool = Spool(config, SpoolTest.create_handler())
+        for log_event in log_events:
+            spool.add_log_line(log_event)
+        self.assertTrue(spool.publish_log_lines())
+        with spool.condition:
+            spool.running = False
+            spool.condition.notify_all()
+        spool.drain_thread.join()
+        self.assertTrue(path.isfile(spool.active_path))
+
+        handler = SpoolTest.create_handler()
+        spool = Spool(config, handler)
+        self.wait_for_drain(spool)
+        spool.close()
+
+        actual_events = [call[0][0] for call in handler.add_log_line.call_args_list]
+        self.assertEqual(actual_events, log_events)
+
+    def test_replay_partly_delivered_segment(self):
+        config = SpoolTest.create_config()
+        log_events = test_data.get_dns_log_events()
+
+        # The destination accepts the first event, then goes down
+        partial_handler = SpoolTest.create_handler()
+        partial_handler.publish_log_lines.side_effect = itertools.chain([True], itertools.repeat(False))
+        partial_handler.is_available.return_value = False
+        with patch.object(Spool, '_UNAVAILABLE_SLEEP_SEC', 0):
+            spool = Spool(config, partial_handler)
+            for log_event in log_events:
+                spool.add_log_line(log_event)
+            spool.publish_log_lines(force=True)
+            deadline = time.time() + 5
+            while partial_handler.clear.call_count == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            spool.close()
+        partial_handler.close.assert_called_once()
+
+        # After a restart, delivery resumes after the accepted event
+        handler = SpoolTest.create_handler()
+        spool = Spool(config, handler)
+        self.wait_for_drain(spool)
+        spool.close()
+
+        actual_events = [call[0][0] for call in handler.add_log_line.call_args_list]
+        self.assertEqual(actual_events, log_events[1:])
+        self.assertEqual(os.listdir(config.spool.directory), [])
+
+    def test_forced_publish_backlog(self):
+        handler = SpoolTest.create_handler()
+        delivering = threading.Event()
+        release = threading.Event()
+
+        def publish_log_lines(force=False):
+            delivering.set()
+            release.wait(5)
+            return True
+        handler.publish_log_lines.side_effect = publish_log_lines
+        spool = Spool(SpoolTest.create_config(flush_events=1), handler)
+        log_events = test_data.get_dns_log_events()[:3]
+
+        # The first segment is sealed right away, since nothing is waiting to be delivered
+        spool.add_log_line(log_events[0])
+        spool.publish_log_lines(force=True)
+        delivering.wait(5)
+
+        # While it's delivered, later forced publishes share the next segment
+        for log_event in log_events[1:]:
+            spool.add_log_line(log_event)
+            spool.publish_log_lines(force=True)
+        self.assertEqual(spool.pending_segments(), 2)
+
+        release.set()
+        self.wait_for_drain(spool)
+        spool.close()
+
+        self.assertEqual(spool.next_sequence, 2)
+        actual_events = [call[0][0] for call in handler.add_log_line.call_args_list]
+        self.assertEqual(actual_events, log_events)
+
+    def test_destination_unavailable(self):
+        handler = SpoolTest.create_handler()
+        handler.publish_log_lines.side_effect = [False, False, False, False, False, True]
+        handler.is_available.side_effect = [False, True]
+        log_events = test_data.get_dns_log_events()[:2]
+
+        with patch.object(Spool, '_UNAVAILABLE_SLEEP_SEC', 0):
+            spool = Spool(SpoolTest.create_config(), handler)
+            for log_event in log_events:
+                spool.add_log_line(log_event)
+            spool.publish_log_lines(force=True)
+            self.wait_for_drain(spool)
+            spool.close()
+
+        self.assertEqual(handler.is_available.call_count, 2)
+        handler.clear.assert_called_once()
+        actual_events = [call[0][0] for call in handler.add_log_line.call_args_list]
+        self.assertEqual(actual_events, log_events + log_events)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import errno
 import json
 import socket
 import unittest
@@ -25,7 +26,8 @@ import itertools
 
 from freezegun import freeze_time
 
-from lds_connector.config import Config, SysLogTransport, SysLogTlsConfig, SysLogProtocol, SysLogDelimiter
+from lds_connector.config import Config, SysLogDatagramOverflow, SysLogTransport, SysLogTlsConfig, SysLogProtocol, \
+    SysLogDelimiter
 from lds_connector.json import CustomJsonEncoder
 from lds_connector.log_file import LogEvent
 from lds_connector.syslog import SysLog
@@ -56,7 +58,7 @@ class SysLogTest(unittest.TestCase):
 
         log_event = test_data.get_dns_log_events()[0]
         syslog_handler.add_log_line(log_event)
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         expected_message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
         assert config.syslog is not None
@@ -73,7 +75,7 @@ class SysLogTest(unittest.TestCase):
         dns_record = test_data.create_dns_record1()
 
         syslog_handler.add_dns_record(dns_record)
-        syslog_handler.publish_dns_records()
+        syslog_handler.publish_dns_records(force=True)
 
         expected_message = SysLogTest.create_rfc3164_dns(config, dns_record)
         assert config.syslog is not None
@@ -92,7 +94,7 @@ class SysLogTest(unittest.TestCase):
 
         log_event = test_data.get_dns_log_events()[0]
         syslog_handler.add_log_line(log_event)
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         expected_message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
         mock_socket_inst.connect.assert_called_once()
@@ -114,7 +116,7 @@ class SysLogTest(unittest.TestCase):
 
             log_event = test_data.get_dns_log_events()[0]
             syslog_handler.add_log_line(log_event)
-            syslog_handler.publish_log_lines()
+            syslog_handler.publish_log_lines(force=True)
 
             expected_message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0], delim)
             mock_socket_inst.connect.assert_called_once()
@@ -135,7 +137,7 @@ class SysLogTest(unittest.TestCase):
 
         log_event = test_data.get_dns_log_events()[0]
         syslog_handler.add_log_line(log_event)
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         expected_message = SysLogTest.create_rfc5424_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC5424[0])
         mock_socket_inst.connect.assert_called_once()
@@ -160,7 +162,7 @@ class SysLogTest(unittest.TestCase):
 
         log_event = test_data.get_dns_log_events()[0]
         syslog_handler.add_log_line(log_event)
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         expected_message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
         mock_socket_inst.connect.assert_called_once()
@@ -186,7 +188,7 @@ class SysLogTest(unittest.TestCase):
 
         log_event = test_data.get_dns_log_events()[0]
         syslog_handler.add_log_line(log_event)
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         expected_message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
         mock_socket_inst.connect.assert_called_once()
@@ -206,7 +208,7 @@ class SysLogTest(unittest.TestCase):
         dns_record = test_data.create_dns_record1()
 
         syslog_handler.add_dns_record(dns_record)
-        syslog_handler.publish_dns_records()
+        syslog_handler.publish_dns_records(force=True)
 
         expected_message = SysLogTest.create_rfc3164_dns(config, dns_record)
         mock_socket_inst.connect.assert_called_once()
@@ -218,9 +220,9 @@ class SysLogTest(unittest.TestCase):
         syslog_handler = SysLog(config)
         syslog_handler.syslogger = MagicMock()
 
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
-        syslog_handler.syslogger.log_info.assert_not_called()
+        syslog_handler.syslogger.log_info_batch.assert_not_called()
 
 
     def test_publish_dns_records_no_events(self):
@@ -228,9 +230,67 @@ class SysLogTest(unittest.TestCase):
         syslog_handler = SysLog(config)
         syslog_handler.syslogger = MagicMock()
 
-        syslog_handler.publish_dns_records()
+        syslog_handler.publish_dns_records(force=True)
 
-        syslog_handler.syslogger.log_info.assert_not_called()
+        syslog_handler.syslogger.log_info_batch.assert_not_called()
+
+
+    def test_publish_logs_batch_size(self):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.event_batch_size = 2
+        syslog_handler = SysLog(config)
+        syslog_handler.syslogger = MagicMock()
+        # Messages are generated from the queue, so consume them before it's cleared
+        sent_batches = []
+        syslog_handler.syslogger.log_info_batch.side_effect = \
+            lambda app_name, messages: sent_batches.append(list(messages))
+        log_events = test_data.get_dns_log_events()[0:3]
+
+        syslog_handler.add_log_line(log_events[0])
+        self.assertFalse(syslog_handler.publish_log_lines())
+        syslog_handler.syslogger.log_info_batch.assert_not_called()
+
+        syslog_handler.add_log_line(log_events[1])
+        self.assertTrue(syslog_handler.publish_log_lines())
+        self.assertEqual(sent_batches, [[(log_event.timestamp, log_event.log_line) for log_event in log_events[0:2]]])
+
+        # A partial batch is only sent when forced
+        syslog_handler.add_log_line(log_events[2])
+        self.assertFalse(syslog_handler.publish_log_lines())
+        self.assertTrue(syslog_handler.publish_log_lines(force=True))
+        self.assertEqual(syslog_handler.syslogger.log_info_batch.call_count, 2)
+
+
+    def test_publish_logs_batch_bytes(self):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        log_events = test_data.get_dns_log_events()[0:2]
+        config.syslog.batch_bytes = len(log_events[0].log_line) + 1
+        syslog_handler = SysLog(config)
+        syslog_handler.syslogger = MagicMock()
+
+        syslog_handler.add_log_line(log_events[0])
+        self.assertFalse(syslog_handler.publish_log_lines())
+
+        syslog_handler.add_log_line(log_events[1])
+        self.assertTrue(syslog_handler.publish_log_lines())
+        self.assertEqual(syslog_handler.log_queue_bytes, 0)
+
+
+    def test_publish_logs_batch_bytes_utf8(self):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        log_line = 'query: ünïcödé.example.com IN A'
+        config.syslog.batch_bytes = len(log_line) + 1
+        syslog_handler = SysLog(config)
+        syslog_handler.syslogger = MagicMock()
+
+        syslog_handler.add_log_line(LogEvent(log_line, datetime.fromtimestamp(self.LOG_EMIT_TIME, timezone.utc)))
+
+        # Batch size is counted in encoded bytes, not characters
+        self.assertEqual(syslog_handler.log_queue_bytes, len(log_line.encode('utf-8')))
+        self.assertTrue(syslog_handler.publish_log_lines())
 
 
     @patch('lds_connector.syslogger.socket.socket')
@@ -246,7 +306,7 @@ class SysLogTest(unittest.TestCase):
         syslog_handler.add_log_line(log_events[0])
         syslog_handler.add_log_line(log_events[1])
         syslog_handler.add_log_line(log_events[2])
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         assert config.syslog is not None
         expected_message1 = SysLogTest.create_rfc3164_log(config, log_events[0], SysLogTest.EXPECTED_TIMES_RFC3164[0])
@@ -272,7 +332,7 @@ class SysLogTest(unittest.TestCase):
         syslog_handler.add_dns_record(test_data.create_dns_record1())
         syslog_handler.add_dns_record(test_data.create_dns_record2())
         syslog_handler.add_dns_record(test_data.create_dns_record3())
-        syslog_handler.publish_dns_records()
+        syslog_handler.publish_dns_records(force=True)
 
         assert config.syslog is not None
         expected_message1 = SysLogTest.create_rfc3164_dns(config, test_data.create_dns_record1())
@@ -295,9 +355,101 @@ class SysLogTest(unittest.TestCase):
         syslog_handler.add_log_line(log_events[0])
         syslog_handler.add_log_line(log_events[1])
         syslog_handler.clear()
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
+
+        syslog_handler.syslogger.log_info_batch.assert_not_called()
+
+
+    @patch('lds_connector.syslogger.socket.socket')
+    @patch('time.time', MagicMock(return_value=LOG_EMIT_TIME))
+    def test_publish_tcp_multiple_logs(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+
+        mock_socket_inst = MagicMock()
+        mock_socket.return_value = mock_socket_inst
+
+        syslog_handler = SysLog(config)
+        log_events = test_data.get_dns_log_events()[0:3]
+        for log_event in log_events:
+            syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        expected_messages = [SysLogTest.create_rfc3164_log(config, log_event, expected_time)
+            for log_event, expected_time in zip(log_events, SysLogTest.EXPECTED_TIMES_RFC3164)]
+        mock_socket_inst.sendall.assert_called_once_with(b''.join(expected_messages))
 
-        syslog_handler.syslogger.log_info.assert_not_called()
+
+    @patch('lds_connector.syslogger.socket.socket')
+    @patch('time.time', MagicMock(return_value=LOG_EMIT_TIME))
+    def test_publish_tcp_max_write_bytes(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+        log_events = test_data.get_dns_log_events()[0:3]
+        expected_messages = [SysLogTest.create_rfc3164_log(config, log_event, expected_time)
+            for log_event, expected_time in zip(log_events, SysLogTest.EXPECTED_TIMES_RFC3164)]
+        config.syslog.max_write_bytes = len(expected_messages[0]) + len(expected_messages[1])
+
+        mock_socket_inst = MagicMock()
+        mock_socket.return_value = mock_socket_inst
+
+        syslog_handler = SysLog(config)
+        for log_event in log_events:
+            syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        mock_socket_inst.sendall.assert_has_calls([
+            call(expected_messages[0] + expected_messages[1]),
+            call(expected_messages[2])
+        ])
+        self.assertEqual(mock_socket_inst.sendall.call_count, 2)
+
+
+    @patch('lds_connector.syslogger.socket.socket')
+    @freeze_time(datetime.fromtimestamp(LOG_EMIT_TIME))
+    def test_publish_tcp_log_octet_count_bytes(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+        config.syslog.delimiter_method = SysLogDelimiter.OCTET
+        mock_socket_inst = MagicMock()
+        mock_socket.return_value = mock_socket_inst
+        syslog_handler = SysLog(config)
+
+        log_event = test_data.get_dns_log_events()[0]
+        log_event.log_line += ' caf\u00e9'
+        syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0],
+            SysLogDelimiter.NONE)
+        mock_socket_inst.sendall.assert_called_once_with(str(len(message)).encode('ascii') + b' ' + message)
+
+
+    @patch('lds_connector.syslogger.socket.gethostname', MagicMock(return_value='test-host'))
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_cached_header(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+        config.syslog.protocol = SysLogProtocol.RFC5424
+        mock_socket_inst = MagicMock()
+        mock_socket.return_value = mock_socket_inst
+        syslog_handler = SysLog(config)
+
+        log_events = test_data.get_dns_log_events()[0:3]
+        for log_event in log_events:
+            syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        app_name = config.syslog.lds_app_name
+        expected_messages = [
+            f'<14>1 {expected_time} test-host {app_name} - - - {log_event.log_line}\n'.encode('utf-8')
+            for log_event, expected_time in zip(log_events, SysLogTest.EXPECTED_TIMES_RFC5424)]
+        mock_socket_inst.sendall.assert_called_once_with(b''.join(expected_messages))
+        self.assertEqual(syslog_handler.syslogger.headers, {app_name: (b'<14>1 ', f' test-host {app_name} - - - '.encode('utf-8'))})
 
 
     @patch('lds_connector.syslogger.socket.socket')
@@ -313,7 +465,7 @@ class SysLogTest(unittest.TestCase):
 
         log_event = test_data.get_dns_log_events()[0]
         syslog_handler.add_log_line(log_event)
-        syslog_handler.publish_log_lines()
+        syslog_handler.publish_log_lines(force=True)
 
         expected_message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
         self.assertEqual(mock_socket_inst.connect.call_count, 2)
@@ -321,6 +473,206 @@ class SysLogTest(unittest.TestCase):
         self.assertEqual(mock_socket_inst.sendall.call_count, 2)
 
 
+    @patch('lds_connector.syslogger.socket.socket')
+    @freeze_time(datetime.fromtimestamp(LOG_EMIT_TIME))
+    def test_publish_udp_log_truncate(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        mock_socket_inst = MagicMock()
+        mock_socket.return_value = mock_socket_inst
+        log_event = test_data.get_dns_log_events()[0]
+        log_event.log_line = 'caf\u00e9' * 100
+        message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
+        header_bytes = message.index(b'caf')
+        # Limit falls inside the second character of a multi-byte 'é'
+        config.syslog.max_datagram_bytes = header_bytes + 1 + 4 + 4
+        syslog_handler = SysLog(config)
+
+        syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        mock_socket_inst.sendto.assert_called_once_with(message[:header_bytes] + 'caf\u00e9caf'.encode('utf-8') + b'\n',
+            (config.syslog.host, config.syslog.port))
+        self.assertEqual(syslog_handler.syslogger.counters.truncated, 1)
+        self.assertEqual(syslog_handler.syslogger.counters.sent, 1)
+
+
+    @patch('lds_connector.syslogger.socket.socket')
+    @freeze_time(datetime.fromtimestamp(LOG_EMIT_TIME))
+    def test_publish_udp_log_split(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.datagram_overflow = SysLogDatagramOverflow.SPLIT
+        mock_socket_inst = MagicMock()
+        mock_socket.return_value = mock_socket_inst
+        log_event = test_data.get_dns_log_events()[0]
+        log_event.log_line = 'abcdefghij'
+        message = SysLogTest.create_rfc3164_log(config, log_event, SysLogTest.EXPECTED_TIMES_RFC3164[0])
+        header = message[:message.index(b'abc')]
+        config.syslog.max_datagram_bytes = len(header) + 4 + 1
+        syslog_handler = SysLog(config)
+
+        syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        address = (config.syslog.host, config.syslog.port)
+        self.assertEqual(mock_socket_inst.sendto.call_args_list, [
+            call(header + b'abcd\n', address),
+            call(header + b'efgh\n', address),
+            call(header + b'ij\n', address)
+        ])
+        self.assertEqual(syslog_handler.syslogger.counters.split, 1)
+        self.assertEqual(syslog_handler.syslogger.counters.sent, 3)
+
+
+    @patch('lds_connector.rate_limit.time.sleep')
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_udp_log_paced(self, mock_socket: MagicMock, mock_sleep: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.udp_max_rate_per_sec = 1
+        config.syslog.udp_burst = 2
+        mock_socket.return_value = MagicMock()
+        syslog_handler = SysLog(config)
+
+        for log_event in test_data.get_dns_log_events()[0:3]:
+            syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+
+        # The burst is sent at once. The third datagram waits for a token
+        mock_sleep.assert_called_once()
+        self.assertGreater(mock_sleep.call_args_list[0][0][0], 0.9)
+        self.assertEqual(mock_socket.return_value.sendto.call_count, 3)
+
+
+    @patch('lds_connector.syslogger.time.sleep', MagicMock())
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_udp_log_send_errors(self, mock_socket: MagicMock):
+        config = test_data.create_syslog_config()
+        mock_socket_inst = MagicMock()
+        mock_socket_inst.sendto.side_effect = itertools.chain([OSError()], itertools.repeat(None))
+        mock_socket.return_value = mock_socket_inst
+        syslog_handler = SysLog(config)
+
+        syslog_handler.add_log_line(test_data.get_dns_log_events()[0])
+        with self.assertLogs(level='WARNING'):
+            syslog_handler.publish_log_lines(force=True)
+
+        self.assertEqual(syslog_handler.syslogger.counters.send_errors, 1)
+        self.assertEqual(syslog_handler.syslogger.counters.sent, 1)
+
+
+    @patch('lds_connector.syslogger.time.sleep')
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_udp_log_too_large(self, mock_socket: MagicMock, mock_sleep: MagicMock):
+        config = test_data.create_syslog_config()
+        mock_socket_inst = MagicMock()
+        mock_socket_inst.sendto.side_effect = itertools.chain(
+            [OSError(errno.EMSGSIZE, 'Message too long')], itertools.repeat(None))
+        mock_socket.return_value = mock_socket_inst
+        syslog_handler = SysLog(config)
+
+        for log_event in test_data.get_dns_log_events()[0:2]:
+            syslog_handler.add_log_line(log_event)
+        with self.assertLogs(level='WARNING'):
+            syslog_handler.publish_log_lines(force=True)
+
+        # The oversized datagram is dropped rather than retried. The next one is still sent
+        mock_sleep.assert_not_called()
+        mock_socket_inst.close.assert_not_called()
+        self.assertEqual(mock_socket_inst.sendto.call_count, 2)
+        self.assertEqual(syslog_handler.syslogger.counters.dropped, 1)
+        self.assertEqual(syslog_handler.syslogger.counters.sent, 1)
+        self.assertEqual(syslog_handler.syslogger.counters.send_errors, 0)
+
+
+    @patch('lds_connector.syslogger.time.sleep')
+    @patch('lds_connector.syslogger.socket.getaddrinfo')
+    @patch('lds_connector.syslogger.ssl.SSLContext.wrap_socket')
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_tls_log_reconnect(self, mock_socket: MagicMock, mock_wrap_socket: MagicMock,
+            mock_getaddrinfo: MagicMock, mock_sleep: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP_TLS
+        config.syslog.tls = SysLogTlsConfig(ca_file=test_data.CA_FILE, verify=False)
+        mock_getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', (config.syslog.host, config.syslog.port))]
+        mock_socket_inst = MagicMock()
+        mock_socket_inst.sendall.side_effect = itertools.chain([ConnectionError()] * 2, itertools.repeat(None))
+        mock_socket.return_value = mock_socket_inst
+        mock_wrap_socket.side_effect = lambda socket, **kwargs: socket
+        syslog_handler = SysLog(config)
+
+        syslog_handler.add_log_line(test_data.get_dns_log_events()[0])
+        syslog_handler.publish_log_lines(force=True)
+
+        # The address is resolved once. Reconnects resume the TLS session and back off
+        mock_getaddrinfo.assert_called_once()
+        self.assertEqual(mock_wrap_socket.call_count, 3)
+        self.assertEqual(mock_wrap_socket.call_args_list[0][1], {})
+        self.assertEqual(mock_wrap_socket.call_args_list[1][1], {'session': mock_socket_inst.session})
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertLessEqual(mock_sleep.call_args_list[0][0][0], 1)
+        self.assertGreater(mock_sleep.call_args_list[1][0][0], 0.99)
+        self.assertEqual(syslog_handler.syslogger.backoff.attempt, 0)
+
+
+    @patch('lds_connector.syslogger.socket.getaddrinfo')
+    @patch('lds_connector.syslogger.ssl.SSLContext.wrap_socket')
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_tls_log_session_saved(self, mock_socket: MagicMock, mock_wrap_socket: MagicMock,
+            mock_getaddrinfo: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP_TLS
+        config.syslog.tls = SysLogTlsConfig(ca_file=test_data.CA_FILE, verify=False)
+        mock_getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', (config.syslog.host, config.syslog.port))]
+        mock_tls_socket = MagicMock()
+        mock_wrap_socket.return_value = mock_tls_socket
+        syslog_handler = SysLog(config)
+
+        syslog_handler.add_log_line(test_data.get_dns_log_events()[0])
+        syslog_handler.publish_log_lines(force=True)
+
+        # The session is kept after a successful handshake, not only when a send fails
+        mock_tls_socket.sendall.assert_called_once()
+        self.assertIs(syslog_handler.syslogger.tls_session, mock_tls_socket.session)
+
+
+    @patch('lds_connector.syslogger.time.sleep', MagicMock())
+    @patch('lds_connector.syslogger.time.monotonic')
+    @patch('lds_connector.syslogger.socket.getaddrinfo')
+    @patch('lds_connector.syslogger.socket.socket')
+    def test_publish_tcp_log_dns_cache_expiry(self, mock_socket: MagicMock, mock_getaddrinfo: MagicMock,
+            mock_monotonic: MagicMock):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+        config.syslog.dns_cache_sec = 300
+        mock_getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', (config.syslog.host, config.syslog.port))]
+        mock_monotonic.return_value = 1000.0
+        mock_socket_inst = MagicMock()
+        mock_socket_inst.sendall.side_effect = itertools.chain(
+            [None, ConnectionError(), None, ConnectionError()], itertools.repeat(None))
+        mock_socket.return_value = mock_socket_inst
+        syslog_handler = SysLog(config)
+
+        log_event = test_data.get_dns_log_events()[0]
+        syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+        syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+        self.assertEqual(mock_getaddrinfo.call_count, 1)
+
+        mock_monotonic.return_value = 1301.0
+        syslog_handler.add_log_line(log_event)
+        syslog_handler.publish_log_lines(force=True)
+        self.assertEqual(mock_getaddrinfo.call_count, 2)
+
+
     @staticmethod
     def create_rfc3164_dns(config: Config, json_object):
         json_message = json.dumps(json_object, cls=CustomJsonEncoder)
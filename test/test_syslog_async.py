@@ -0,0 +1,186 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import socketserver
+import threading
+import time
+import unittest
+from test import test_data
+
+from lds_connector.config import SysLogTransport
+from lds_connector.syslog import SysLog
+from lds_connector.syslog_async import AsyncSysLogTransport
+
+
+class _ReceiverHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        chunks = []
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+            with self.server.lock:
+                self.server.received[self.client_address] = b''.join(chunks)
+
+
+class _Receiver(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ReceiverHandler)
+        self.lock = threading.Lock()
+        self.received = {}
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    def wait_for_bytes(self, expected_bytes: int):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            with self.lock:
+                if sum(len(data) for data in self.received.values()) >= expected_bytes:
+                    return
+            time.sleep(0.01)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _unused_address():
+    # Nothing listens on the port, so connections are refused
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()
+
+
+class AsyncSysLogTransportTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.receivers = [_Receiver(), _Receiver()]
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        for receiver in self.receivers:
+            receiver.stop()
+
+    def test_send_parallel_connections(self):
+        receiver = self.receivers[0]
+        transport = AsyncSysLogTransport([receiver.server_address], 2, None, True)
+
+        batches = [f'batch {index}\n'.encode('utf-8') * 100 for index in range(10)]
+        futures = [transport.send(batch) for batch in batches]
+        for future in futures:
+            future.result(timeout=5)
+
+        receiver.wait_for_bytes(sum(len(batch) for batch in batches))
+        transport.close()
+
+        # Each batch is written whole to one of the connections
+        self.assertEqual(len(receiver.received), 2)
+        received = b''.join(receiver.received.values())
+        self.assertEqual(sorted(received.splitlines()), sorted(b''.join(batches).splitlines()))
+
+    def test_send_multiple_servers(self):
+        addresses = [receiver.server_address for receiver in self.receivers]
+        transport = AsyncSysLogTransport(addresses, 1, None, True)
+
+        # There's at least one connection per server
+        self.assertEqual(len(transport.connections), 2)
+
+        futures = [transport.send(b'message\n') for _ in range(2)]
+        for future in futures:
+            future.result(timeout=5)
+        for receiver in self.receivers:
+            receiver.wait_for_bytes(len(b'message\n'))
+        transport.close()
+
+        for receiver in self.receivers:
+            self.assertEqual(list(receiver.received.values()), [b'message\n'])
+
+    def test_send_failover(self):
+        receiver = self.receivers[0]
+        transport = AsyncSysLogTransport([_unused_address(), receiver.server_address], 2, None, True,
+            retry_initial_sec=10, retry_max_sec=10)
+
+        # Batches sent to the unavailable server are sent to the other one, without waiting out its backoff
+        batches = [f'batch {index}\n'.encode('utf-8') for index in range(6)]
+        futures = [transport.send(batch) for batch in batches]
+        for future in futures:
+            future.result(timeout=5)
+        receiver.wait_for_bytes(sum(len(batch) for batch in batches))
+        transport.close()
+
+        received = b''.join(receiver.received.values())
+        self.assertEqual(sorted(received.splitlines()), sorted(b''.join(batches).splitlines()))
+
+    def test_syslog_send_timeout(self):
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+        config.syslog.host, config.syslog.port = _unused_address()
+        config.syslog.connections = 2
+        config.syslog.send_timeout_sec = 0.2
+        config.syslog.retry.initial_sec = 0.05
+
+        syslog_handler = SysLog(config)
+        assert syslog_handler.syslogger.async_transport is not None
+        syslog_handler.add_log_line(test_data.get_dns_log_events()[0])
+
+        # No server accepts the batch. Publishing gives up, and delivery pauses
+        self.assertFalse(syslog_handler.publish_log_lines(force=True))
+        self.assertFalse(syslog_handler.is_available())
+        self.assertEqual(len(syslog_handler.log_queue), 1)
+        syslog_handler.syslogger.async_transport.close()
+
+    def test_syslog_connections(self):
+        receiver = self.receivers[0]
+        config = test_data.create_syslog_config()
+        assert config.syslog is not None
+        config.syslog.transport = SysLogTransport.TCP
+        config.syslog.host, config.syslog.port = receiver.server_address
+        config.syslog.connections = 2
+        config.syslog.max_write_bytes = 1
+
+        syslog_handler = SysLog(config)
+        assert syslog_handler.syslogger.async_transport is not None
+        log_events = test_data.get_dns_log_events()
+        for log_event in log_events:
+            syslog_handler.add_log_line(log_event)
+        self.assertTrue(syslog_handler.publish_log_lines(force=True))
+
+        # Every batch was written before publishing returned. Wait for the receiver to read them
+        received_lines = []
+        expected_line_count = len(log_events)
+        deadline = time.time() + 5
+        while len(received_lines) < expected_line_count and time.time() < deadline:
+            with receiver.lock:
+                received_lines = b''.join(receiver.received.values()).splitlines()
+            time.sleep(0.01)
+        syslog_handler.syslogger.async_transport.close()
+
+        self.assertEqual(len(receiver.received), 2)
+        self.assertEqual(
+            sorted(line.split(b': ', 1)[1].decode('utf-8') for line in received_lines),
+            sorted(log_event.log_line for log_event in log_events))
+
+
+if __name__ == '__main__':
+    unittest.main()
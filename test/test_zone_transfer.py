@@ -0,0 +1,259 @@
+# Original author: Cam Mackintosh <cmackint@akamai.com>
+# For more information visit https://developer.akamai.com
+
+# Copyright 2023 Akamai Technologies, Inc. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import hmac
+import ipaddress
+import socketserver
+import struct
+import threading
+import time
+import unittest
+
+from lds_connector.zone_transfer import TsigKey, ZoneTransferClient, encode_name
+
+ZONE = 'edgedns.zone'
+TSIG_KEY_NAME = 'transfer-key'
+TSIG_SECRET = base64.b64encode(b'0123456789abcdef0123456789abcdef').decode('ascii')
+
+
+def _record(name: str, record_type: int, rdata: bytes, ttl: int = 300) -> bytes:
+    return encode_name(name) + struct.pack('!HHIH', record_type, 1, ttl, len(rdata)) + rdata
+
+
+def _soa(serial: int) -> bytes:
+    rdata = encode_name('a1-247.akam.net') + encode_name('hostmaster.edgedns.zone') + \
+        struct.pack('!IIIII', serial, 3600, 600, 604800, 300)
+    return _record(ZONE, 6, rdata, 86400)
+
+
+def _a(name: str, address: str) -> bytes:
+    return _record(name, 1, ipaddress.IPv4Address(address).packed)
+
+
+def _message(message_id: int, records, rcode: int = 0) -> bytes:
+    return struct.pack('!HHHHHH', message_id, 0x8400 | rcode, 1, len(records), 0, 0) + \
+        encode_name(ZONE) + struct.pack('!HH', 252, 1) + b''.join(records)
+
+
+def _sign(message: bytes, prior_mac: bytes, unsigned: bytes, first: bool):
+    # Signs a response per RFC 8945, independently of the client's implementation
+    secret = base64.b64decode(TSIG_SECRET)
+    time_signed = int(time.time())
+    timers = struct.pack('!HIH', 0, time_signed, 300)
+    content = struct.pack('!H', len(prior_mac)) + prior_mac + unsigned + message
+    if first:
+        content += encode_name(TSIG_KEY_NAME) + struct.pack('!HI', 255, 0) + encode_name('hmac-sha256') + timers + \
+            struct.pack('!HH', 0, 0)
+    else:
+        content += timers
+    mac = hmac.new(secret, content, hashlib.sha256).digest()
+
+    rdata = encode_name('hmac-sha256') + timers + struct.pack('!H', len(mac)) + mac + message[0:2] + \
+        struct.pack('!HH', 0, 0)
+    signed = message[:10] + struct.pack('!H', 1) + message[12:] + \
+        encode_name(TSIG_KEY_NAME) + struct.pack('!HHIH', 250, 255, 0, len(rdata)) + rdata
+    return signed, mac
+
+
+def _verify_request(query: bytes, mac: bytes) -> bool:
+    # AXFR requests are the header and question, then the TSIG record
+    message_length = 12 + len(encode_name(ZONE)) + 4
+    algorithm = encode_name('hmac-sha256')
+    timers_start = message_length + len(encode_name(TSIG_KEY_NAME)) + 10 + len(algorithm)
+    content = query[:10] + struct.pack('!H', 0) + query[12:message_length] + encode_name(TSIG_KEY_NAME) + \
+        struct.pack('!HI', 255, 0) + algorithm + query[timers_start:timers_start + 8] + struct.pack('!HH', 0, 0)
+    return hmac.compare_digest(mac, hmac.new(base64.b64decode(TSIG_SECRET), content, hashlib.sha256).digest())
+
+
+class _ZoneTransferHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal zone transfer server. Responds to each query with the messages the test gives
+    """
+
+    def handle(self):
+        length = struct.unpack('!H', self.rfile.read(2))[0]
+        query = self.rfile.read(length)
+        message_id = struct.unpack('!H', query[0:2])[0]
+        query_type = struct.unpack('!H', query[12 + len(encode_name(ZONE)):14 + len(encode_name(ZONE))])[0]
+        self.server.queries.append((query_type, query))
+
+        responses = self.server.responses.pop(0)
+        # The request MAC is the last field before the original ID, error, and other length
+        prior_mac = query[-38:-6]
+        if self.server.sign:
+            self.server.request_verified = _verify_request(query, prior_mac)
+        unsigned = b''
+        for index, records in enumerate(responses):
+            if index > 0:
+                time.sleep(self.server.message_delay_sec)
+            message = _message(message_id, records, self.server.rcode)
+            if self.server.sign:
+                # Messages between the first and last may be unsigned
+                if 0 < index < len(responses) - 1:
+                    unsigned += message
+                else:
+                    message, prior_mac = _sign(message, prior_mac, unsigned, index == 0)
+                    unsigned = b''
+            self.wfile.write(struct.pack('!H', len(message)) + message)
+
+
+class _ZoneTransferServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, sign: bool = False):
+        super().__init__(('127.0.0.1', 0), _ZoneTransferHandler)
+        self.sign = sign
+        self.rcode = 0
+        self.message_delay_sec = 0.0
+        self.request_verified = False
+        # Each query's response messages. Each message is a list of records
+        self.responses = []
+        self.queries = []
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ZoneTransferClientTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = _ZoneTransferServer()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.server.stop()
+
+    @staticmethod
+    def create_zone(serial: int):
+        # The CNAME target is compressed, pointing at the question name
+        return [
+            [_soa(serial), _record(ZONE, 2, encode_name('a1-247.akam.net')), _a('cam.edgedns.zone', '192.0.2.1')],
+            [
+                _a('cam.edgedns.zone', '192.0.2.2'),
+                _record('www.edgedns.zone', 5, b'\xc0\x0c'),
+                _record(ZONE, 16, b'\x05hello\x0bsay "hi"\\'),
+                _record(ZONE, 257, b'\x00\x05issue' + b'ca.sectigo.com'),
+                _soa(serial)
+            ]
+        ]
+
+    @staticmethod
+    def to_dict(records):
+        return {(record.name, record.type): (record.ttl_sec, record.rdata) for record in records}
+
+    def test_axfr(self):
+        self.server.responses.append(ZoneTransferClientTest.create_zone(2019102601))
+        client = ZoneTransferClient(self.server.server_address, incremental=False)
+
+        records = ZoneTransferClientTest.to_dict(client.get_records(ZONE))
+
+        self.assertEqual(self.server.queries[0][0], 252)
+        self.assertEqual(records, {
+            (ZONE, 'SOA'): (86400, ['a1-247.akam.net. hostmaster.edgedns.zone. 2019102601 3600 600 604800 300']),
+            (ZONE, 'NS'): (300, ['a1-247.akam.net.']),
+            ('cam.edgedns.zone', 'A'): (300, ['192.0.2.1', '192.0.2.2']),
+            ('www.edgedns.zone', 'CNAME'): (300, ['edgedns.zone.']),
+            (ZONE, 'TXT'): (300, ['"hello" "say \\"hi\\"\\\\"']),
+            (ZONE, 'CAA'): (300, ['0 issue "ca.sectigo.com"'])
+        })
+        # Without IXFR, no copy of the zone is kept
+        self.assertEqual(client.zones, {})
+
+    def test_axfr_tsig(self):
+        self.server.sign = True
+        zone = ZoneTransferClientTest.create_zone(2019102601)
+        self.server.responses.append([zone[0], zone[1][0:2], zone[1][2:]])
+        client = ZoneTransferClient(self.server.server_address, incremental=False,
+            tsig_key=TsigKey(TSIG_KEY_NAME, TSIG_SECRET, 'hmac-sha256'))
+
+        records = client.get_records(ZONE)
+
+        self.assertEqual(len(records), 6)
+        # The request is signed
+        self.assertTrue(self.server.request_verified)
+
+    def test_axfr_tsig_invalid(self):
+        self.server.sign = True
+        self.server.responses.append(ZoneTransferClientTest.create_zone(2019102601))
+        wrong_secret = base64.b64encode(b'fedcba9876543210fedcba9876543210').decode('ascii')
+        client = ZoneTransferClient(self.server.server_address, incremental=False,
+            tsig_key=TsigKey(TSIG_KEY_NAME, wrong_secret, 'hmac-sha256'))
+
+        self.assertIsNone(client.get_records(ZONE))
+
+    def test_ixfr(self):
+        self.server.responses.append(ZoneTransferClientTest.create_zone(1))
+        client = ZoneTransferClient(self.server.server_address, incremental=True)
+        self.assertEqual(len(client.get_records(ZONE)), 6)
+
+        # Serial 1 to 2 replaces one address. Serial 2 to 3 adds a record
+        self.server.responses.append([
+            [_soa(3), _soa(1), _a('cam.edgedns.zone', '192.0.2.1'), _soa(2), _a('cam.edgedns.zone', '192.0.2.3')],
+            [_soa(2), _soa(3), _a('new.edgedns.zone', '192.0.2.4'), _soa(3)]
+        ])
+        records = ZoneTransferClientTest.to_dict(client.get_records(ZONE))
+
+        query_type, query = self.server.queries[1]
+        self.assertEqual(query_type, 251)
+        # The serial of the zone copy is in the authority section
+        self.assertEqual(struct.unpack('!I', query[-20:-16])[0], 1)
+        self.assertEqual(records[('cam.edgedns.zone', 'A')], (300, ['192.0.2.2', '192.0.2.3']))
+        self.assertEqual(records[('new.edgedns.zone', 'A')], (300, ['192.0.2.4']))
+        self.assertEqual(records[(ZONE, 'SOA')][1][0].split()[2], '3')
+        self.assertEqual(len(records), 7)
+
+        # Up to date. The response is only the SOA record
+        self.server.responses.append([[_soa(3)]])
+        self.assertEqual(ZoneTransferClientTest.to_dict(client.get_records(ZONE)), records)
+
+    def test_ixfr_failed(self):
+        self.server.responses.append(ZoneTransferClientTest.create_zone(1))
+        client = ZoneTransferClient(self.server.server_address, incremental=True)
+        client.get_records(ZONE)
+
+        # The connection closes mid-transfer. The zone copy is kept as it was
+        self.server.responses.append([[_soa(2), _soa(1), _a('cam.edgedns.zone', '192.0.2.1')]])
+        self.assertIsNone(client.get_records(ZONE))
+        self.assertEqual(client.zones[ZONE].serial, 1)
+
+    def test_deadline(self):
+        # The server stalls after the first message
+        self.server.message_delay_sec = 2
+        self.server.responses.append(ZoneTransferClientTest.create_zone(1))
+        client = ZoneTransferClient(self.server.server_address, incremental=False, timeout_sec=30)
+
+        started = time.monotonic()
+        self.assertIsNone(client.get_records(ZONE, deadline=started + 0.2))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_refused(self):
+        self.server.rcode = 5
+        self.server.responses.append([[]])
+        client = ZoneTransferClient(self.server.server_address, incremental=False)
+
+        self.assertIsNone(client.get_records(ZONE))
+
+
+if __name__ == '__main__':
+    unittest.main()